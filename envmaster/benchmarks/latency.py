@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+Adds a fixed delay to each of the file system calls EnvMaster
+makes (stat, listdir, scandir, open etc) to mimic a slow network
+file system such as NFS. Used by benchmarks/scaling.py but can be
+used by itself to run a script or some code with the delay:
+
+    python benchmarks/latency.py --delay 0.001 scripts/envmastercmd.py bash avail
+    python benchmarks/latency.py --delay 0.001 -c "from envmaster import pyutils"
+
+The number of delayed calls is written to stderr at exit if
+--count is given.
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+import time
+
+# the functions in the os module that are delayed.
+# os.path.isdir etc call os.stat so are covered too.
+OSFUNCTIONS = ('stat','lstat','listdir','scandir','access','utime',
+                'open','rename','remove','mkdir')
+
+# name -> number of calls made since install()
+counts = {}
+
+def wrap(name,func,delay):
+    """
+    Returns a function that sleeps for delay
+    seconds and then calls func
+    """
+    def delayed(*args,**kwargs):
+        counts[name] = counts.get(name,0) + 1
+        time.sleep(delay)
+        return func(*args,**kwargs)
+    return delayed
+
+def install(delay):
+    """
+    Replace the file system functions with ones that
+    wait for delay seconds first
+    """
+    for name in OSFUNCTIONS:
+        func = getattr(os,name,None)
+        if func is not None:
+            setattr(os,name,wrap(name,func,delay))
+    if sys.version_info[0] < 3:
+        import __builtin__ as builtins
+    else:
+        import builtins
+    builtins.open = wrap('builtins.open',builtins.open,delay)
+
+def main():
+    args = sys.argv[1:]
+    delay = 0.001
+    count = False
+    while len(args) > 0 and args[0].startswith('--'):
+        option = args.pop(0)
+        if option == '--delay':
+            delay = float(args.pop(0))
+        elif option == '--count':
+            count = True
+        else:
+            sys.stderr.write('Unknown option %s\n' % option)
+            sys.exit(1)
+    if len(args) == 0:
+        sys.stderr.write('Usage: latency.py [--delay seconds] [--count] (script|-c code) [args...]\n')
+        sys.exit(1)
+
+    if count:
+        import atexit
+        def report():
+            total = sum(counts.values())
+            details = ' '.join(['%s=%d' % item for item in sorted(counts.items())])
+            sys.stderr.write('delayed calls: %d %s\n' % (total,details))
+        atexit.register(report)
+
+    if args[0] == '-c':
+        code = args[1]
+        sys.argv = ['-c'] + args[2:]
+        install(delay)
+        exec(compile(code,'<string>','exec'),{'__name__' : '__main__'})
+    else:
+        import runpy
+        script = args[0]
+        sys.argv = args
+        # like running it directly
+        sys.path[0] = os.path.dirname(os.path.abspath(script))
+        install(delay)
+        runpy.run_path(script,run_name='__main__')
+
+if __name__ == '__main__':
+    main()
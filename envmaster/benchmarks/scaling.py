@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+"""
+Measures how the main EnvMaster operations scale with the
+size of the module tree. For each tree size a synthetic tree
+is generated (see treegen.py) and 'avail', 'load', 'disp',
+'allreload' and an in process pyutils.load() are timed. Each
+command is run in a fresh interpreter so the caches in
+~/.envmaster (here a temporary directory) are used just as
+they would be from the shell.
+
+With --delay every file system call made is delayed by that
+many seconds (see latency.py) to mimic NFS.
+
+Run from the top of the source tree:
+
+    python benchmarks/scaling.py --sizes 100,1000,5000 --delay 0.0005 --output before.json
+
+and compare two sets of results with:
+
+    python benchmarks/scaling.py --compare before.json after.json
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+import time
+import json
+import random
+import shutil
+import tempfile
+import subprocess
+from optparse import OptionParser
+
+import treegen
+from startup import median
+
+# the top of the source tree
+SRCDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENVMASTERCMD = os.path.join(SRCDIR,'scripts','envmastercmd.py')
+LATENCY = os.path.join(SRCDIR,'benchmarks','latency.py')
+
+# run in the child to time pyutils.load() without
+# the interpreter start up
+PYUTILSCODE = """
+import os, sys, time
+start = time.time()
+from envmaster import pyutils
+pyutils.load(*sys.argv[1:])
+sys.stdout.write('%f\\n' % (time.time() - start))
+"""
+
+def getScenarios(tree,nload,seed):
+    """
+    Returns a list of (name,args,extra environment,
+    in process) for each thing we time. args are the
+    arguments to envmastercmd.py or, for in process
+    ones, the module names.
+    """
+    rand = random.Random(seed)
+    count = min(nload,len(tree.modnames))
+    indices = sorted(rand.sample(range(len(tree.modnames)),count))
+    modnames = [tree.modnames[i] for i in indices]
+    # as the shell would have it after loading them
+    loaded = os.pathsep.join(reversed([tree.fullnames[i] for i in indices]))
+    loadedenv = {'ENVMASTERLOADED' : loaded}
+    return [('avail',['bash','avail'],{},False),
+            ('load',['bash','load'] + modnames,{},False),
+            ('disp',['bash','disp',modnames[0]],{},False),
+            ('allreload',['bash','allreload'],loadedenv,False),
+            ('pyutils.load',modnames,{},True)]
+
+def runOnce(python,args,env,inprocess,delay):
+    """
+    Runs a scenario once and returns the time taken in
+    seconds. For in process scenarios this is as reported
+    by the child. Returns None if it failed.
+    """
+    if inprocess:
+        argv = ['-c',PYUTILSCODE] + args
+    else:
+        argv = [ENVMASTERCMD] + args
+    if delay > 0:
+        argv = [LATENCY,'--delay',str(delay)] + argv
+
+    start = time.time()
+    proc = subprocess.Popen([python] + argv,env=env,stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,universal_newlines=True)
+    stdout,stderr = proc.communicate()
+    elapsed = time.time() - start
+    if proc.returncode != 0:
+        sys.stderr.write(stderr)
+        return None
+    if inprocess:
+        elapsed = float(stdout.strip().splitlines()[-1])
+    return elapsed
+
+def runSize(options,size,topdir):
+    """
+    Generate a tree of the given size and time all the
+    scenarios against it. Returns a dictionary of results.
+    """
+    sizedir = os.path.join(topdir,'size%d' % size)
+    start = time.time()
+    tree = treegen.makeTree(sizedir,size,options.roots,seed=options.seed)
+    gentime = time.time() - start
+
+    env = dict(os.environ)
+    env['ENVMASTERPATH'] = tree.modpath
+    env['ENVMASTER_CACHEDIR'] = os.path.join(sizedir,'cache')
+    env['PYTHONPATH'] = SRCDIR
+    for var in ('ENVMASTERLOADED','ENVMASTERREFS','ENVMASTERBASELINE','ENVMASTER_TRACE'):
+        env.pop(var,None)
+    if options.nocache:
+        env['ENVMASTER_NOCACHE'] = '1'
+
+    results = {'modules' : size,'roots' : options.roots,'generate_s' : gentime,
+                'scenarios' : {}}
+    for name,args,extraenv,inprocess in getScenarios(tree,options.load,options.seed):
+        cmdenv = dict(env)
+        cmdenv.update(extraenv)
+        # once to fill the caches
+        runOnce(options.python,args,cmdenv,inprocess,options.delay)
+        times = []
+        for n in range(options.repeat):
+            elapsed = runOnce(options.python,args,cmdenv,inprocess,options.delay)
+            if elapsed is None:
+                break
+            times.append(elapsed)
+        if len(times) == 0:
+            results['scenarios'][name] = {'failed' : True}
+            print('%6d %-13s failed' % (size,name))
+            continue
+        result = {'min' : min(times),'median' : median(times),'max' : max(times)}
+        results['scenarios'][name] = result
+        print('%6d %-13s min %8.1fms median %8.1fms max %8.1fms' % (size,name,
+                    result['min']*1000,result['median']*1000,result['max']*1000))
+    return results
+
+def compare(beforefile,afterfile):
+    """
+    Print the change in median time of each scenario
+    between two JSON result files
+    """
+    before = json.load(open(beforefile))
+    after = json.load(open(afterfile))
+    for size in sorted(after['sizes'],key=int):
+        if size not in before['sizes']:
+            continue
+        for name,result in sorted(after['sizes'][size]['scenarios'].items()):
+            old = before['sizes'][size]['scenarios'].get(name)
+            if old is None or 'median' not in old or 'median' not in result:
+                continue
+            change = (result['median'] - old['median']) / old['median'] * 100
+            print('%6s %-13s %8.1fms -> %8.1fms %+6.1f%%' % (size,name,
+                        old['median']*1000,result['median']*1000,change))
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--sizes',default='100,1000',
+                help='Comma separated list of numbers of modules (default %default)')
+    parser.add_option('--roots',type='int',default=4,
+                help='Number of directories in ENVMASTERPATH (default %default)')
+    parser.add_option('--load',type='int',default=20,
+                help='Number of modules to load (default %default)')
+    parser.add_option('--repeat',type='int',default=5,
+                help='Number of times to run each scenario (default %default)')
+    parser.add_option('--delay',type='float',default=0.0,
+                help='Seconds to delay each file system call by (default %default)')
+    parser.add_option('--nocache',action='store_true',default=False,
+                help='Turn off the EnvMaster caches')
+    parser.add_option('--seed',type='int',default=0,
+                help='Seed for the random number generator (default %default)')
+    parser.add_option('--python',default=sys.executable,
+                help='Python interpreter to use (default %default)')
+    parser.add_option('--output',default=None,help='Write the results to this JSON file')
+    parser.add_option('--compare',action='store_true',default=False,
+                help='Compare two JSON result files given as arguments rather than running')
+    (options,args) = parser.parse_args()
+
+    if options.compare:
+        if len(args) != 2:
+            parser.error('--compare needs two result files')
+        compare(args[0],args[1])
+        return
+
+    sizes = [int(size) for size in options.sizes.split(',')]
+    results = {'python' : options.python,'repeat' : options.repeat,
+                'delay' : options.delay,'nocache' : options.nocache,
+                'load' : options.load,'sizes' : {}}
+    topdir = tempfile.mkdtemp(prefix='envmasterscaling')
+    try:
+        for size in sizes:
+            results['sizes'][str(size)] = runSize(options,size,topdir)
+    finally:
+        shutil.rmtree(topdir)
+
+    if options.output is not None:
+        fileobj = open(options.output,'w')
+        json.dump(results,fileobj,indent=2,sort_keys=True)
+        fileobj.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+Measures how long envmastercmd.py takes to start up and
+run the common commands. Each command is run a number of
+times in a fresh interpreter against a small generated
+module tree and the wall clock times reported. Each command
+is also run once under 'python -X importtime' (Python 3.7+)
+so it is easy to see which imports are responsible if
+start up gets slower.
+
+Run from the top of the source tree:
+
+    python benchmarks/startup.py --repeat 20 --output startup.json
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+import time
+import json
+import shutil
+import tempfile
+import subprocess
+from optparse import OptionParser
+
+# the top of the source tree
+SRCDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENVMASTERCMD = os.path.join(SRCDIR,'scripts','envmastercmd.py')
+
+SENTINEL = '#%EnvMaster1.0\n'
+
+def makeModuleTree(topdir):
+    """
+    Create a small module tree (2 versions of one module
+    plus a version.py) with install prefixes to match.
+    Returns the value for ENVMASTERPATH.
+    """
+    moddir = os.path.join(topdir,'modules')
+    os.makedirs(os.path.join(moddir,'bench'))
+    for version in ('1.0','2.0'):
+        prefix = os.path.join(topdir,'prefix',version)
+        for subdir in ('bin','lib','include'):
+            os.makedirs(os.path.join(prefix,subdir))
+            open(os.path.join(prefix,subdir,'file'),'w').close()
+        fileobj = open(os.path.join(moddir,'bench',version),'w')
+        fileobj.write(SENTINEL)
+        fileobj.write('module.whatis("Benchmark module %s")\n' % version)
+        fileobj.write('module.setAll("%s")\n' % prefix)
+        fileobj.close()
+    fileobj = open(os.path.join(moddir,'bench','version.py'),'w')
+    fileobj.write(SENTINEL + 'version = "2.0"\n')
+    fileobj.close()
+    return moddir
+
+def getCommands():
+    """
+    Returns a list of (name,argv,extra environment) 
+    for each thing we time. 'python' is just starting
+    the interpreter for comparison.
+    """
+    loaded = {'ENVMASTERLOADED' : 'bench/1.0'}
+    return [('python',['-c','pass'],{}),
+            ('load',[ENVMASTERCMD,'bash','load','bench'],{}),
+            ('unload',[ENVMASTERCMD,'bash','unload','bench'],loaded),
+            ('swap',[ENVMASTERCMD,'bash','swap','bench/1.0','bench/2.0'],loaded),
+            ('list',[ENVMASTERCMD,'bash','list'],loaded),
+            ('avail',[ENVMASTERCMD,'bash','avail'],{})]
+
+def timeCommand(python,argv,env,repeat):
+    """
+    Runs the command repeat times and returns a list
+    of the wall clock times in seconds.
+    """
+    times = []
+    devnull = open(os.devnull,'w')
+    for n in range(repeat):
+        start = time.time()
+        subprocess.call([python] + argv,env=env,stdout=devnull,stderr=devnull)
+        times.append(time.time() - start)
+    devnull.close()
+    return times
+
+def importTimes(python,argv,env):
+    """
+    Runs the command once with -X importtime and returns
+    a list of (module,self us,cumulative us) in the order
+    Python reported them.
+    """
+    proc = subprocess.Popen([python,'-X','importtime'] + argv,env=env,
+                stdout=subprocess.PIPE,stderr=subprocess.PIPE,
+                universal_newlines=True)
+    stdout,stderr = proc.communicate()
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3:
+            continue
+        try:
+            imports.append((fields[2].strip(),int(fields[0]),int(fields[1])))
+        except ValueError:
+            pass
+    return imports
+
+def median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    if len(values) % 2 == 1:
+        return values[mid]
+    return (values[mid-1] + values[mid]) / 2.0
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--repeat',type='int',default=20,
+                help='Number of times to run each command (default %default)')
+    parser.add_option('--python',default=sys.executable,
+                help='Python interpreter to use (default %default)')
+    parser.add_option('--top',type='int',default=10,
+                help='Number of slowest imports to show for each command (default %default)')
+    parser.add_option('--output',default=None,help='Write the results to this JSON file')
+    (options,args) = parser.parse_args()
+
+    topdir = tempfile.mkdtemp(prefix='envmasterbench')
+    try:
+        env = dict(os.environ)
+        env['ENVMASTERPATH'] = makeModuleTree(topdir)
+        env['ENVMASTER_CACHEDIR'] = os.path.join(topdir,'cache')
+        env['PYTHONPATH'] = SRCDIR
+        env.pop('ENVMASTERLOADED',None)
+        env.pop('ENVMASTER_TRACE',None)
+
+        if env.get('PYTHONDONTWRITEBYTECODE'):
+            # every run has to compile EnvMaster from scratch
+            print('Warning: PYTHONDONTWRITEBYTECODE is set so imports will be slower')
+
+        results = {'python' : options.python,'repeat' : options.repeat,'commands' : {}}
+        for name,argv,extraenv in getCommands():
+            cmdenv = dict(env)
+            cmdenv.update(extraenv)
+            # once to warm the caches and the OS
+            timeCommand(options.python,argv,cmdenv,1)
+            times = timeCommand(options.python,argv,cmdenv,options.repeat)
+            imports = importTimes(options.python,argv,cmdenv)
+
+            result = {'min' : min(times),'median' : median(times),
+                        'max' : max(times),
+                        'imports' : [{'module' : mod,'self_us' : selfus,'cumulative_us' : cumus}
+                                        for mod,selfus,cumus in imports]}
+            results['commands'][name] = result
+
+            print('%-8s min %7.1fms median %7.1fms max %7.1fms' % (name,
+                        result['min']*1000,result['median']*1000,result['max']*1000))
+            if len(imports) > 0:
+                envmastermods = [mod for mod,selfus,cumus in imports if mod.startswith('envmaster')]
+                print('         %d modules imported. EnvMaster modules: %s' % (len(imports),
+                        ' '.join(envmastermods)))
+                slowest = sorted(imports,key=lambda x:x[1],reverse=True)[:options.top]
+                for mod,selfus,cumus in slowest:
+                    print('         %8dus self %8dus cumulative  %s' % (selfus,cumus,mod))
+
+        if options.output is not None:
+            fileobj = open(options.output,'w')
+            json.dump(results,fileobj,indent=2,sort_keys=True)
+            fileobj.close()
+    finally:
+        shutil.rmtree(topdir)
+
+if __name__ == '__main__':
+    main()
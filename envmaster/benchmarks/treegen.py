@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+"""
+Generates synthetic module trees for the benchmarks. Modules
+are spread over a number of roots (the directories that go in
+ENVMASTERPATH). Most have a directory with several versions and a
+version.py, some are a single unversioned file, and some load or
+prereq other modules. Each version has its own install prefix with
+bin, lib, include and man directories for setAll() to find.
+
+Can also be run by itself to leave a tree behind to experiment with:
+
+    python benchmarks/treegen.py --modules 1000 /tmp/tree
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import random
+from optparse import OptionParser
+
+SENTINEL = '#%EnvMaster1.0\n'
+
+# subdirectories created in each install prefix
+PREFIXSUBDIRS = ('bin','lib','include',os.path.join('share','man','man1'))
+
+class ModuleTree(object):
+    """
+    Describes a generated tree. modpath is the value
+    for ENVMASTERPATH, modnames the names of the modules
+    (without version) and fullnames the default full name
+    of each.
+    """
+    def __init__(self,topdir,roots,modnames,fullnames):
+        self.topdir = topdir
+        self.roots = roots
+        self.modpath = os.pathsep.join(roots)
+        self.modnames = modnames
+        self.fullnames = fullnames
+
+def makePrefix(prefix):
+    """
+    Create an install prefix with a file in each
+    of the standard subdirectories
+    """
+    for subdir in PREFIXSUBDIRS:
+        path = os.path.join(prefix,subdir)
+        os.makedirs(path)
+        open(os.path.join(path,'file'),'w').close()
+
+def writeModuleFile(path,modname,prefix,loads,prereqs):
+    """
+    Write a module file that sets everything up for
+    prefix and loads/prereqs the given modules
+    """
+    fileobj = open(path,'w')
+    fileobj.write(SENTINEL)
+    fileobj.write('module.whatis("Synthetic module %s")\n' % modname)
+    for prereq in prereqs:
+        fileobj.write('module.prereq("%s")\n' % prereq)
+    for load in loads:
+        fileobj.write('module.load("%s")\n' % load)
+    fileobj.write('module.setAll("%s")\n' % prefix)
+    fileobj.write('module.setVar("1","HAVE_%s")\n' % modname.upper())
+    fileobj.close()
+
+def makeTree(topdir,nmodules,nroots=4,maxversions=3,deprate=0.1,seed=0):
+    """
+    Creates a tree of nmodules modules under topdir.
+    deprate is the fraction of modules that load another
+    module (which comes earlier in the list so there are
+    no cycles). Returns a ModuleTree.
+    """
+    rand = random.Random(seed)
+    roots = []
+    for n in range(nroots):
+        root = os.path.join(topdir,'modules%d' % n)
+        os.makedirs(root)
+        roots.append(root)
+
+    modnames = []
+    fullnames = []
+    for n in range(nmodules):
+        modname = 'mod%05d' % n
+        root = roots[n % nroots]
+        loads = []
+        if len(modnames) > 0 and rand.random() < deprate:
+            loads.append(rand.choice(modnames))
+
+        nversions = rand.randint(1,maxversions)
+        if nversions == 1 and rand.random() < 0.5:
+            # plain unversioned module file
+            prefix = os.path.join(topdir,'prefix',modname)
+            makePrefix(prefix)
+            writeModuleFile(os.path.join(root,modname),modname,prefix,loads,[])
+            fullname = modname
+        else:
+            moddir = os.path.join(root,modname)
+            os.mkdir(moddir)
+            versions = ['%d.%d' % (major,rand.randint(0,9)) for major in range(1,nversions+1)]
+            for version in versions:
+                prefix = os.path.join(topdir,'prefix',modname,version)
+                makePrefix(prefix)
+                writeModuleFile(os.path.join(moddir,version),modname,prefix,loads,[])
+            # default isn't always the latest
+            default = rand.choice(versions)
+            fileobj = open(os.path.join(moddir,'version.py'),'w')
+            fileobj.write(SENTINEL + 'version = "%s"\n' % default)
+            fileobj.close()
+            fullname = modname + os.sep + default
+
+        modnames.append(modname)
+        fullnames.append(fullname)
+
+    return ModuleTree(topdir,roots,modnames,fullnames)
+
+def main():
+    parser = OptionParser(usage='%prog [options] topdir')
+    parser.add_option('--modules',type='int',default=1000,
+                help='Number of modules (default %default)')
+    parser.add_option('--roots',type='int',default=4,
+                help='Number of directories in ENVMASTERPATH (default %default)')
+    parser.add_option('--seed',type='int',default=0,
+                help='Seed for the random number generator (default %default)')
+    (options,args) = parser.parse_args()
+    if len(args) != 1:
+        parser.error('need the directory to create the tree in')
+
+    tree = makeTree(args[0],options.modules,options.roots,seed=options.seed)
+    print('ENVMASTERPATH=%s' % tree.modpath)
+
+if __name__ == '__main__':
+    main()
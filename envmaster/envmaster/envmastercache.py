@@ -0,0 +1,476 @@
+"""
+Module that contains the caches EnvMaster keeps between
+runs so it doesn't have to go back to the (possibly
+network mounted) file system every time.
+
+Entries are stored along with the 'fingerprints'
+(modification time and size) of the files and directories
+they were derived from and are thrown away when any of
+these change.
+
+Normally, instances of these classes are not created
+directly. Use the getResolveCache() and getCodeCache()
+functions.
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+import time
+import zlib
+import marshal
+if sys.version_info[0] < 3:
+    # keep compatibility with Python2.4
+    from thread import get_ident, allocate_lock
+    import envmasterconf
+else:
+    from _thread import get_ident, allocate_lock
+    from envmaster import envmasterconf
+
+# bump this if the layout of the cache files changes
+CACHE_FORMAT = 1
+
+def fingerprint(path):
+    """
+    Returns a tuple of (mtime,size) for the given path
+    or None if it doesn't exist. Used to detect when
+    a cache entry is out of date.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime,st.st_size)
+
+def validatorsOk(validators):
+    """
+    Given a sequence of (path,fingerprint) pairs
+    as saved with a cache entry, returns True if they
+    all still match what is on disk.
+    """
+    for path,fp in validators:
+        if fingerprint(path) != fp:
+            return False
+    return True
+
+def cachingDisabled():
+    """
+    Returns True if the user has turned off all caching
+    by setting the environment variable named in
+    envmasterconf.NOCACHEENV
+    """
+    return os.getenv(envmasterconf.NOCACHEENV) is not None
+
+def getCacheDir():
+    """
+    Returns the directory the caches should be kept in,
+    creating it if it doesn't exist. Returns None if
+    it can't be created.
+    """
+    cachedir = os.getenv(envmasterconf.CACHEDIRENV)
+    if cachedir is None:
+        cachedir = envmasterconf.CACHEDIR
+    if not os.path.isdir(cachedir):
+        try:
+            os.makedirs(cachedir,0o700)
+        except OSError:
+            # possibly someone else beat us to it
+            if not os.path.isdir(cachedir):
+                return None
+    return cachedir
+
+def readCacheFile(path):
+    """
+    Reads an object written by writeCacheFile(). Returns
+    None if it doesn't exist or can't be understood.
+    """
+    try:
+        fileobj = open(path,'rb')
+        try:
+            # much faster than marshal.load() on the
+            # file which reads it a bit at a time
+            data = marshal.loads(fileobj.read())
+        finally:
+            fileobj.close()
+    except (IOError,OSError,EOFError,ValueError,TypeError):
+        return None
+    if not isinstance(data,tuple) or len(data) != 2 or data[0] != CACHE_FORMAT:
+        return None
+    return data[1]
+
+def writeCacheFile(path,obj):
+    """
+    Writes obj to path using marshal. We write to a temporary
+    file first and rename it over the top so other shells
+    reading the file at the same time never see half of it.
+    Failures are ignored - it is only a cache.
+    """
+    # unique to this thread in case 'avail' is
+    # writing from more than one
+    tmppath = '%s.%d.%d.tmp' % (path,os.getpid(),get_ident())
+    try:
+        fileobj = open(tmppath,'wb')
+        try:
+            marshal.dump((CACHE_FORMAT,obj),fileobj)
+        finally:
+            fileobj.close()
+        os.rename(tmppath,path)
+    except (IOError,OSError,ValueError):
+        try:
+            os.remove(tmppath)
+        except OSError:
+            pass
+
+class ResolutionCache(object):
+    """
+    Remembers the result of EnvMasterFile.getModule(),
+    EnvMasterFile.findDefault() and EnvMasterFile.getVersionIndex()
+    between runs. Each entry
+    keeps the fingerprints of everything that was looked at
+    to produce it so we only need one stat() per item to
+    check it rather than repeating the whole search.
+    Negative results (module not found) are cached too.
+    """
+    def __init__(self,path):
+        self.path = path
+        # (modpaths,modname) -> (fullmodname,fullpath,validators)
+        self.modules = {}
+        # dirpath -> (defaultmodname,validators)
+        self.defaults = {}
+        # dirpath -> (sorted (key,version) list,validators)
+        self.versions = {}
+        self.dirty = False
+        if path is not None:
+            data = readCacheFile(path)
+            if data is not None:
+                try:
+                    self.modules,self.defaults,self.versions = data
+                except ValueError:
+                    pass
+
+    def lookupModule(self,modpaths,modname):
+        """
+        Returns the cached (fullmodname,fullpath) for modname
+        if the entry is still valid. Otherwise returns None.
+        Note that a valid negative entry is returned as
+        (None,None).
+        """
+        key = (tuple(modpaths),modname)
+        entry = self.modules.get(key)
+        if entry is None:
+            return None
+        fullmodname,fullpath,validators = entry
+        if not validatorsOk(validators):
+            self.modules.pop(key,None)
+            self.dirty = True
+            return None
+        return (fullmodname,fullpath)
+
+    def storeModule(self,modpaths,modname,fullmodname,fullpath,validators):
+        """
+        Saves the result of a module search along with
+        the (path,fingerprint) pairs that it depended on.
+        """
+        key = (tuple(modpaths),modname)
+        self.modules[key] = (fullmodname,fullpath,tuple(validators))
+        self.dirty = True
+
+    def lookupDefault(self,dirpath):
+        """
+        Returns the cached default module name for the
+        given directory or None if not known or out of date.
+        """
+        entry = self.defaults.get(dirpath)
+        if entry is None:
+            return None
+        defaultmodname,validators = entry
+        if not validatorsOk(validators):
+            self.defaults.pop(dirpath,None)
+            self.dirty = True
+            return None
+        return defaultmodname
+
+    def storeDefault(self,dirpath,defaultmodname,validators):
+        """
+        Saves the default module name for a directory
+        """
+        self.defaults[dirpath] = (defaultmodname,tuple(validators))
+        self.dirty = True
+
+    def lookupVersions(self,dirpath):
+        """
+        Returns the cached sorted list of (key,version) tuples
+        for the module directory dirpath (see envmasterversion)
+        or None if not known or out of date.
+        """
+        entry = self.versions.get(dirpath)
+        if entry is None:
+            return None
+        entries,validators = entry
+        if not validatorsOk(validators):
+            self.versions.pop(dirpath,None)
+            self.dirty = True
+            return None
+        return entries
+
+    def storeVersions(self,dirpath,entries,validators):
+        """
+        Saves the sorted versions of a module directory
+        """
+        self.versions[dirpath] = (entries,tuple(validators))
+        self.dirty = True
+
+    def save(self):
+        """
+        Writes the cache to disk if anything has changed
+        """
+        if not self.dirty or self.path is None:
+            return
+        maxentries = envmasterconf.RESOLVECACHE_MAXENTRIES
+        nentries = len(self.modules) + len(self.defaults) + len(self.versions)
+        if nentries > maxentries:
+            # don't let it grow for ever. Simplest to
+            # start again.
+            self.modules = {}
+            self.defaults = {}
+            self.versions = {}
+        writeCacheFile(self.path,(self.modules,self.defaults,self.versions))
+        self.dirty = False
+
+_resolvecache = None
+# so threads running modules at the same time
+# (see pyutils.resolve()) share the caches
+_cachelock = allocate_lock()
+
+def getResolveCache():
+    """
+    Returns the shared ResolutionCache instance, or None
+    if this cache is turned off. The cache is saved when
+    the process exits.
+    """
+    global _resolvecache
+    if not envmasterconf.USE_RESOLVECACHE or cachingDisabled():
+        return None
+    if _resolvecache is None:
+        _cachelock.acquire()
+        try:
+            if _resolvecache is None:
+                path = None
+                cachedir = getCacheDir()
+                if cachedir is not None:
+                    path = os.path.join(cachedir,envmasterconf.RESOLVECACHEFILE)
+                cache = ResolutionCache(path)
+                import atexit
+                atexit.register(cache.save)
+                _resolvecache = cache
+        finally:
+            _cachelock.release()
+    return _resolvecache
+
+def getMagicNumber():
+    """
+    Returns the 'magic number' that identifies the
+    format of the interpreter's compiled code. Avoids
+    importing importlib.util if we can since that pulls
+    in a number of other modules and slows start up.
+    """
+    try:
+        # already loaded as part of the import system
+        import _frozen_importlib_external
+        return _frozen_importlib_external.MAGIC_NUMBER
+    except (ImportError,AttributeError):
+        pass
+    try:
+        from importlib.util import MAGIC_NUMBER
+        return MAGIC_NUMBER
+    except ImportError:
+        import imp
+        return imp.get_magic()
+
+class CodeCache(object):
+    """
+    Keeps the compiled code objects of module files (and
+    version files) so they don't need to be parsed each time
+    they are run. Entries are kept in memory and also written
+    with marshal to one file per module file in the cache
+    directory so they are shared between runs (and between
+    shells running at the same time - files are replaced
+    atomically). Entries are keyed on the path, size and
+    modification time of the source file and the 'magic number'
+    of the Python interpreter.
+    """
+    # only update the access time of a cache file on a hit
+    # if it is older than this so we aren't always writing
+    TOUCH_INTERVAL = 3600
+
+    def __init__(self,cachedir):
+        self.cachedir = cachedir
+        # path -> (fingerprint,code)
+        self.memory = {}
+        self.magic = getMagicNumber()
+        # number of files written since evict() was last run
+        self.written = 0
+
+    def getCachePath(self,path):
+        """
+        Returns the path of the file in the cache directory
+        that the compiled version of path is kept in.
+        """
+        encoded = path.encode('utf-8') if sys.version_info[0] >= 3 else path
+        name = '%08x%08x.emc' % (zlib.crc32(encoded) & 0xffffffff,
+                    zlib.adler32(encoded) & 0xffffffff)
+        return os.path.join(self.cachedir,name)
+
+    def compileFile(self,path):
+        """
+        Returns the compiled code object for the Python
+        file in path using the cached version if it is
+        up to date.
+        """
+        st = os.stat(path)
+        fp = (st.st_mtime,st.st_size)
+
+        entry = self.memory.get(path)
+        if entry is not None and entry[0] == fp:
+            return entry[1]
+
+        code = None
+        cachepath = None
+        if self.cachedir is not None:
+            cachepath = self.getCachePath(path)
+            data = readCacheFile(cachepath)
+            if data is not None:
+                try:
+                    magic,cachedpath,cachedfp,cachedcode = data
+                    if magic == self.magic and cachedpath == path and cachedfp == fp:
+                        code = cachedcode
+                except ValueError:
+                    pass
+            if code is not None:
+                self.touch(cachepath)
+
+        if code is None:
+            code = compile(open(path).read(), path, 'exec')
+            if cachepath is not None:
+                writeCacheFile(cachepath,(self.magic,path,fp,code))
+                # looking at the whole directory each time would
+                # be slow on a network file system
+                self.written += 1
+                if self.written >= envmasterconf.CODECACHE_EVICTWRITES:
+                    self.evict()
+
+        self.memory[path] = (fp,code)
+        return code
+
+    def touch(self,cachepath):
+        """
+        Marks a cache file as recently used so it isn't
+        evicted.
+        """
+        try:
+            now = time.time()
+            if now - os.stat(cachepath).st_mtime > self.TOUCH_INTERVAL:
+                os.utime(cachepath,None)
+        except OSError:
+            pass
+
+    def finish(self):
+        """
+        Called at exit. Runs evict() if anything
+        has been written since it was last run.
+        """
+        if self.written > 0:
+            self.evict()
+
+    def evict(self):
+        """
+        If the cache directory is bigger than
+        envmasterconf.CODECACHE_MAXSIZE delete the least
+        recently used files until it is a quarter under.
+        """
+        self.written = 0
+        entries = []
+        totalsize = 0
+        try:
+            for name in os.listdir(self.cachedir):
+                cachepath = os.path.join(self.cachedir,name)
+                try:
+                    st = os.stat(cachepath)
+                except OSError:
+                    # deleted by someone else
+                    continue
+                entries.append((st.st_mtime,st.st_size,cachepath))
+                totalsize += st.st_size
+        except OSError:
+            return
+
+        maxsize = envmasterconf.CODECACHE_MAXSIZE
+        if totalsize <= maxsize:
+            return
+        # oldest first
+        entries.sort()
+        for mtime,size,cachepath in entries:
+            if totalsize <= maxsize * 0.75:
+                break
+            try:
+                os.remove(cachepath)
+            except OSError:
+                pass
+            totalsize -= size
+
+_codecache = None
+
+def getCodeCache():
+    """
+    Returns the shared CodeCache instance, or None
+    if this cache is turned off.
+    """
+    global _codecache
+    if not envmasterconf.USE_CODECACHE or cachingDisabled():
+        return None
+    if _codecache is None:
+        _cachelock.acquire()
+        try:
+            if _codecache is None:
+                cachedir = getCacheDir()
+                if cachedir is not None:
+                    cachedir = os.path.join(cachedir,envmasterconf.CODECACHESUBDIR)
+                    if not os.path.isdir(cachedir):
+                        try:
+                            os.mkdir(cachedir,0o700)
+                        except OSError:
+                            if not os.path.isdir(cachedir):
+                                cachedir = None
+                cache = CodeCache(cachedir)
+                if cachedir is not None:
+                    import atexit
+                    atexit.register(cache.finish)
+                _codecache = cache
+        finally:
+            _cachelock.release()
+    return _codecache
+
+def compileFile(path):
+    """
+    Returns the compiled code object for the Python file
+    in path. Goes through the CodeCache if it is turned on.
+    """
+    codecache = getCodeCache()
+    if codecache is None:
+        return compile(open(path).read(), path, 'exec')
+    return codecache.compileFile(path)
@@ -0,0 +1,333 @@
+"""
+Module that keeps a catalog of what each module file does,
+worked out by reading the file with the ast module rather
+than running it.
+
+Most module files are just a list of module.xxx() calls with
+literal arguments. These are 'static' and everything they do
+is recorded so 'avail --long' can show their descriptions and
+'disp' can show them without running them (setAll() still
+looks at the install directory). Any file with other
+statements (if, for, variables etc) is flagged as dynamic and
+has to be run to find out what it does, although any top level
+calls with literal arguments are still recorded.
+
+The catalog is saved in the cache directory and each entry is
+only worked out again when the module file's modification time
+or size changes.
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+import ast
+import threading
+if sys.version_info[0] < 3:
+    # keep compatibility with Python2.4
+    import envmasterconf
+    import envmastercache
+else:
+    from envmaster import envmasterconf
+    from envmaster import envmastercache
+
+# the EnvMasterEnv methods a static module file can call. They
+# only depend on their arguments (and the install directory
+# for setAll()) so can be replayed for 'disp'.
+STATICMETHODS = ('whatis','prereq','conflict','load','swap','setVar',
+        'setPath','setBin','setLib','setMan','setInclude','setPython',
+        'setPkgConfig','setCMake','setAll')
+
+# the variable each of the set methods changes
+# if one isn't passed
+DEFAULTVARS = {'setBin' : envmasterconf.PATH,'setLib' : envmasterconf.LIBPATH,
+        'setMan' : envmasterconf.MANPATH,'setPython' : envmasterconf.PYPATH,
+        'setPkgConfig' : envmasterconf.PKGCONFIGPATH,
+        'setCMake' : envmasterconf.CMAKEPATH}
+
+def getLiteralCall(node):
+    """
+    If node is a statement like module.name(args) where all
+    the arguments are literals returns (name,args,kwargs).
+    Otherwise returns None.
+    """
+    if not isinstance(node,ast.Expr) or not isinstance(node.value,ast.Call):
+        return None
+    call = node.value
+    func = call.func
+    if (not isinstance(func,ast.Attribute) or
+            not isinstance(func.value,ast.Name) or func.value.id != 'module'):
+        return None
+    if getattr(call,'starargs',None) is not None or getattr(call,'kwargs',None) is not None:
+        # Python < 3.5
+        return None
+    try:
+        args = []
+        for arg in call.args:
+            args.append(ast.literal_eval(arg))
+        kwargs = {}
+        for keyword in call.keywords:
+            if keyword.arg is None:
+                # **kwargs
+                return None
+            kwargs[keyword.arg] = ast.literal_eval(keyword.value)
+    except ValueError:
+        # not a literal (*args comes through here too)
+        return None
+    return func.attr,tuple(args),kwargs
+
+def isDocString(node):
+    """
+    Returns True if node is a statement that is
+    just a string (ie a doc string)
+    """
+    if not isinstance(node,ast.Expr):
+        return False
+    if hasattr(ast,'Constant') and isinstance(node.value,ast.Constant):
+        return isinstance(node.value.value,str)
+    # Python < 3.8
+    return hasattr(ast,'Str') and isinstance(node.value,ast.Str)
+
+def scanModuleFile(path):
+    """
+    Reads the module file in path and returns a tuple of
+    (static,calls,reason). calls is a list of (name,args,kwargs)
+    for each top level module.name() call with literal arguments.
+    static is True if that is all the file does, otherwise reason
+    says why not.
+    """
+    calls = []
+    try:
+        source = open(path).read()
+        tree = ast.parse(source,path)
+    except (IOError,OSError,SyntaxError,ValueError,TypeError):
+        return False,calls,'unable to parse: %s' % sys.exc_info()[1]
+
+    reason = None
+    for node in tree.body:
+        if isinstance(node,ast.Pass) or isDocString(node):
+            continue
+        call = getLiteralCall(node)
+        if call is None:
+            if reason is None:
+                reason = 'line %d is not a module call with literal arguments' % node.lineno
+            continue
+        if call[0] not in STATICMETHODS:
+            if reason is None:
+                reason = 'line %d calls module.%s()' % (node.lineno,call[0])
+            continue
+        calls.append(call)
+    return reason is None,calls,reason
+
+class ModuleInfo(object):
+    """
+    What the catalog knows about one module file
+    """
+    def __init__(self,path,static,calls,reason):
+        self.path = path
+        # True if calls is everything the file does
+        self.static = static
+        # list of (name,args,kwargs)
+        self.calls = calls
+        # why the file isn't static (or None)
+        self.reason = reason
+
+    def getArgs(self,name):
+        """
+        Returns a list of the arguments of each
+        call to module.name()
+        """
+        return [args for callname,args,kwargs in self.calls if callname == name]
+
+    def getWhatIs(self):
+        """
+        Returns the description passed to module.whatis()
+        or None
+        """
+        for args in self.getArgs('whatis'):
+            if len(args) > 0:
+                return str(args[0])
+        return None
+
+    def getNameArgs(self,name):
+        """
+        Like getArgs() but only for the calls where all
+        the arguments are strings (ie module names)
+        """
+        namelist = []
+        for callname,args,kwargs in self.calls:
+            if (callname == name and len(args) > 0 and len(kwargs) == 0
+                    and all([isinstance(arg,str) for arg in args])):
+                namelist.append(args)
+        return namelist
+
+    def getLoads(self):
+        """
+        Returns the names of the modules loaded
+        """
+        loads = []
+        for args in self.getNameArgs('load'):
+            loads.extend(args)
+        return loads
+
+    def getPrereqs(self):
+        """
+        Returns a tuple of module names for each
+        module.prereq() call
+        """
+        return self.getNameArgs('prereq')
+
+    def getConflicts(self):
+        """
+        Returns a tuple of module names for each
+        module.conflict() call
+        """
+        return self.getArgs('conflict')
+
+    def getVariables(self):
+        """
+        Returns the names of the variables set by setVar() and
+        setPath() and the path variables changed by setBin() etc.
+        Doesn't include the ones named after the package or
+        found by setAll().
+        """
+        variables = []
+        for name,args,kwargs in self.calls:
+            var = None
+            if name in ('setVar','setPath'):
+                if len(args) > 1:
+                    var = args[1]
+                else:
+                    var = kwargs.get('var')
+                if len(args) > 2:
+                    addpkgname = args[2]
+                else:
+                    addpkgname = kwargs.get('addpkgname',False)
+                if name == 'setVar' and addpkgname:
+                    # named after the package
+                    var = None
+            elif name in DEFAULTVARS:
+                if len(args) > 1:
+                    var = args[1]
+                else:
+                    var = kwargs.get('var',DEFAULTVARS[name])
+            if var is not None and var not in variables:
+                variables.append(var)
+        return variables
+
+    def replay(self,env):
+        """
+        Makes the calls on env (an EnvMasterEnv with a
+        DisplayShell)
+        """
+        for name,args,kwargs in self.calls:
+            getattr(env,name)(*args,**kwargs)
+
+class Catalog(object):
+    """
+    The catalog of module files. Use getCatalog()
+    rather than creating one of these.
+    """
+    def __init__(self,path):
+        self.path = path
+        # module file path -> (fingerprint,static,calls,reason)
+        self.entries = {}
+        self.dirty = False
+        if path is not None:
+            data = readCatalog(path)
+            if data is not None:
+                self.entries = data
+
+    def getInfo(self,path):
+        """
+        Returns the ModuleInfo for the module file
+        in path, scanning it if it is new or has changed
+        """
+        fp = envmastercache.fingerprint(path)
+        entry = self.entries.get(path)
+        if entry is None or entry[0] != fp:
+            static,calls,reason = scanModuleFile(path)
+            entry = (fp,static,calls,reason)
+            self.entries[path] = entry
+            self.dirty = True
+        fp,static,calls,reason = entry
+        return ModuleInfo(path,static,calls,reason)
+
+    def save(self):
+        """
+        Writes the catalog to disk if anything has changed
+        """
+        if not self.dirty or self.path is None:
+            return
+        if len(self.entries) > envmasterconf.CATALOG_MAXENTRIES:
+            # files that have gone away build up over
+            # time. Simplest to start again.
+            self.entries = {}
+        envmastercache.writeCacheFile(self.path,self.entries)
+        self.dirty = False
+
+def readCatalog(path):
+    """
+    Reads the catalog entries from path. Returns None if
+    the file doesn't exist or isn't understood.
+    """
+    data = envmastercache.readCacheFile(path)
+    if not isinstance(data,dict):
+        return None
+    return data
+
+_catalog = None
+_cataloglock = threading.Lock()
+
+def getModuleInfo(path):
+    """
+    Returns the ModuleInfo for the module file in path. From
+    the catalog if it is turned on, otherwise the file is
+    scanned each time.
+    """
+    catalog = getCatalog()
+    if catalog is not None:
+        return catalog.getInfo(path)
+    static,calls,reason = scanModuleFile(path)
+    return ModuleInfo(path,static,calls,reason)
+
+def getCatalog():
+    """
+    Returns the shared Catalog instance, or None if the catalog
+    is turned off. If caching is turned off (see envmastercache)
+    it isn't saved between runs.
+    """
+    global _catalog
+    if not envmasterconf.USE_CATALOG:
+        return None
+    if _catalog is None:
+        # the planner uses it from the prefetch threads
+        _cataloglock.acquire()
+        try:
+            if _catalog is None:
+                path = None
+                if not envmastercache.cachingDisabled():
+                    cachedir = envmastercache.getCacheDir()
+                    if cachedir is not None:
+                        path = os.path.join(cachedir,envmasterconf.CATALOGFILE)
+                catalog = Catalog(path)
+                import atexit
+                atexit.register(catalog.save)
+                _catalog = catalog
+        finally:
+            _cataloglock.release()
+    return _catalog
@@ -0,0 +1,211 @@
+"""
+Handles the command line of envmastercmd.py. Kept
+here rather than in the script so the same commands
+can be run by the EnvMaster daemon (see envmasterdaemon)
+and so it can be installed as a console entry point
+or run with 'python -m envmaster'.
+
+Only the modules needed for loading and unloading are
+imported up front so the common case starts quickly.
+See benchmarks/startup.py.
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+import sys
+if sys.version_info[0] < 3:
+    # keep compatibility with Python2.4
+    import envmasterfile
+    import envmasterexceptions
+else:
+    from envmaster import envmasterfile
+    from envmaster import envmasterexceptions
+
+# actions that replace this process rather than
+# writing commands for the shell
+EXECACTIONS = ('exec','shell')
+
+def printUsage():
+    """
+    Print a simple usage message
+    and exit
+    """
+    envmasterformat = envmasterfile.importFormat()
+    fmt = envmasterformat.EnvMasterFormat()
+    fmt.displayTitle("Usage")
+
+    helplist = []
+
+    helplist.extend(['Command','Option','Arguments','Help'])
+    helplist.extend(['-------','------','---------','----'])
+    helplist.extend(['envmaster','avail','<--long>','Show all available modules'])
+    helplist.extend(['envmaster','list','','Show loaded modules'])
+    helplist.extend(['envmaster','help','','Display this message'])
+    helplist.extend(['envmaster','search','word1 <word2...>','Find modules by name, description etc'])
+    helplist.extend(['envmaster','disp','<--exec> mod1 <mod2...>','Display the contents of module(s)'])
+    helplist.extend(['envmaster','load','mod1 <mod2...>','Load the specified module(s)'])
+    helplist.extend(['envmaster','unload','mod1 <mod2...>','Unload the specified module(s)'])
+    helplist.extend(['envmaster','swap','mod1 mod2','Unload mod1 and replace with mod2'])
+    helplist.extend(['envmaster','reload','mod1 <mod2...>','Reload with the default version'])
+    helplist.extend(['envmaster','allreload','<--all>','Reload loaded modules that have changed'])
+    helplist.extend(['envmaster','allunload','','Unload all loaded modules'])
+    helplist.extend(['envmaster','save','name mod1 <mod2...>','Save modules as a collection'])
+    helplist.extend(['envmaster','restore','name','Load a saved collection'])
+    helplist.extend(['envmaster','purge','','Put back the environment from before any loads'])
+    helplist.extend(['envmaster','snapshot','save|restore name','Save or restore the environment'])
+    helplist.extend(['envmaster','index','build <dir1 <dir2...>>','Index the module directories (admins)'])
+    helplist.extend(['envmaster','exec','mod1 <mod2...> -- cmd <args...>','Run a command with the module(s) loaded'])
+    helplist.extend(['envmaster','shell','mod1 <mod2...>','Start a shell with the module(s) loaded'])
+    fmt.displayTable(helplist,4)
+
+    sys.exit(1)
+
+def runExec(argv):
+    """
+    Run an 'exec' or 'shell' command line, ie
+    ['exec','mod1','--','cmd','arg1']. These are given
+    without the name of the shell as nothing is written out
+    for it - this process is replaced with the command.
+    """
+    action = argv[0]
+    modlist = argv[1:]
+    cmdargs = None
+    if action == 'exec':
+        if '--' not in modlist:
+            printUsage()
+        index = modlist.index('--')
+        cmdargs = modlist[index+1:]
+        modlist = modlist[:index]
+        if len(cmdargs) == 0:
+            printUsage()
+    if len(modlist) == 0:
+        printUsage()
+
+    modfile = envmasterfile.EnvMasterFile()
+    modfile.execCommand(modlist,cmdargs)
+
+def runCommand(argv):
+    """
+    Run the command given in argv (which doesn't include
+    the name of the script) ie ['bash','load','mod1'].
+    Commands for the shell are written to envmasterconf.STDOUT
+    """
+    if len(argv) > 0 and argv[0] in EXECACTIONS:
+        runExec(argv)
+        return
+
+    if len(argv) < 2:
+        printUsage()
+
+    shell = argv[0]
+    action = argv[1]
+
+    if action in EXECACTIONS:
+        # whatever we wrote out would be evaluated by the
+        # shell (ie tcsh, where the alias can't tell them apart)
+        msg = "'%s' can't be run through the %s alias, use 'envmastercmd.py %s' directly"
+        raise envmasterexceptions.EnvMasterExecError(msg % (action,shell,' '.join(argv[1:])))
+
+    # create our EnvMasterFile instance
+    # that does all the work.
+    modfile = envmasterfile.EnvMasterFile()
+
+    if action.startswith('avail'):
+        longlist = len(argv) > 2 and argv[2] in ('--long','-l')
+        modfile.availModules(longlist,shell)
+    elif action.startswith('list'):
+        modfile.listModules(shell)
+    elif action.startswith('help'):
+        printUsage()
+    elif action.startswith('allreload'):
+        force = len(argv) > 2 and argv[2] == '--all'
+        modfile.reloadAllModules(shell,force)
+    elif action.startswith('allunload'):
+        modfile.unloadAllModules(shell)
+    elif action.startswith('purge'):
+        modfile.purgeModules(shell)
+    elif action.startswith('snapshot'):
+        if len(argv) != 4:
+            printUsage()
+        if argv[2] == 'save':
+            modfile.saveSnapshot(argv[3])
+        elif argv[2] == 'restore':
+            modfile.restoreSnapshot(shell,argv[3])
+        else:
+            printUsage()
+    elif action.startswith('index'):
+        if len(argv) < 3 or argv[2] != 'build':
+            printUsage()
+        roots = None
+        if len(argv) > 3:
+            roots = argv[3:]
+        modfile.buildIndexes(roots)
+    else:
+        # other actions need list of modules
+        modlist = argv[2:]
+        if len(modlist) == 0:
+            printUsage()
+
+
+        if action.startswith('disp'):
+            execute = modlist[0] == '--exec'
+            if execute:
+                modlist = modlist[1:]
+                if len(modlist) == 0:
+                    printUsage()
+            modfile.dispModule(modlist,execute)
+
+        elif action.startswith('load'):
+            modfile.runModule(shell,modlist,True)
+
+        elif action.startswith('unload'):
+            modfile.runModule(shell,modlist,False)
+
+        elif action.startswith('sw'):
+            if len(modlist) != 2:
+                printUsage()
+            modfile.runBatch(shell,[(modlist[0],False),(modlist[1],True)])
+
+        elif action.startswith('search'):
+            modfile.searchModules(' '.join(modlist))
+
+        elif action.startswith('save'):
+            if len(modlist) < 2:
+                printUsage()
+            modfile.saveCollection(modlist[0], modlist[1:])
+
+        elif action.startswith('restore'):
+            if len(modlist) != 1:
+                printUsage()
+            modfile.restoreCollection(shell, modlist[0])
+
+        elif action.startswith('reload'):
+            if len(modlist) == 0:
+                printUsage()
+            operations = []
+            for mod in modlist:
+                operations.append((mod, False))
+                operations.append((mod, True))
+            modfile.runBatch(shell, operations)
+
+        else:
+            printUsage()
+
+def main():
+    """
+    Entry point for the console script
+    """
+    runCommand(sys.argv[1:])
@@ -0,0 +1,200 @@
+"""
+Module that handles named collections of modules saved
+with 'envmaster save NAME mod1 mod2...'.
+
+The modules are loaded once (without changing the current
+shell) and the commands each type of shell needs to get the
+same result are stored along with the fingerprints of
+everything that went into them (module files, install
+directories looked at by setAll() and the values the changed
+variables had beforehand). 'envmaster restore NAME' just
+writes out the stored commands if none of these have changed.
+If the files have changed the collection is saved again
+starting from the same values as before.
+
+Plain scripts (NAME.sh, NAME.csh, NAME.bat and NAME.R) are
+also written to the same directory so they can be used
+without EnvMaster at all.
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+if sys.version_info[0] < 3:
+    # keep compatibility with Python2.4
+    import envmasterconf
+    import envmastercache
+    import envmasterenviron
+    import envmasterexceptions
+    from envmastershells import shellFromString
+else:
+    from envmaster import envmasterconf
+    from envmaster import envmastercache
+    from envmaster import envmasterenviron
+    from envmaster import envmasterexceptions
+    from envmaster.envmastershells import shellFromString
+
+# the shells we store commands for and the
+# extension of the plain script written for each
+COLLECTIONSHELLS = {'bash':'sh','csh':'csh','dos':'bat','r':'R'}
+
+# extension of the file the collection itself is saved in
+COLLECTIONEXT = 'emcoll'
+
+def getCollectionPath(name,ext=COLLECTIONEXT):
+    """
+    Returns the path of the file for the named collection
+    with the given extension
+    """
+    if name == '' or name.startswith('.') or name.find(os.sep) != -1:
+        msg = "Invalid collection name '%s'" % name
+        raise envmasterexceptions.EnvMasterCollectionError(msg)
+    return os.path.join(envmasterconf.COLLECTIONDIR,name + '.' + ext)
+
+def getShellKey(shell):
+    """
+    Returns which of the COLLECTIONSHELLS is the same type
+    of shell as shell (name or object) or None if we don't
+    store commands for it.
+    """
+    shellclass = type(shellFromString(shell,True))
+    for key in COLLECTIONSHELLS:
+        if type(shellFromString(key,True)) is shellclass:
+            return key
+    return None
+
+def formatValues(shell,values,pathvars):
+    """
+    Returns the text shell would write out to set
+    the variables in values (name -> value or None to unset).
+    The names of path variables are in pathvars.
+    """
+    lines = []
+    for var in sorted(values.keys()):
+        value = values[var]
+        if value is None:
+            cmd = shell.unsetCmd(var)
+        elif var in pathvars:
+            cmd = shell.pathCmd(value,var)
+        else:
+            cmd = shell.varCmd(value,var)
+        if cmd is not None:
+            lines.append(cmd + '\n')
+    return ''.join(lines)
+
+def writeFile(path,text):
+    """
+    Writes text to path, replacing it atomically
+    """
+    tmppath = '%s.%d.tmp' % (path,os.getpid())
+    fileobj = open(tmppath,'w')
+    try:
+        fileobj.write(text)
+    finally:
+        fileobj.close()
+    os.rename(tmppath,path)
+
+class Collection(object):
+    """
+    A saved collection of modules. Create with the
+    results of loading the modules and call save(), or
+    use loadCollection().
+    """
+    def __init__(self,name,modlist,resolved,validators,base,final,pathvars,texts=None):
+        self.name = name
+        # the module names as given
+        self.modlist = list(modlist)
+        # list of (modname,fullmodname,path) as
+        # returned by EnvMasterFile.getModule()
+        self.resolved = [tuple(r) for r in resolved]
+        # (path,fingerprint) of the files and directories
+        # the result depends on
+        self.validators = [tuple(v) for v in validators]
+        # name -> value (or None) of the variables
+        # changed before and after loading
+        self.base = dict(base)
+        self.final = dict(final)
+        self.pathvars = list(pathvars)
+        # shell key -> commands
+        if texts is None:
+            texts = {}
+            for key in COLLECTIONSHELLS:
+                shell = shellFromString(key,True)
+                texts[key] = formatValues(shell,self.final,self.pathvars)
+        self.texts = texts
+
+    def matchesEnviron(self,environ=None):
+        """
+        Returns True if the variables the collection changes
+        have the same values in environ (see envmasterenviron,
+        the environment of the current process if None) as they
+        did when it was saved (so the stored commands give the
+        same result).
+        """
+        if environ is None:
+            environ = envmasterenviron.PROCESSENVIRON
+        for var,value in self.base.items():
+            if environ.get(var) != value:
+                return False
+        return True
+
+    def isUpToDate(self,modfile):
+        """
+        Returns True if none of the module files or directories
+        the collection depends on have changed and the modules
+        are still found in the same place. modfile is the
+        EnvMasterFile used to find the modules.
+        """
+        if not envmastercache.validatorsOk(self.validators):
+            return False
+        for modname,fullmod,path in self.resolved:
+            if modfile.getModule(modname) != (fullmod,path):
+                return False
+        return True
+
+    def save(self):
+        """
+        Writes the collection and the plain scripts
+        """
+        path = getCollectionPath(self.name)
+        try:
+            if not os.path.isdir(envmasterconf.COLLECTIONDIR):
+                os.makedirs(envmasterconf.COLLECTIONDIR,0o700)
+            for key,ext in COLLECTIONSHELLS.items():
+                writeFile(getCollectionPath(self.name,ext),self.texts[key])
+        except (IOError,OSError):
+            msg = "Unable to save collection '%s': %s" % (self.name,sys.exc_info()[1])
+            raise envmasterexceptions.EnvMasterCollectionError(msg)
+        data = (self.modlist,self.resolved,self.validators,self.base,
+                    self.final,self.pathvars,self.texts)
+        envmastercache.writeCacheFile(path,data)
+        if not os.path.exists(path):
+            msg = "Unable to save collection '%s'" % self.name
+            raise envmasterexceptions.EnvMasterCollectionError(msg)
+
+def loadCollection(name):
+    """
+    Returns the named Collection as saved by Collection.save()
+    """
+    data = envmastercache.readCacheFile(getCollectionPath(name))
+    try:
+        modlist,resolved,validators,base,final,pathvars,texts = data
+    except (ValueError,TypeError):
+        msg = "Unable to read collection '%s'" % name
+        raise envmasterexceptions.EnvMasterCollectionError(msg)
+    return Collection(name,modlist,resolved,validators,base,final,pathvars,texts)
@@ -48,18 +48,38 @@ else:
 MANPATH = 'MANPATH'
 # for python modules
 PYPATH = 'PYTHONPATH'
+# for pkg-config files
+PKGCONFIGPATH = 'PKG_CONFIG_PATH'
+# for CMake package config files. Note this is 
+# a list of prefixes rather than the directories
+# the files are in.
+CMAKEPATH = 'CMAKE_PREFIX_PATH'
 
 # Subdirectories used relative to rootpath specified
 # in setAll method
 #==============================================
 
 SUBDIRS = {'BIN_SUBPATH':['bin'],# for executeable files
-            'LIB_SUBPATH':['lib'],# for libraries
+            'LIB_SUBPATH':['lib','lib64'],# for libraries - first one with files
             'INCLUDE_SUBPATH':['include'],# for include files
             'MAN_SUBPATH':['share%sman' % os.sep,'man'],# for man pages - tries 2 places
             # for python modules - this is where setup.py install --prefix
-            # puts the files under the dir specified.
-            'PYTHON_SUBPATH':['lib/python%d.%d/site-packages' % (sys.version_info[0],sys.version_info[1])]}
+            # puts the files under the dir specified. All that exist are used.
+            # The directories the running interpreter uses are added to these
+            # if USE_INTERPRETER_PYTHON_SUBPATH is True.
+            'PYTHON_SUBPATH':['lib%spython%d.%d%ssite-packages' % (os.sep,sys.version_info[0],sys.version_info[1],os.sep),
+                            'lib64%spython%d.%d%ssite-packages' % (os.sep,sys.version_info[0],sys.version_info[1],os.sep)],
+            # for pkg-config .pc files - all that exist are used
+            'PKGCONFIG_SUBPATH':['lib%spkgconfig' % os.sep,'lib64%spkgconfig' % os.sep,
+                            'share%spkgconfig' % os.sep],
+            # if any of these exist the root path is added to CMAKEPATH
+            'CMAKE_SUBPATH':['lib%scmake' % os.sep,'lib64%scmake' % os.sep,
+                            'share%scmake' % os.sep]}
+
+# also look for python modules where the running interpreter
+# would install them relative to a prefix 
+# (eg lib/python3/dist-packages on Debian)
+USE_INTERPRETER_PYTHON_SUBPATH = True
         
 # Standard environment variable names
 #==============================================
@@ -70,6 +90,7 @@ ENVNAMES = {'BIN_SUFFIX':'BIN_PATH',   # for 'bin' files
             'INCLUDE_SUFFIX':'INCLUDE_PATH', # for 'include' files
             'MAN_SUFFIX':'MAN_PATH', # for man pages
             'PYTHON_SUFFIX':'PYTHON_PATH', # for python modules
+            'PKGCONFIG_SUFFIX':'PKGCONFIG_PATH', # for pkg-config files
             'ROOT_SUFFIX':'ROOT' # for root of package
             }
 
@@ -79,6 +100,33 @@ ENVNAMES = {'BIN_SUFFIX':'BIN_PATH',   # for 'bin' files
 # of which modules currently loaded
 LOADEDMODULESENV = 'ENVMASTERLOADED'
 
+# environment variable used to keep track of 
+# which modules added each entry to path variables
+# so they are only removed when no longer needed
+PATHREFSENV = 'ENVMASTERREFS'
+
+# environment variable used to keep the values
+# variables had before EnvMaster first changed them
+# (for 'envmaster purge')
+BASELINEENV = 'ENVMASTERBASELINE'
+
+# environment variable used to keep the fingerprints
+# of the module files of the loaded modules so
+# 'envmaster allreload' only reloads those that have changed
+FINGERPRINTSENV = 'ENVMASTERFINGERPRINTS'
+
+# environment variable used to keep what each loaded
+# module did so it can be unloaded without running
+# the module file again (see envmastereffects.py)
+EFFECTSENV = 'ENVMASTEREFFECTS'
+
+# the variables above that are EnvMaster's own records
+# (which grow with each module loaded) rather than something
+# other programs need. Left out of the result of
+# pyutils.resolve(), the json and env0 output and the
+# environment of the command run by 'envmaster exec'
+RECORDVARS = (PATHREFSENV,BASELINEENV,FINGERPRINTSENV,EFFECTSENV)
+
 # name of environment variable that contains
 # all directories to look for modules under
 ENVMASTERPATH = 'ENVMASTERPATH'
@@ -97,8 +145,135 @@ VERSIONVAR = 'version'
 # they are ignored
 ENVMASTERSENTINEL = '#%EnvMaster1.0'
 
+# before loading, work out all the modules that
+# will be loaded by module.load() calls in the module
+# files (and the modules they load etc) so each is only
+# found once and modules that load each other are caught
+# before anything is run (see envmasterplan.py)
+USE_LOADPLANNER = True
+# if True, when a module file has a module.prereq()
+# that isn't satisfied the first module listed is
+# loaded rather than an error being raised
+PLAN_AUTOLOAD_PREREQS = False
+# if True 'envmaster allreload' only reloads the modules
+# that have changed since they were loaded (and those that
+# load them). 'allreload --all' reloads everything.
+RELOAD_CHANGED_ONLY = True
+# if True modules are unloaded by undoing what they did
+# when they were loaded (recorded in EFFECTSENV) rather
+# than by running the module file again
+UNLOAD_FROM_EFFECTS = True
+# number of threads that find, scan and compile the module
+# files to be loaded ahead of them being run (see
+# envmasterprefetch.py). 0 to do everything in turn.
+PREFETCH_THREADS = 4
+
+# maximum number of threads used to scan the 
+# directories in ENVMASTERPATH at the same time
+# for 'envmaster avail'
+AVAIL_THREADS = 8
+
 # by default output for the shell is sent
 # to stdout, and output for user sent to 
 # stderr. Override by  changing these vars.
 STDOUT = sys.stdout
 STDERR = sys.stderr
+
+# Caching
+#==============================================
+# per user directory where EnvMaster keeps its
+# caches and other state
+USERDIR = os.path.join(os.path.expanduser('~'),'.envmaster')
+
+# directory that 'envmaster snapshot save' 
+# saves snapshots in
+SNAPSHOTDIR = os.path.join(USERDIR,'snapshots')
+
+# directory that 'envmaster save' saves
+# collections of modules in
+COLLECTIONDIR = os.path.join(USERDIR,'collections')
+
+# directory the caches are kept in. Can be
+# overridden with the environment variable named
+# in CACHEDIRENV
+CACHEDIR = os.path.join(USERDIR,'cache')
+CACHEDIRENV = 'ENVMASTER_CACHEDIR'
+
+# if the environment variable named here is set
+# no caches are read or written
+NOCACHEENV = 'ENVMASTER_NOCACHE'
+
+# remember where modules were found (and which
+# version is the default) between runs. Entries
+# are checked against the modification times of
+# the files and directories involved before use.
+USE_RESOLVECACHE = True
+# name of the file in CACHEDIR it is stored in
+RESOLVECACHEFILE = 'resolve-py%d.cache' % sys.version_info[0]
+# maximum number of entries kept
+RESOLVECACHE_MAXENTRIES = 10000
+
+# keep the compiled form of module files so they
+# don't have to be parsed each time they are run
+USE_CODECACHE = True
+# subdirectory of CACHEDIR it is stored in
+CODECACHESUBDIR = 'code'
+# once the cache gets bigger than this many bytes the
+# least recently used entries are removed
+CODECACHE_MAXSIZE = 16 * 1024 * 1024
+# the size is checked at exit or after this
+# many files have been written to the cache
+CODECACHE_EVICTWRITES = 100
+
+# keep a catalog of what each module file does (worked
+# out without running them) for 'avail --long' and 'disp'.
+# See envmastercatalog.py.
+USE_CATALOG = True
+# name of the file in CACHEDIR it is stored in
+CATALOGFILE = 'catalog-py%d.cache' % sys.version_info[0]
+# maximum number of module files kept
+CATALOG_MAXENTRIES = 50000
+# name of the file in CACHEDIR the index used by
+# 'search' is stored in (see envmastersearch.py)
+SEARCHINDEXFILE = 'search-py%d.cache' % sys.version_info[0]
+# use the index files written by 'envmaster index build'
+# at the top of the directories in ENVMASTERPATH rather
+# than looking at the module files (see envmasterindex.py)
+USE_ROOTINDEX = True
+# name of the index file in each directory
+INDEXFILE = '.envmasterindex'
+# maximum number of results of pyutils.resolve()
+# remembered by the Python process
+RESOLVE_MAXENTRIES = 256
+
+# Daemon
+#==============================================
+# if the environment variable named here is set
+# the shell init scripts send commands to the
+# EnvMaster daemon (envmasterd.py) rather than
+# starting Python each time
+DAEMONENV = 'ENVMASTER_DAEMON'
+
+# the daemon listens on a Unix socket. By default
+# this is in $XDG_RUNTIME_DIR or a private directory
+# under /tmp. Set this environment variable to
+# the path of the socket to override.
+DAEMONSOCKETENV = 'ENVMASTER_SOCKET'
+
+# the daemon exits when it hasn't been asked to do
+# anything for this many seconds
+DAEMON_IDLETIMEOUT = 8 * 60 * 60
+
+# seconds the daemon waits for a client to send its
+# request (or read the reply) before giving up on it
+# so one stuck client can't hold up the others
+DAEMON_CONNTIMEOUT = 10
+
+# Tracing
+#==============================================
+# set the environment variable named here to 'stderr'
+# (or 1) or the name of a file to get a line of JSON
+# for each phase of the command (finding modules,
+# running them etc) with how long it took and how
+# many file system calls it made. See envmastertrace.py.
+TRACEENV = 'ENVMASTER_TRACE'
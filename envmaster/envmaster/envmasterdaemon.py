@@ -0,0 +1,354 @@
+"""
+The EnvMaster daemon. This is an optional per user process
+that sits behind a Unix socket and runs envmastercmd.py
+commands on behalf of the thin client (envmasterclient.py).
+This saves starting Python and importing EnvMaster for every
+command and means the caches in envmastercache stay in memory
+between commands.
+
+The client sends (as marshal) the command line, its environment
+and current directory. The daemon runs the command with that
+environment and sends back the exit status and what would have
+been written to stdout and stderr. Only one command is run at
+a time since commands update os.environ.
+
+Use envmasterd.py to start and stop the daemon.
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+import stat
+import socket
+import struct
+import marshal
+import traceback
+if sys.version_info[0] < 3:
+    # keep compatibility with Python2.4
+    from StringIO import StringIO
+    import envmasterconf
+    import envmastercache
+    import envmastercatalog
+    import envmastersearch
+    import envmastercmdline
+    import envmasterenv
+    import envmasterindex
+else:
+    from io import StringIO
+    from envmaster import envmasterconf
+    from envmaster import envmastercache
+    from envmaster import envmastercatalog
+    from envmaster import envmastersearch
+    from envmaster import envmastercmdline
+    from envmaster import envmasterenv
+    from envmaster import envmasterindex
+
+# must match envmasterclient.py
+PROTOCOL = 1
+
+def getSocketPath():
+    """
+    Returns the path of the socket the daemon listens on.
+    envmasterclient.py has a copy of this function (so it
+    doesn't need to import anything from EnvMaster) - keep
+    them the same.
+    """
+    sockpath = os.getenv(envmasterconf.DAEMONSOCKETENV)
+    if sockpath is not None:
+        return sockpath
+    rundir = os.getenv('XDG_RUNTIME_DIR')
+    if rundir is None or not os.path.isdir(rundir):
+        rundir = '/tmp/envmaster-%d' % os.getuid()
+    return os.path.join(rundir,'envmaster.sock')
+
+def sendRequest(request,sockpath=None):
+    """
+    Sends a request tuple to the daemon and returns
+    the reply. Raises socket.error if the daemon
+    isn't running.
+    """
+    if sockpath is None:
+        sockpath = getSocketPath()
+    sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+    sock.settimeout(envmasterconf.DAEMON_CONNTIMEOUT)
+    try:
+        sock.connect(sockpath)
+        sock.sendall(marshal.dumps((PROTOCOL,) + tuple(request)))
+        sock.shutdown(socket.SHUT_WR)
+        reply = readAll(sock)
+    finally:
+        sock.close()
+    return marshal.loads(reply)
+
+def readAll(sock):
+    """
+    Read from sock until the other end closes it
+    """
+    chunks = []
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            break
+        chunks.append(data)
+    return b''.join(chunks)
+
+class EnvMasterDaemon(object):
+    """
+    Listens on the socket and runs the commands sent to it
+    """
+    def __init__(self,sockpath=None):
+        if sockpath is None:
+            sockpath = getSocketPath()
+        self.sockpath = sockpath
+        self.sock = None
+        self.running = False
+
+    def makeSocketDir(self):
+        """
+        Create the directory the socket lives in (if needed)
+        and make sure no one else can get to it.
+        """
+        sockdir = os.path.dirname(self.sockpath)
+        if not os.path.isdir(sockdir):
+            os.makedirs(sockdir,0o700)
+        st = os.stat(sockdir)
+        if st.st_uid != os.getuid() or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            msg = 'Directory %s not private to this user' % sockdir
+            raise EnvironmentError(msg)
+
+    def listen(self):
+        """
+        Create the socket. Removes any stale socket left
+        by a daemon that has gone away.
+        """
+        self.makeSocketDir()
+        if os.path.exists(self.sockpath):
+            try:
+                sendRequest(('ping',),self.sockpath)
+            except (socket.error,EOFError,ValueError):
+                # no one listening
+                os.remove(self.sockpath)
+            else:
+                msg = 'EnvMaster daemon already running on %s' % self.sockpath
+                raise EnvironmentError(msg)
+        self.sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+        oldumask = os.umask(0o077)
+        try:
+            self.sock.bind(self.sockpath)
+        finally:
+            os.umask(oldumask)
+        self.sock.listen(16)
+
+    def serve(self):
+        """
+        Handle requests until we are stopped or haven't
+        been used for envmasterconf.DAEMON_IDLETIMEOUT seconds
+        """
+        if self.sock is None:
+            self.listen()
+        self.sock.settimeout(envmasterconf.DAEMON_IDLETIMEOUT)
+        self.running = True
+        try:
+            while self.running:
+                try:
+                    conn,addr = self.sock.accept()
+                except socket.timeout:
+                    break
+                # while reading the request and sending the
+                # reply - not while running the command
+                conn.settimeout(envmasterconf.DAEMON_CONNTIMEOUT)
+                try:
+                    self.handleConnection(conn)
+                except socket.error:
+                    # includes socket.timeout. The client
+                    # runs the command itself.
+                    pass
+                finally:
+                    conn.close()
+        finally:
+            self.sock.close()
+            self.sock = None
+            try:
+                os.remove(self.sockpath)
+            except OSError:
+                pass
+
+    def peerIsUs(self,conn):
+        """
+        Where the OS lets us, check that the process at the
+        other end of the socket is being run by the same user.
+        The permissions on the socket directory should stop
+        anyone else anyway.
+        """
+        if not hasattr(socket,'SO_PEERCRED'):
+            return True
+        creds = conn.getsockopt(socket.SOL_SOCKET,socket.SO_PEERCRED,
+                        struct.calcsize('3i'))
+        pid,uid,gid = struct.unpack('3i',creds)
+        return uid == os.getuid()
+
+    def handleConnection(self,conn):
+        """
+        Read a request and send back the reply
+        """
+        if not self.peerIsUs(conn):
+            return
+        try:
+            request = marshal.loads(readAll(conn))
+        except (EOFError,ValueError,TypeError):
+            return
+
+        if not isinstance(request,tuple) or len(request) < 2 or request[0] != PROTOCOL:
+            # probably a client from a different version
+            reply = ('badprotocol',PROTOCOL)
+        elif request[1] == 'ping':
+            reply = ('ok',os.getpid())
+        elif request[1] == 'stop':
+            self.running = False
+            reply = ('ok',os.getpid())
+        elif request[1] == 'run' and len(request) == 5:
+            argv,environ,cwd = request[2:]
+            reply = ('ok',) + self.runRequest(argv,environ,cwd)
+        else:
+            reply = ('badrequest',)
+        conn.sendall(marshal.dumps(reply))
+
+    def runRequest(self,argv,environ,cwd):
+        """
+        Run an envmastercmd.py command line with the given
+        environment and current directory. Returns a tuple of
+        (exit status,stdout text,stderr text).
+        """
+        oldenviron = dict(os.environ)
+        oldsyspath = sys.path[:]
+        oldcwd = os.getcwd()
+        oldstreams = (envmasterconf.STDOUT,envmasterconf.STDERR,sys.stdout,sys.stderr)
+
+        stdout = StringIO()
+        stderr = StringIO()
+        os.environ.clear()
+        os.environ.update(environ)
+        envmasterconf.STDOUT = sys.stdout = stdout
+        envmasterconf.STDERR = sys.stderr = stderr
+        try:
+            status = 0
+            try:
+                os.chdir(cwd)
+                if len(argv) > 0 and argv[0] in envmastercmdline.EXECACTIONS:
+                    # would replace the daemon. envmasterclient.py
+                    # runs these itself.
+                    raise SystemExit("'%s' can't be run by the daemon" % argv[0])
+                # things may have been installed since last time
+                envmasterenv.clearPrefixCache()
+                envmasterindex.clearRootIndexes()
+                envmastercmdline.runCommand(argv)
+            except SystemExit:
+                # same as what Python does at exit
+                code = sys.exc_info()[1].code
+                if code is None:
+                    status = 0
+                elif isinstance(code,int):
+                    status = code
+                else:
+                    stderr.write('%s\n' % code)
+                    status = 1
+            except Exception:
+                traceback.print_exc(file=stderr)
+                status = 1
+        finally:
+            (envmasterconf.STDOUT,envmasterconf.STDERR,sys.stdout,sys.stderr) = oldstreams
+            os.environ.clear()
+            os.environ.update(oldenviron)
+            sys.path[:] = oldsyspath
+            os.chdir(oldcwd)
+
+        # don't wait until we exit to save what we have found
+        cache = envmastercache.getResolveCache()
+        if cache is not None:
+            cache.save()
+        catalog = envmastercatalog.getCatalog()
+        if catalog is not None:
+            catalog.save()
+        envmastersearch.getSearchIndex().save()
+
+        return (status,stdout.getvalue(),stderr.getvalue())
+
+def daemonize():
+    """
+    Detach from the terminal in the usual double fork manner.
+    Returns True in the daemon process and False in the
+    original one.
+    """
+    if os.fork() != 0:
+        # wait for the first child so we don't leave a zombie
+        os.wait()
+        return False
+    os.setsid()
+    if os.fork() != 0:
+        os._exit(0)
+    os.chdir('/')
+    devnull = os.open(os.devnull,os.O_RDWR)
+    for fd in (0,1,2):
+        os.dup2(devnull,fd)
+    os.close(devnull)
+    return True
+
+def main(argv):
+    """
+    Handles the command line of envmasterd.py
+    """
+    command = 'start'
+    if len(argv) > 0:
+        command = argv[0]
+
+    if command == 'start' or command == 'foreground':
+        daemon = EnvMasterDaemon()
+        try:
+            daemon.listen()
+        except EnvironmentError:
+            sys.stderr.write('%s\n' % sys.exc_info()[1])
+            return 1
+        if command == 'foreground' or daemonize():
+            try:
+                daemon.serve()
+            finally:
+                if command == 'start':
+                    os._exit(0)
+        else:
+            # the daemon has its own copy
+            daemon.sock.close()
+            sys.stderr.write('EnvMaster daemon listening on %s\n' % daemon.sockpath)
+        return 0
+
+    elif command == 'stop' or command == 'status':
+        try:
+            reply = sendRequest((command == 'stop' and 'stop' or 'ping',))
+        except (socket.error,EOFError,ValueError):
+            sys.stderr.write('EnvMaster daemon not running\n')
+            return 1
+        if reply[0] != 'ok':
+            sys.stderr.write('EnvMaster daemon is from a different version\n')
+            return 1
+        if command == 'stop':
+            sys.stderr.write('EnvMaster daemon (pid %d) stopped\n' % reply[1])
+        else:
+            sys.stderr.write('EnvMaster daemon (pid %d) listening on %s\n' % (reply[1],getSocketPath()))
+        return 0
+
+    sys.stderr.write('Usage: envmasterd.py [start|foreground|stop|status]\n')
+    return 1
@@ -0,0 +1,98 @@
+"""
+Module that keeps a record of what each loaded module did
+to the environment when it was loaded (the variables it set
+and the entries it added to path variables) so it can be
+unloaded by undoing these rather than finding and running
+the module file again. This means unloading doesn't touch
+the file system and does the right thing even if the module
+file has been changed or removed since it was loaded.
+
+The record is kept in the environment variable named in
+envmasterconf.EFFECTSENV. Modules that behave differently
+when unloading (ie call module.isUnloading()) aren't recorded
+so their module files are still run to unload them.
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import sys
+if sys.version_info[0] < 3:
+    # keep compatibility with Python2.4
+    import envmasterrecord
+else:
+    from envmaster import envmasterrecord
+
+# kinds of effect. A variable set is (VAREFFECT,var,value),
+# an entry added to a path variable (PATHEFFECT,var,entry)
+VAREFFECT = 'v'
+PATHEFFECT = 'p'
+
+# separates the module name, kind and arguments of a record
+FIELDSEP = '\1'
+
+class ModuleEffects(object):
+    """
+    The effects of each loaded module, in the order
+    they happened. encoded is the value of the environment
+    variable (or None).
+    """
+    def __init__(self,encoded):
+        # full module name -> list of effect tuples
+        self.effects = {}
+        self.changed = False
+        # if it can't be understood the modules will
+        # be unloaded by running them
+        for record in envmasterrecord.unpackRecords(encoded):
+            fields = record.split(FIELDSEP)
+            effects = self.effects.setdefault(fields[0],[])
+            if len(fields) > 1:
+                effects.append(tuple(fields[1:]))
+
+    def get(self,fullname):
+        """
+        Returns the list of effects of the module or None
+        if we don't have a record of them
+        """
+        return self.effects.get(fullname)
+
+    def set(self,fullname,effects):
+        """
+        Record the effects of loading the module. None
+        forgets them (ie when it is unloaded).
+        """
+        if effects is None:
+            if fullname in self.effects:
+                del self.effects[fullname]
+                self.changed = True
+        else:
+            self.effects[fullname] = list(effects)
+            self.changed = True
+
+    def getValue(self):
+        """
+        Returns the value for the environment variable
+        ('' if there is nothing recorded)
+        """
+        records = []
+        for fullname in sorted(self.effects.keys()):
+            # so modules that didn't do anything are still there
+            records.append(fullname)
+            for effect in self.effects[fullname]:
+                records.append(FIELDSEP.join((fullname,) + tuple(effect)))
+        if len(records) == 0:
+            return ''
+        return envmasterrecord.packRecords(records)
@@ -29,13 +29,23 @@ if sys.version_info[0] < 3:
     # keep compatibility with Python2.4
     from envmasterfile import EnvMasterFile
     import envmasterconf
+    import envmastercache
+    import envmastereffects
     import envmasterexceptions
+    import envmasterloaded
     import envmastershells
+    import envmastertrace
+    import envmasterversion
 else:
     from envmaster.envmasterfile import EnvMasterFile
     from envmaster import envmasterconf
+    from envmaster import envmastercache
+    from envmaster import envmastereffects
     from envmaster import envmasterexceptions
+    from envmaster import envmasterloaded
     from envmaster import envmastershells
+    from envmaster import envmastertrace
+    from envmaster import envmasterversion
 
 def modname2pkgname(modname):
     """
@@ -49,6 +59,154 @@ def modname2pkgname(modname):
     # remove/replace problem characters - possibly others
     pkgname = pkgname.replace('-','_')
     return pkgname.upper()
+
+def scanDir(path,needfiles):
+    """
+    Reads the directory path (with os.scandir where we have
+    it so we don't need to stat each entry) and returns a tuple
+    of (hasfiles,hasentries). Stops as soon as it knows the 
+    answer - at the first entry if needfiles is False, or
+    at the first file if it is True. Returns (False,False) if 
+    path isn't a directory.
+    """
+    hasfiles = False
+    hasentries = False
+    if hasattr(os,'scandir'):
+        try:
+            iterator = os.scandir(path)
+        except OSError:
+            return hasfiles,hasentries
+        try:
+            for entry in iterator:
+                hasentries = True
+                try:
+                    hasfiles = entry.is_file()
+                except OSError:
+                    pass
+                if hasfiles or not needfiles:
+                    break
+        finally:
+            if hasattr(iterator,'close'):
+                iterator.close()
+    else:
+        try:
+            names = os.listdir(path)
+        except OSError:
+            return hasfiles,hasentries
+        hasentries = len(names) > 0
+        if needfiles:
+            for name in names:
+                if os.path.isfile(os.path.join(path,name)):
+                    hasfiles = True
+                    break
+    return hasfiles,hasentries
+
+# directories under envmasterconf.SUBDIRS that need
+# to contain files (not just subdirectories) to be used
+NEEDFILES_SUBPATHS = ('BIN_SUBPATH','LIB_SUBPATH','PKGCONFIG_SUBPATH')
+
+_pythonsubdirs = None
+
+def getPythonSubdirs():
+    """
+    Returns the list of subdirectories to look for Python
+    modules in. This is envmasterconf.SUBDIRS['PYTHON_SUBPATH']
+    plus (if envmasterconf.USE_INTERPRETER_PYTHON_SUBPATH is set)
+    the directories the running interpreter would install
+    into relative to a prefix.
+    """
+    global _pythonsubdirs
+    if _pythonsubdirs is None:
+        _pythonsubdirs = list(envmasterconf.SUBDIRS['PYTHON_SUBPATH'])
+        if envmasterconf.USE_INTERPRETER_PYTHON_SUBPATH:
+            try:
+                import sysconfig
+                # the scheme used by 'install --prefix'
+                scheme = None
+                if os.name == 'posix':
+                    scheme = 'posix_prefix'
+                # use a dummy prefix so we can find the relative path
+                prefix = os.path.abspath(os.sep + 'envmasterprefix')
+                for key in ('purelib','platlib'):
+                    if scheme is None:
+                        path = sysconfig.get_path(key,vars={'base':prefix,'platbase':prefix})
+                    else:
+                        path = sysconfig.get_path(key,scheme,vars={'base':prefix,'platbase':prefix})
+                    if path.startswith(prefix + os.sep):
+                        subdir = path[len(prefix)+1:]
+                        if subdir not in _pythonsubdirs:
+                            _pythonsubdirs.append(subdir)
+            except (ImportError,KeyError,AttributeError):
+                pass
+    return _pythonsubdirs
+
+# results of classifyPrefix() keyed on the root path
+_prefixcache = {}
+
+def clearPrefixCache():
+    """
+    Forget the results of classifyPrefix(). The daemon does
+    this before each command so new installs are seen.
+    """
+    _prefixcache.clear()
+
+def classifyPrefix(rootpath):
+    """
+    Works out which of the standard subdirectories in 
+    envmasterconf.SUBDIRS (and getPythonSubdirs()) are present 
+    under rootpath. Returns a dictionary keyed on the subdirectory
+    with a tuple of (hasfiles,hasentries) for each - see scanDir().
+    The root is read once and anything not under one of the
+    directories found there isn't looked for. Results are
+    remembered for the rest of the run.
+    """
+    info = _prefixcache.get(rootpath)
+    if info is not None:
+        return info
+
+    # the top level directories
+    topdirs = set()
+    if hasattr(os,'scandir'):
+        try:
+            iterator = os.scandir(rootpath)
+        except OSError:
+            iterator = []
+        try:
+            for entry in iterator:
+                try:
+                    if entry.is_dir():
+                        topdirs.add(entry.name)
+                except OSError:
+                    pass
+        finally:
+            if hasattr(iterator,'close'):
+                iterator.close()
+    else:
+        try:
+            for name in os.listdir(rootpath):
+                if os.path.isdir(os.path.join(rootpath,name)):
+                    topdirs.add(name)
+        except OSError:
+            pass
+
+    candidates = []
+    for key,subdirs in envmasterconf.SUBDIRS.items():
+        if key == 'PYTHON_SUBPATH':
+            subdirs = getPythonSubdirs()
+        needfiles = key in NEEDFILES_SUBPATHS
+        for subdir in subdirs:
+            candidates.append((subdir,needfiles))
+
+    info = {}
+    for subdir,needfiles in candidates:
+        first = subdir.replace('/',os.sep).split(os.sep)[0]
+        if first not in topdirs:
+            info[subdir] = (False,False)
+        else:
+            info[subdir] = scanDir(os.path.join(rootpath,subdir),needfiles)
+
+    _prefixcache[rootpath] = info
+    return info
     
 class EnvMasterEnv(object):
     def __init__(self,shell,modname):
@@ -58,6 +216,9 @@ class EnvMasterEnv(object):
         # work out if we are just displaying
         # some operations are different
         self.isdisplay = isinstance(shell,envmastershells.DisplayShell)
+        # while loading, the list of what the module does
+        # (see envmastereffects). None if not recording.
+        self.effects = None
         
         # add this module to the list of currently
         # loaded modules.
@@ -88,16 +249,8 @@ class EnvMasterEnv(object):
         files are exectuable for bin path etc, but far
         too hard right now...
         """
-        dirok = os.path.isdir(path)
-        if dirok:
-            filecount = 0
-            filelist = os.listdir(path)
-            for fname in filelist:
-                fullpath = os.path.join(path,fname)
-                if os.path.isfile(fullpath):
-                    filecount += 1
-            dirok = filecount > 0
-        return dirok
+        hasfiles,hasentries = scanDir(path,True)
+        return hasfiles
         
     @staticmethod
     def dirHasSubdirsOrFiles(path):
@@ -107,62 +260,82 @@ class EnvMasterEnv(object):
         Python subdirs for instance often have
         just a subdir rather than files.
         """
-        dirok = os.path.isdir(path)
-        if dirok:
-            filelist = os.listdir(path)
-            dirok = len(filelist) > 0
-        return dirok
+        hasfiles,hasentries = scanDir(path,False)
+        return hasentries
         
+    @envmastertrace.traced('setall',1)
     def setAll(self,rootpath):
         """
         Given the root path of a package attempt
         to fill as many variables as possible by
-        testing the existance of subdirs with dirHasFiles()
+        testing the existance of subdirs. All the subdirs
+        are checked in one go by classifyPrefix().
         """
         # expand any environment vars in the path
-        rootpath = os.path.expandvars(rootpath)
+        rootpath = self.shell.environ.expandVars(rootpath)
         if not os.path.isdir(rootpath):
             raise envmasterexceptions.EnvMasterPathException("Can't find %s" % rootpath)
+
+        info = classifyPrefix(rootpath)
+        if self.shell.depends is not None:
+            # would change if any of these were created,
+            # removed or had files added
+            self.shell.depends.add(rootpath)
+            for subdir in info:
+                self.shell.depends.add(os.path.join(rootpath,subdir))
     
         # the $PKG_ROOT var
         self.setVar(rootpath,self.makeVarName(envmasterconf.ENVNAMES['ROOT_SUFFIX']))
         
         # is there a bin directory?
         for subdir in envmasterconf.SUBDIRS['BIN_SUBPATH']:
-            binpath = os.path.join(rootpath,subdir)
-            if self.dirHasFiles(binpath):
-                self.setBin(binpath)
+            hasfiles,hasentries = info[subdir]
+            if hasfiles:
+                self.setBin(os.path.join(rootpath,subdir))
                 break
         
         # is there a lib directory?
         for subdir in envmasterconf.SUBDIRS['LIB_SUBPATH']:
-            libpath = os.path.join(rootpath,subdir)
-            if self.dirHasFiles(libpath):
-                self.setLib(libpath)
+            hasfiles,hasentries = info[subdir]
+            if hasfiles:
+                self.setLib(os.path.join(rootpath,subdir))
                 break
 
         # is there an include directory?
         # sometimes just a subdir
         for subdir in envmasterconf.SUBDIRS['INCLUDE_SUBPATH']:
-            incpath = os.path.join(rootpath,subdir)
-            if self.dirHasSubdirsOrFiles(incpath):
-                self.setInclude(incpath)
+            hasfiles,hasentries = info[subdir]
+            if hasentries:
+                self.setInclude(os.path.join(rootpath,subdir))
                 break
 
         # try for man path
         for subdir in envmasterconf.SUBDIRS['MAN_SUBPATH']:
-            manpath = os.path.join(rootpath,subdir)
-            if self.dirHasSubdirsOrFiles(manpath):
-                self.setMan(manpath)
+            hasfiles,hasentries = info[subdir]
+            if hasentries:
+                self.setMan(os.path.join(rootpath,subdir))
                 break
 
         # python module subdirectory
         # - just check the existance of subdirs
         # - sometimes no files.
-        for subdir in envmasterconf.SUBDIRS['PYTHON_SUBPATH']:
-            pypath = os.path.join(rootpath,subdir)
-            if self.dirHasSubdirsOrFiles(pypath):
-                self.setPython(pypath)
+        for subdir in getPythonSubdirs():
+            hasfiles,hasentries = info[subdir]
+            if hasentries:
+                self.setPython(os.path.join(rootpath,subdir))
+
+        # pkg-config files - all the ones that exist
+        for subdir in envmasterconf.SUBDIRS['PKGCONFIG_SUBPATH']:
+            hasfiles,hasentries = info[subdir]
+            if hasfiles:
+                self.setPkgConfig(os.path.join(rootpath,subdir))
+
+        # CMake wants the prefix rather than the subdir
+        for subdir in envmasterconf.SUBDIRS['CMAKE_SUBPATH']:
+            hasfiles,hasentries = info[subdir]
+            if hasentries:
+                self.setCMake(rootpath)
+                break
 
     def setBin(self,path,var=envmasterconf.PATH):
         """
@@ -212,6 +385,23 @@ class EnvMasterEnv(object):
         self.setVar(path,varname)
         self.setPath(path,var)
         
+    def setPkgConfig(self,path,var=envmasterconf.PKGCONFIGPATH):
+        """
+        Set the pkg-config directory into the PKGCONFIGPATH variable. 
+        Also sets the PKGCONFIG_SUFFIX variable so you can refer
+        to this package's pkg-config dir elsewhere
+        """
+        varname = self.makeVarName(envmasterconf.ENVNAMES['PKGCONFIG_SUFFIX'])
+        self.setVar(path,varname)
+        self.setPath(path,var)
+
+    def setCMake(self,rootpath,var=envmasterconf.CMAKEPATH):
+        """
+        Add the root path of the package to the CMAKEPATH variable 
+        so CMake's find_package() can find its config files.
+        """
+        self.setPath(rootpath,var)
+        
     def load(self,*modnames):
         """
         Load the specified modules. This get a bit circular
@@ -223,7 +413,10 @@ class EnvMasterEnv(object):
         if isinstance(self.shell,envmastershells.DisplayShell):
             self.shell.setLoad(modnames)
         else:
-            modfile = EnvMasterFile()
+            # so the modules see the changes to the path
+            # variables (eg ENVMASTERPATH) made so far
+            self.shell.syncEnviron()
+            modfile = EnvMasterFile(self.shell.environ)
             modfile.runModule(self.shell,modnames,True)
         
     def swap(self,old,new):
@@ -233,21 +426,22 @@ class EnvMasterEnv(object):
         if isinstance(self.shell,envmastershells.DisplayShell):
             self.shell.setSwap(old,new)
         else:
-            modfile = EnvMasterFile()
+            self.shell.syncEnviron()
+            modfile = EnvMasterFile(self.shell.environ)
             modfile.runModule(self.shell,[old],False)
             modfile.runModule(self.shell,[new],True)
 
     @staticmethod
     def cmpVersionEqual(namedver,loadedver):
-        return ((namedver > loadedver) - (namedver < loadedver)) == 0
+        return envmasterversion.compareVersions(namedver,loadedver) == 0
 
     @staticmethod
     def cmpVersionMinimum(namedver,loadedver):
-        return ((namedver > loadedver) - (namedver < loadedver)) < 0
+        return envmasterversion.compareVersions(namedver,loadedver) < 0
 
     @staticmethod
     def cmpVersionMaximum(namedver,loadedver):
-        return ((namedver > loadedver) - (namedver < loadedver)) > 0
+        return envmasterversion.compareVersions(namedver,loadedver) > 0
 
     def setVersionMatch(self,cmpversion):
         """
@@ -258,6 +452,34 @@ class EnvMasterEnv(object):
         """
         self.cmpversion = cmpversion
         
+    def findLoadedMatch(self,modnames):
+        """
+        Used by prereq and conflict. Returns the first of
+        modnames that matches a loaded module (using the version
+        comparison method set by setVersionMatch() if the name 
+        has a version, or matching the loaded version against it
+        if it is a specification like '>=9' - see envmasterversion)
+        or None if none of them do. Only the most
+        recently loaded version of each module is compared.
+        """
+        loadedmodules = envmasterloaded.getLoadedModules(self.shell.environ)
+        # go through each one they have stipulated
+        for mod in modnames:
+            modname,modver = envmasterloaded.splitModName(mod)
+            versions = loadedmodules.getVersions(modname)
+            if len(versions) > 0:
+                # found the matching module
+                loadedver = versions[0]
+                if envmasterversion.isSpec(modver):
+                    if envmasterversion.matchVersion(modver, loadedver):
+                        return mod
+                elif modver is None or (loadedver is not None and 
+                                self.cmpversion(modver, loadedver)):
+                    # no version match
+                    # or version match succeeded
+                    return mod
+        return None
+
     def prereq(self,*modnames):
         """
         Checks that at least one of the specified module(s) are loaded
@@ -266,38 +488,10 @@ class EnvMasterEnv(object):
             # don't do anything - just display it
             self.shell.setPrereq(modnames)
         elif self.shell.loading:    # only do this when loading a module
-            loaded = os.getenv(envmasterconf.LOADEDMODULESENV)
-            if loaded is not None:
-                loaded = loaded.split(os.pathsep)
-                # go through each one they have stipulated
-                for mod in modnames:
-                    if mod.find(os.sep) != -1:
-                        # they reference a particular version
-                        (modname,modver) = mod.split(os.sep)
-                    else:
-                        modname = mod
-                        modver = None
-
-                    # go through the currently loaded ones
-                    for loadedmod in loaded:
-                        if loadedmod.find(os.sep) != -1:
-                            (loadedname,loadedver) = loadedmod.split(os.sep)
-                        else:
-                            loadedname = loadedmod
-                            loadedver = None
-
-                        # found the matching module
-                        if modname == loadedname:
-                            if modver is None or self.cmpversion(modver, loadedver):
-                                # no version match
-                                # or version match succeeded
-                                return
-                            else:
-                                break
-                            
-            msg = 'None of the specified prerequisites (%s) required for package %s are loaded'
-            msg = msg % (','.join(modnames),self.modname)
-            raise envmasterexceptions.EnvMasterPrereqFailed(msg)
+            if self.findLoadedMatch(modnames) is None:
+                msg = 'None of the specified prerequisites (%s) required for package %s are loaded'
+                msg = msg % (','.join(modnames),self.modname)
+                raise envmasterexceptions.EnvMasterPrereqFailed(msg)
             
 
     def conflict(self,*modnames):
@@ -308,48 +502,28 @@ class EnvMasterEnv(object):
             # don't do anything - just display it
             self.shell.setConflict(modnames)
         elif self.shell.loading:    # only do this when loading a module
-            loaded = os.getenv(envmasterconf.LOADEDMODULESENV)
-            if loaded is not None:
-                loaded = loaded.split(os.pathsep)
-                # go through each one they have stipulated
-                for mod in modnames:
-                    if mod.find(os.sep) != -1:
-                        # they reference a particular version
-                        (modname,modver) = mod.split(os.sep)
-                    else:
-                        modname = mod
-                        modver = None
-
-                    # go through the currently loaded ones
-                    for loadedmod in loaded:
-                        if loadedmod.find(os.sep) != -1:
-                            (loadedname,loadedver) = loadedmod.split(os.sep)
-                        else:
-                            loadedname = loadedmod
-                            loadedver = None
-
-                        # found the matching module
-                        if modname == loadedname:
-                            if modver is None or self.cmpversion(modver, loadedver):
-                                # no version match
-                                # or version match succeeded
-                                msg = 'Module %s already loaded which is listed as a conflict for package %s'
-                                msg = msg % (modname,self.modname)
-                                raise envmasterexceptions.EnvMasterConflictFailed(msg)
-                            else:
-                                break
+            mod = self.findLoadedMatch(modnames)
+            if mod is not None:
+                modname,modver = envmasterloaded.splitModName(mod)
+                msg = 'Module %s already loaded which is listed as a conflict for package %s'
+                msg = msg % (modname,self.modname)
+                raise envmasterexceptions.EnvMasterConflictFailed(msg)
 
     def isLoading(self):
         """
         Returns True if we are currently loading a module
         and not in display mode.
         """
+        # the module may do something else when unloading
+        # so it needs to be run to unload it
+        self.effects = None
         return self.shell.loading and not self.isdisplay
 
     def isUnloading(self):
         """
         Returns True if we are currently unloading a module
         """
+        self.effects = None
         return not self.shell.loading and not self.isdisplay
 
     def isDisplay(self):
@@ -357,7 +531,17 @@ class EnvMasterEnv(object):
         Are we in display mode?
         """
         return self.isdisplay
-                    
+
+    def getEnv(self,var,default=None):
+        """
+        Returns the value of the environment variable var
+        (or default if it isn't set) in the environment the
+        module is being loaded into. Use this rather than
+        os.environ so the module file also works with
+        pyutils.resolve().
+        """
+        return self.shell.environ.get(var,default)
+
     def whatis(self,desc):
         """
         Sets the desciption of the module. Only used in 
@@ -376,9 +560,11 @@ class EnvMasterEnv(object):
         like the setBin() etc methods do.
         """
         # expand any embedded environment vars
-        value = os.path.expandvars(value)
+        value = self.shell.environ.expandVars(value)
         if addpkgname:
             var = self.makeVarName(var)
+        if self.effects is not None:
+            self.effects.append((envmastereffects.VAREFFECT,var,value))
         self.shell.setVar(value,var)
 
     def setPath(self,path,var):
@@ -388,9 +574,12 @@ class EnvMasterEnv(object):
         'var'. 
         """
         # expand any embedded environment vars
-        path = os.path.expandvars(path)
+        path = self.shell.environ.expandVars(path)
+        if self.effects is not None:
+            self.effects.append((envmastereffects.PATHEFFECT,var,path))
         self.shell.setPath(path,var)
             
+    @envmastertrace.traced('execute',lambda self,path: self.modname)
     def execute(self,path):
         """
         Execute the module specified. 'path' must
@@ -400,7 +589,55 @@ class EnvMasterEnv(object):
         global_ns = {}
         # set the 'module' variable to this object
         global_ns['module'] = self
-        # get Python to execute it
-        exec(compile(open(path).read(), path, 'exec'),global_ns,global_ns)
+        # so the shell knows who is changing the path variables
+        # (may be part way through running another module that
+        # loads this one)
+        oldmod = self.shell.currentmod
+        self.shell.currentmod = self.modname
+        if self.shell.depends is not None:
+            self.shell.depends.add(path)
+        if not self.isdisplay:
+            # so 'allreload' can tell if it has changed since.
+            # Taken before it is read so a change while it is
+            # running means it is reloaded
+            fingerprint = None
+            if self.shell.loading:
+                fingerprint = envmasterloaded.moduleFingerprint(self.modname,path)
+            self.shell.getFingerprints().set(self.modname,fingerprint)
+            if self.shell.loading and envmasterconf.UNLOAD_FROM_EFFECTS:
+                self.effects = []
+        try:
+            # get Python to execute it. The compiled code
+            # comes from the cache if it is up to date.
+            exec(envmastercache.compileFile(path),global_ns,global_ns)
+        finally:
+            self.shell.currentmod = oldmod
+        if not self.isdisplay:
+            # None (ie when unloading) forgets them
+            self.shell.getEffects().set(self.modname,self.effects)
+            self.effects = None
+        # so the next module sees the changes
+        self.shell.syncEnviron()
+
+    @envmastertrace.traced('undo',lambda self,effects: self.modname)
+    def undo(self,effects):
+        """
+        Unload the module by undoing the effects recorded
+        when it was loaded (see envmastereffects) rather than
+        running the module file. The shell must be unloading.
+        """
+        oldmod = self.shell.currentmod
+        self.shell.currentmod = self.modname
+        try:
+            for effect in effects:
+                if effect[0] == envmastereffects.VAREFFECT:
+                    self.shell.setVar(effect[2],effect[1])
+                elif effect[0] == envmastereffects.PATHEFFECT:
+                    self.shell.setPath(effect[2],effect[1])
+        finally:
+            self.shell.currentmod = oldmod
+        self.shell.getFingerprints().set(self.modname,None)
+        self.shell.getEffects().set(self.modname,None)
+        self.shell.syncEnviron()
             
 
@@ -0,0 +1,122 @@
+"""
+Module that contains the environments the shells read and
+change as module files are run. Normally this is the environment
+of the current process (PROCESSENVIRON) but a DictEnviron can be
+used instead so module files can be run against a mapping without
+touching os.environ (see pyutils.resolve()).
+
+The shells, EnvMasterFile and EnvMasterEnv all get and set
+variables through one of these rather than using os.environ
+directly.
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import re
+
+# $var or ${var} as understood by os.path.expandvars() on Unix
+VARIABLERE = re.compile(r'\$(\w+|\{[^}]*\})')
+
+class ProcessEnviron(object):
+    """
+    The environment of the current process. Use
+    PROCESSENVIRON rather than creating one of these.
+    """
+    def __init__(self):
+        # the envmasterloaded.LoadedModules for this
+        # environment. See envmasterloaded.getLoadedModules()
+        self.loadedmodules = None
+
+    def get(self,var,default=None):
+        """
+        Returns the value of var or default if it isn't set
+        """
+        return os.environ.get(var,default)
+
+    def set(self,var,value):
+        """
+        Sets var to value, or removes it if value is None
+        """
+        if value is None:
+            if var in os.environ:
+                del os.environ[var]
+        else:
+            os.environ[var] = value
+
+    def expandVars(self,value):
+        """
+        Returns value with the variables in it replaced
+        by their values (see os.path.expandvars)
+        """
+        return os.path.expandvars(value)
+
+    def getValues(self):
+        """
+        Returns a dictionary of all the variables
+        """
+        return dict(os.environ)
+
+class DictEnviron(object):
+    """
+    An environment held in a dictionary of variable name
+    -> value. values is copied so isn't changed.
+    """
+    def __init__(self,values=None):
+        self.values = {}
+        if values is not None:
+            self.values.update(values)
+        # as for ProcessEnviron
+        self.loadedmodules = None
+
+    def get(self,var,default=None):
+        """
+        Returns the value of var or default if it isn't set
+        """
+        return self.values.get(var,default)
+
+    def set(self,var,value):
+        """
+        Sets var to value, or removes it if value is None
+        """
+        if value is None:
+            self.values.pop(var,None)
+        else:
+            self.values[var] = value
+
+    def expandVars(self,value):
+        """
+        Returns value with $var and ${var} replaced by their
+        values. Like os.path.expandvars() variables that aren't
+        set are left alone.
+        """
+        if '$' not in value:
+            return value
+        def replace(match):
+            var = match.group(1)
+            if var.startswith('{'):
+                var = var[1:-1]
+            return self.values.get(var,match.group(0))
+        return VARIABLERE.sub(replace,value)
+
+    def getValues(self):
+        """
+        Returns a copy of the dictionary of variables
+        """
+        return dict(self.values)
+
+PROCESSENVIRON = ProcessEnviron()
@@ -62,3 +62,36 @@ class EnvMasterNoModules(EnvMasterException):
     No module files were found
     """
     pass
+
+class EnvMasterCycleError(EnvMasterException):
+    """
+    Module files load each other (directly or
+    indirectly) so there is no order they can
+    be loaded in
+    """
+    pass
+
+class EnvMasterSnapshotError(EnvMasterException):
+    """
+    Unable to save or restore a snapshot
+    """
+    pass
+
+class EnvMasterCollectionError(EnvMasterException):
+    """
+    Unable to save or restore a collection
+    """
+    pass
+
+class EnvMasterExecError(EnvMasterException):
+    """
+    Unable to run the command given to 'exec'
+    """
+    pass
+
+class EnvMasterIndexError(EnvMasterException):
+    """
+    Unable to build the index of a
+    directory in ENVMASTERPATH
+    """
+    pass
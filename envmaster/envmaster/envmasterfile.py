@@ -21,58 +21,238 @@ just calls through to this.
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 import os
 import sys
+import stat
 if sys.version_info[0] < 3:
     # keep compatibility with Python2.4
     import envmasterconf
+    import envmastercache
+    import envmasterenviron
     import envmasterexceptions
-    import envmasterformat
-    from envmastershells import shellFromString
+    import envmasterindex
+    import envmasterloaded
+    import envmasterprefetch
+    import envmastersnapshot
+    import envmastertrace
+    import envmasterversion
+    from envmastershells import shellFromString, BaseShell, RecordShell
 else:
     from envmaster import envmasterconf
+    from envmaster import envmastercache
+    from envmaster import envmasterenviron
     from envmaster import envmasterexceptions
-    from envmaster import envmasterformat
-    from envmaster.envmastershells import shellFromString
+    from envmaster import envmasterindex
+    from envmaster import envmasterloaded
+    from envmaster import envmasterprefetch
+    from envmaster import envmastersnapshot
+    from envmaster import envmastertrace
+    from envmaster import envmasterversion
+    from envmaster.envmastershells import shellFromString, BaseShell, RecordShell
+
+def importFormat():
+    """
+    envmasterformat is only needed for commands that
+    draw on the terminal (not load/unload etc) so it is 
+    imported when needed to keep start up fast.
+    """
+    if sys.version_info[0] < 3:
+        import envmasterformat
+    else:
+        from envmaster import envmasterformat
+    return envmasterformat
+
+def listDir(path):
+    """
+    Returns a tuple of two lists for the contents of path.
+    The first is the names of the files (and anything else
+    that isn't a directory), the second is a list of 
+    (name,islink) tuples for the directories. Uses os.scandir
+    where we have it, which saves a stat() per entry.
+    Empty lists are returned if path can't be read.
+    """
+    files = []
+    dirs = []
+    if hasattr(os,'scandir'):
+        try:
+            iterator = os.scandir(path)
+        except OSError:
+            return files,dirs
+        try:
+            for entry in iterator:
+                try:
+                    isdir = entry.is_dir()
+                except OSError:
+                    isdir = False
+                if isdir:
+                    dirs.append((entry.name,entry.is_symlink()))
+                else:
+                    files.append(entry.name)
+        finally:
+            if hasattr(iterator,'close'):
+                iterator.close()
+    else:
+        try:
+            names = os.listdir(path)
+        except OSError:
+            return files,dirs
+        for name in names:
+            fullpath = os.path.join(path,name)
+            if os.path.isdir(fullpath):
+                dirs.append((name,os.path.islink(fullpath)))
+            else:
+                files.append(name)
+    return files,dirs
+
+def parseVersionFile(versionpath):
+    """
+    Most version files contain nothing more than the
+    sentinel and a line like 'version = "1.0"'. Returns
+    the version from such a file without having to run
+    Python over it. Returns None if the file is anything
+    more complicated and needs to be executed.
+    """
+    version = None
+    fileobj = open(versionpath)
+    try:
+        for line in fileobj:
+            line = line.strip()
+            if line == '' or line.startswith('#'):
+                # comments and the sentinel
+                continue
+            if version is not None:
+                # more than one statement
+                return None
+            var,sep,value = line.partition('=')
+            if sep == '' or var.strip() != envmasterconf.VERSIONVAR:
+                return None
+            value = value.strip()
+            if (len(value) < 2 or value[0] not in '"\'' or value[-1] != value[0]
+                    or value[0] in value[1:-1] or '\\' in value):
+                # not a simple string literal
+                return None
+            version = value[1:-1]
+    finally:
+        fileobj.close()
+    return version
+
+def getUserShell(values):
+    """
+    Returns the path of the user's shell given a
+    dictionary of environment variables
+    """
+    if sys.platform == 'win32':
+        return values.get('COMSPEC', 'cmd.exe')
+    return values.get('SHELL', '/bin/sh')
 
 class EnvMasterFile(object):
     """
     Class that knows where to look for module files
-    and can perform the major module operations
+    and can perform the major module operations.
+    environ is the environment (see envmasterenviron)
+    the module files are loaded into - the environment
+    of the current process if None.
     """
-    def __init__(self):
+    def __init__(self,environ=None):
+        if environ is None:
+            environ = envmasterenviron.PROCESSENVIRON
+        self.environ = environ
         # construct our list of where to look for modules
         # copy the list in the conf file
         self.modpaths = envmasterconf.DEFAULTENVMASTERPATHS[:]
         # append the paths in the environment variable
-        modpathenv = os.getenv(envmasterconf.ENVMASTERPATH)
+        modpathenv = environ.get(envmasterconf.ENVMASTERPATH)
         if modpathenv is not None:
             for path in modpathenv.split(os.pathsep):
                 self.modpaths.append(path)
+
+        # set by startBatch()
+        self.batchshell = None
+        # modname -> result of getModule() while batching
+        self.resolved = None
+        # dirpath -> result of getVersionIndex()
+        self.versionindexes = {}
+        # module directories whose default comes from running
+        # their version file (so can't be cached). See findDefault()
+        self.dynamicdefaults = set()
+        # whether to use the index files built by
+        # 'envmaster index build' (see envmasterindex)
+        self.useindex = envmasterconf.USE_ROOTINDEX
+
+    def getRootIndex(self,path):
+        """
+        Returns the envmasterindex.RootIndex for the search
+        directory path, or None if it doesn't have an up to
+        date one (or they are turned off)
+        """
+        if not self.useindex:
+            return None
+        return envmasterindex.getRootIndex(path)
+
+    def getDirIndex(self,dirpath):
+        """
+        Returns (index,name) if dirpath is a module directory
+        at the top of a search directory with an up to date
+        index, otherwise (None,None)
+        """
+        root,name = os.path.split(dirpath)
+        if root not in self.modpaths:
+            return None,None
+        index = self.getRootIndex(root)
+        if index is None:
+            return None,None
+        return index,name
                 
+    @envmastertrace.traced('default',1)
     def findDefault(self,dirpath):
         """
         Given a directory with one or more module files 
         in it looks for the version file and determines the
         fully qualififed (with version) module name.
-        If no version file, just returns the first one.
+        If no version file, returns the highest version
+        (see envmasterversion).
         """
+        index,name = self.getDirIndex(dirpath)
+        if index is not None:
+            defaultmodname = index.getDefault(name)
+            if defaultmodname is not None:
+                return defaultmodname
+
+        cache = envmastercache.getResolveCache()
+        if cache is not None:
+            defaultmodname = cache.lookupDefault(dirpath)
+            if defaultmodname is not None:
+                return defaultmodname
+
         defaultmodname = None
         # in case we were given a version
         modbase = dirpath.split(os.sep)[-1]
         
         # name of version file
         versionpath = os.path.join(dirpath,envmasterconf.VERSIONFILE)
-        if os.path.exists(versionpath) and self.isEnvMasterFile(versionpath):
-            localdict = {}
-            # run Python over it
-            exec(compile(open(versionpath).read(), versionpath, 'exec'),localdict,localdict)
-            if envmasterconf.VERSIONVAR not in localdict:
-                # didn't set the version variable
-                msg = "Variable %s not set in file %s" 
-                msg = msg % (envmasterconf.VERSIONVAR,versionpath)
-                raise envmasterexceptions.EnvMasterParseError(msg)
+        # things that will change if the default changes
+        versionfp = envmastercache.fingerprint(versionpath)
+        validators = [(dirpath,envmastercache.fingerprint(dirpath)),
+                        (versionpath,versionfp)]
+        if versionfp is not None and self.isEnvMasterFile(versionpath):
+            # most version files just set the variable
+            # so avoid running Python over them if we can
+            defaultversion = parseVersionFile(versionpath)
+            if defaultversion is None:
+                # the result may depend on the host or the
+                # environment so can't go in the cache (which
+                # may be shared between hosts)
+                cache = None
+                self.dynamicdefaults.add(dirpath)
+                localdict = {}
+                # run Python over it
+                exec(envmastercache.compileFile(versionpath),localdict,localdict)
+                if envmasterconf.VERSIONVAR not in localdict:
+                    # didn't set the version variable
+                    msg = "Variable %s not set in file %s" 
+                    msg = msg % (envmasterconf.VERSIONVAR,versionpath)
+                    raise envmasterexceptions.EnvMasterParseError(msg)
+                defaultversion = localdict[envmasterconf.VERSIONVAR]
                 
             # now look for that version 
-            defaultversion = localdict[envmasterconf.VERSIONVAR]
             defaultmodpath = os.path.join(dirpath,defaultversion)
             if not os.path.exists(defaultmodpath):
                 msg = "Unable to find default module version %s"
@@ -82,80 +262,203 @@ class EnvMasterFile(object):
                 
             defaultmodname = modbase + os.sep + defaultversion
         else:
-            # look for first one
-            dirlisting = os.listdir(dirpath)
-            if len(dirlisting) != 0:
-                defaultmodname = modbase + os.sep + os.listdir(dirpath)[0]
+            # the highest version so it doesn't depend on
+            # the order the directory is listed in
+            defaultversion = self.getVersionIndex(dirpath).highest()
+            if defaultversion is not None:
+                defaultmodname = modbase + os.sep + defaultversion
             else:
                 # no files - about all we can do
                 defaultmodname = modbase
+
+        if cache is not None:
+            cache.storeDefault(dirpath,defaultmodname,validators)
             
         return defaultmodname
                 
+    def getVersionIndex(self,dirpath):
+        """
+        Returns an envmasterversion.VersionIndex of the
+        module files in the directory dirpath
+        """
+        index = self.versionindexes.get(dirpath)
+        if index is not None:
+            return index
+
+        rootindex,name = self.getDirIndex(dirpath)
+        if rootindex is not None:
+            index = rootindex.getVersionIndex(name)
+            if index is not None:
+                self.versionindexes[dirpath] = index
+                return index
+
+        cache = envmastercache.getResolveCache()
+        entries = None
+        if cache is not None:
+            entries = cache.lookupVersions(dirpath)
+        if entries is not None:
+            index = envmasterversion.VersionIndex(entries=entries)
+        else:
+            validators = [(dirpath,envmastercache.fingerprint(dirpath))]
+            files,dirs = listDir(dirpath)
+            versions = [filename for filename in files
+                    if filename != envmasterconf.VERSIONFILE and not filename.startswith('.')]
+            index = envmasterversion.VersionIndex(versions)
+            if cache is not None:
+                cache.storeVersions(dirpath,index.getEntries(),validators)
+        self.versionindexes[dirpath] = index
+        return index
+
     def getModule(self,modname):
         """
         Finds the default version of the module,
         and the actual full path to the module file
         """
+        if self.resolved is not None:
+            # already found as part of this batch
+            result = self.resolved.get(modname)
+            if result is not None:
+                return result
+            result = self.findModule(modname)
+            self.resolved[modname] = result
+            return result
+        return self.findModule(modname)
+
+    @envmastertrace.traced('resolve',1)
+    def findModule(self,modname):
+        """
+        Does the work for getModule(). Searches the
+        directories in ENVMASTERPATH for modname.
+        """
+        name,version = envmasterloaded.splitModName(modname)
+        if envmasterversion.isSpec(version):
+            return self.findModuleSpec(name,version)
+
+        indexes = [self.getRootIndex(path) for path in self.modpaths]
+        cache = None
+        if None in indexes:
+            # the indexes are quicker if we have them all
+            cache = envmastercache.getResolveCache()
+        if cache is not None:
+            result = cache.lookupModule(self.modpaths,modname)
+            if result is not None:
+                return result
+
         fullpath = None
         fullmodname = None
+        # whether fullpath is known to be an EnvMaster file
+        checked = False
+        # (path,fingerprint) of everything that
+        # would change if the result of the search did
+        validators = []
         # search all our paths for the module
-        for path in self.modpaths:
+        for path,index in zip(self.modpaths,indexes):
+            if index is not None:
+                result = index.findModule(modname)
+                if result is not None:
+                    if cache is not None:
+                        # would change if the index was
+                        # rebuilt or is out of date
+                        for checkpath in (path,envmasterindex.getIndexPath(path)):
+                            validators.append((checkpath,envmastercache.fingerprint(checkpath)))
+                    if result[0] is None:
+                        # not here
+                        continue
+                    fullmodname,fullpath = result
+                    checked = True
+                    break
+                # the index doesn't know - look at the files
+
             # test to see if we found it
             testpath = os.path.join(path,modname)
-            if os.path.exists(testpath):
-                if os.path.isdir(testpath):
-                    # it's a dir so look for default version
-                    fullmodname = self.findDefault(testpath)
-                    fullpath = os.path.join(path,fullmodname)
-                else:
-                    # don't have to look any further
-                    fullmodname = modname
-                    fullpath = testpath
-                break
+            try:
+                st = os.stat(testpath)
+            except OSError:
+                # not here. Note the directories that would
+                # be modified if it was created.
+                checkpath = path
+                for part in [''] + modname.split(os.sep)[:-1]:
+                    checkpath = os.path.join(checkpath,part)
+                    fp = envmastercache.fingerprint(checkpath)
+                    validators.append((checkpath,fp))
+                    if fp is None:
+                        break
+                continue
+
+            validators.append((testpath,(st.st_mtime,st.st_size)))
+            if stat.S_ISDIR(st.st_mode):
+                # it's a dir so look for default version
+                versionpath = os.path.join(testpath,envmasterconf.VERSIONFILE)
+                validators.append((versionpath,envmastercache.fingerprint(versionpath)))
+                fullmodname = self.findDefault(testpath)
+                if testpath in self.dynamicdefaults:
+                    # as for findDefault()
+                    cache = None
+                fullpath = os.path.join(path,fullmodname)
+                validators.append((fullpath,envmastercache.fingerprint(fullpath)))
+            else:
+                # don't have to look any further
+                fullmodname = modname
+                fullpath = testpath
+            break
                 
-        if fullpath is not None and not self.isEnvMasterFile(fullpath):
+        if fullpath is not None and not checked and not self.isEnvMasterFile(fullpath):
             msg = 'Module %s not EnvMaster' % fullpath
             raise envmasterexceptions.EnvMasterParseError(msg)
+
+        if cache is not None:
+            cache.storeModule(self.modpaths,modname,fullmodname,fullpath,validators)
                 
         return(fullmodname,fullpath)
 
-    def getLoadedModule(self, modname):
+    def findModuleSpec(self,name,spec):
         """
-        Finds the currently loaded module
-        and the actual full path to the module file
+        Finds the highest version of module name that satisfies
+        the version specification spec (ie '>=9' or '12.*'). The
+        first directory in ENVMASTERPATH with a matching version
+        is used.
         """
-        loaded = os.getenv(envmasterconf.LOADEDMODULESENV)
-        if loaded is None:
-            return None, None
-        else:
-            if modname.find(os.sep) != -1:
-                askname, askversion = modname.split(os.sep)
-            else:
-                askname = modname
-                askversion = ""
+        for path in self.modpaths:
+            index = self.getRootIndex(path)
+            if index is not None:
+                result = index.findModuleSpec(name,spec)
+                if result is not None:
+                    if result[0] is None:
+                        # not here
+                        continue
+                    return result
+                # the index doesn't know - look at the files
 
-            for loadedname in loaded.split(os.pathsep):
-                if loadedname.find(os.sep) != -1:
-                    testname, testversion = loadedname.split(os.sep)
-                else:
-                    testname = loadedname
-                    testversion = ""
-
-                found = False
-                if askversion == "" and askname == testname:
-                    found = True
-                elif askname == testname and askversion == testversion:
-                    found = True
-
-                if found:
-                    if testversion != "":
-                        modname = testname + os.sep + testversion
-                    else:
-                        modname = testname
-                    return self.getModule(modname)
-            return None, None
+            dirpath = os.path.join(path,name)
+            if not os.path.isdir(dirpath):
+                continue
+            version = self.getVersionIndex(dirpath).findBest(spec)
+            if version is not None:
+                fullmodname = name + os.sep + version
+                fullpath = os.path.join(path,fullmodname)
+                if not self.isEnvMasterFile(fullpath):
+                    msg = 'Module %s not EnvMaster' % fullpath
+                    raise envmasterexceptions.EnvMasterParseError(msg)
+                return (fullmodname,fullpath)
+        return (None,None)
 
+    def getLoadedModule(self, modname, shell=None):
+        """
+        Finds the currently loaded module
+        and the actual full path to the module file.
+        If shell is given and has a record of what the module
+        did when it was loaded (see envmastereffects) the
+        module file isn't needed to unload it so the path
+        returned is None.
+        """
+        loadedmodules = envmasterloaded.getLoadedModules(self.environ)
+        fullmodname = loadedmodules.findLoaded(modname)
+        if fullmodname is None:
+            return None, None
+        if (shell is not None and envmasterconf.UNLOAD_FROM_EFFECTS and
+                    shell.getEffects().get(fullmodname) is not None):
+            return fullmodname, None
+        return self.getModule(fullmodname)
         
     def isLoaded(self,fullmodname):
         """
@@ -163,12 +466,7 @@ class EnvMasterFile(object):
         returned by getModule() determine whether that 
         module is currently loaded
         """
-        loaded = os.getenv(envmasterconf.LOADEDMODULESENV)
-        if loaded is None:
-            return False
-        else:
-            loaded = loaded.split(os.pathsep)
-            return fullmodname in loaded
+        return envmasterloaded.getLoadedModules(self.environ).isLoaded(fullmodname)
         
     def isEnvMasterFile(self,fullpath):
         """
@@ -188,49 +486,171 @@ class EnvMasterFile(object):
             bufferstr = ''
         return sentinel == bufferstr
 
+    def createShell(self,shell,loading):
+        """
+        Returns shellFromString(shell,loading) set up to
+        use self.environ. Shell objects are returned as is.
+        """
+        if isinstance(shell,BaseShell):
+            return shell
+        shell = shellFromString(shell,loading)
+        shell.environ = self.environ
+        return shell
+
+    @envmastertrace.traced('run',lambda self,shell,modlist,loading: ' '.join(modlist))
     def runModule(self,shell,modlist,loading):
         """
         Execute the module files in modlist. Either in
         loading or unloading mode depending on the
         value of loading. Also takes the name of the
-        shell to generate commands for.
+        shell to generate commands for. 
+        If passed a shell object instead (ie from module.load()
+        in a module file) the commands are left for whoever
+        created it to flush.
         """
         # create the shell object for the type of shell
         # we are dealing with
-        shell = shellFromString(shell,loading)
+        nested = isinstance(shell,BaseShell)
+        if self.batchshell is not None and not nested:
+            # part of a batch. Flushed by endBatch()
+            shell = self.batchshell
+            shell.setLoading(loading)
+            nested = True
+        else:
+            shell = self.createShell(shell,loading)
 
-        # go thru each module    
-        for modname in modlist:
+        prefetcher = None
+        if not nested and envmasterconf.PREFETCH_THREADS > 0:
+            # find and compile the later modules while
+            # the earlier ones are run
+            prefetcher = envmasterprefetch.Prefetcher()
+        planner = None
+        if loading and envmasterconf.USE_LOADPLANNER and shell.planner is None:
+            # also used by module.load() in the module files
+            planner = envmasterplan.LoadPlanner(prefetcher)
+            shell.planner = planner
+        try:
+            self.runModules(shell,modlist,loading,prefetcher)
+        finally:
+            if planner is not None:
+                shell.planner = None
+            if prefetcher is not None:
+                prefetcher.close()
+
+        if not nested:
+            # flush out all the commands
+            shell.flush()
         
-            # get the full module name with version
-            # plus path
-            if loading:
-                fullmod,path = self.getModule(modname)
-            else:
-                fullmod,path = self.getLoadedModule(modname)
-            if fullmod is None:
+    def runModules(self,shell,modlist,loading,prefetcher=None):
+        """
+        Does the work of runModule() once we have a
+        shell object. prefetcher is the envmasterprefetch.Prefetcher
+        to use (if any).
+        """
+        if prefetcher is None and shell.planner is not None:
+            # module.load() in a module file
+            prefetcher = shell.planner.prefetcher
+        if loading and shell.loading and shell.planner is not None:
+            # find everything that will be loaded first. The
+            # modules loaded by module.load() are still run
+            # by the module file that loads them
+            modules = shell.planner.plan(self,modlist)
+        else:
+            modules = []
+            # go thru each module    
+            for modname in modlist:
+            
+                # get the full module name with version
+                # plus path
                 if loading:
-                    msg = "Can't find Module '%s'" % modname
+                    fullmod,path = self.getModule(modname)
                 else:
-                    msg = 'Module %s not currently loaded' % modname
-                raise envmasterexceptions.EnvMasterNoModule(msg)
+                    fullmod,path = self.getLoadedModule(modname,shell)
+                if fullmod is None:
+                    if loading:
+                        msg = "Can't find Module '%s'" % modname
+                    else:
+                        msg = 'Module %s not currently loaded' % modname
+                    raise envmasterexceptions.EnvMasterNoModule(msg)
+                modules.append((fullmod,path))
+
+        if prefetcher is not None:
+            for fullmod,path in modules:
+                if path is not None:
+                    prefetcher.submit(('compile',path),envmasterprefetch.compileAhead,path)
+
+        for fullmod,path in modules:
             # only run if loading and not already loaded
             # or unload only if loaded
             isloaded = self.isLoaded(fullmod)
             if (loading and not isloaded) or (not loading and isloaded):
                     # create the EnvMasterEnv object to do the running
                     env = EnvMasterEnv(shell,fullmod)
+                    if path is None:
+                        # undo what it did when it was loaded
+                        env.undo(shell.getEffects().get(fullmod))
+                        continue
+                    if prefetcher is not None:
+                        # wait for it to be compiled
+                        prefetcher.get(('compile',path),envmasterprefetch.compileAhead,path)
                     env.execute(path)
-        # flush out all the commands
+
+    def startBatch(self,shell):
+        """
+        Start a batch of operations. All runModule() calls
+        until endBatch() is called go into the one shell object
+        (whatever shell they are passed) so only the final
+        value of each variable is written out. Each module
+        is only searched for once during the batch.
+        """
+        self.batchshell = self.createShell(shell,True)
+        self.resolved = {}
+
+    def endBatch(self):
+        """
+        Finish a batch started with startBatch() and
+        write out the commands.
+        """
+        shell = self.batchshell
+        self.batchshell = None
+        self.resolved = None
         shell.flush()
-        
-    def dispModule(self,modlist):
+
+    def cancelBatch(self):
+        """
+        Abandon a batch started with startBatch() without
+        writing anything out, ie after an error.
+        """
+        self.batchshell = None
+        self.resolved = None
+
+    def runBatch(self,shell,operations):
+        """
+        Runs a list of (modname,loading) operations
+        as one batch.
+        """
+        self.startBatch(shell)
+        try:
+            for modname,loading in operations:
+                self.runModule(shell,[modname],loading)
+        except:
+            self.cancelBatch()
+            raise
+        self.endBatch()
+
+    def dispModule(self,modlist,execute=False):
         """
         Displays what the modules do in modlist.
-        Shows them in order.
+        Shows them in order. Unless execute is True, module
+        files that the catalog (see envmastercatalog) knows
+        everything about aren't run - the calls it found are
+        made instead.
         """
         # create an object for the display shell
-        shell = shellFromString('disp',True)
+        shell = self.createShell('disp',True)
+        catalog = None
+        if not execute:
+            catalog = envmastercatalog.getCatalog()
     
         # go thru each module
         for modname in modlist:
@@ -245,71 +665,241 @@ class EnvMasterFile(object):
             shell.setModName(path)
             # create the EnvMasterEnv object and run it
             env = EnvMasterEnv(shell,fullmod)
-            env.execute(path)
+            info = None
+            if catalog is not None:
+                info = catalog.getInfo(path)
+            if info is not None and info.static:
+                info.replay(env)
+            else:
+                env.execute(path)
             shell.flush()
                 
-    def availModules(self):
+    @envmastertrace.traced('scan',1)
+    def findAvailModules(self,path):
+        """
+        Returns a list of (name,path) for the modules
+        available under one of the search directories, sorted
+        by name. The default version of each module has
+        '(default)' added to the name.
+        """
+        index = self.getRootIndex(path)
+        if index is not None:
+            return index.getAvailModules()
+
+        availmodules = []
+        # walk that directory looking for module files
+        # (a stack rather than recursion, like os.walk)
+        todo = [path]
+        while len(todo) > 0:
+            root = todo.pop()
+            files,dirs = listDir(root)
+            for dirname,islink in dirs:
+                # like os.walk don't follow links to dirs
+                if not islink:
+                    todo.append(os.path.join(root,dirname))
+
+            defaultmod = None
+            # go thru all the module files in the dir
+            for filename in files:
+                # ignore the version.py file
+                if filename != envmasterconf.VERSIONFILE:
+                    fullpath = os.path.join(root,filename)
+                    # is it a EnvMasterFile?
+                    if self.isEnvMasterFile(fullpath):
+                        modname = filename
+                        if root != path:
+                            # in a subdir
+                            # create the module name from the dir name
+                            modname = root.split(os.sep)[-1] + os.sep + filename
+                            if defaultmod is None:
+                                # find the default module file so we 
+                                # can show which one is default
+                                defaultmod = self.findDefault(root)
+                            if defaultmod == modname:
+                                # is the default - add a note
+                                modname += '(default)'
+                        availmodules.append((modname,fullpath))
+
+        # show the modules in sorted alphabetical order
+        availmodules.sort()
+        return availmodules
+
+    def iterAvailModules(self):
+        """
+        Generator that returns (path,availmodules) for each
+        search directory in order, where availmodules is as
+        returned by findAvailModules(). The search directories
+        are scanned at the same time in a pool of threads (see
+        envmasterconf.AVAIL_THREADS) and each is returned as soon
+        as it (and the ones before it) are done.
+        """
+        import threading
+
+        # one slot per search directory for the result
+        # of findAvailModules() and any exception
+        results = [None] * len(self.modpaths)
+        errors = [None] * len(self.modpaths)
+        done = [False] * len(self.modpaths)
+        cond = threading.Condition()
+        # index of the next search directory a thread should scan
+        nextpath = [0]
+
+        def worker():
+            while True:
+                cond.acquire()
+                try:
+                    index = nextpath[0]
+                    if index >= len(self.modpaths):
+                        return
+                    nextpath[0] += 1
+                finally:
+                    cond.release()
+                try:
+                    result = self.findAvailModules(self.modpaths[index])
+                    error = None
+                except BaseException:
+                    result = None
+                    error = sys.exc_info()[1]
+                cond.acquire()
+                try:
+                    results[index] = result
+                    errors[index] = error
+                    done[index] = True
+                    cond.notify()
+                finally:
+                    cond.release()
+
+        nthreads = max(1,min(envmasterconf.AVAIL_THREADS,len(self.modpaths)))
+        threads = []
+        for n in range(nthreads):
+            thread = threading.Thread(target=worker)
+            # don't hang around if we have an error
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        # for each search directory
+        for index,path in enumerate(self.modpaths):
+            cond.acquire()
+            try:
+                while not done[index]:
+                    cond.wait()
+            finally:
+                cond.release()
+            if errors[index] is not None:
+                raise errors[index]
+            yield path,results[index]
+
+        for thread in threads:
+            thread.join()
+
+    def availModules(self,longlist=False,shell=None):
         """
         Displays to the terminal a list of all the
-        available modules
+        available modules. If longlist is True the description
+        of each (from module.whatis(), found by the catalog)
+        is shown as well. If shell is the name of one of the
+        shells whose output is read by other programs (see
+        envmastershells.RecordShell) a record is written for
+        each module instead.
         """
+        if shell is not None:
+            shell = self.createShell(shell,True)
+            if not isinstance(shell,RecordShell):
+                shell = None
+        if shell is None:
+            envmasterformat = importFormat()
+            format = envmasterformat.EnvMasterFormat()
+        catalog = None
+        if longlist:
+            catalog = envmastercatalog.getCatalog()
 
-        format = envmasterformat.EnvMasterFormat()
-        
         totalmodules = 0
 
         # for each search directory
-        for path in self.modpaths:
-            availmodules = []
-            format.displayTitle(path)
-            # walk that directory looking for module files
-            for root, dirs, files in os.walk(path):
-
-                if root != path:
-                    # we are in a subdir - find the 
-                    # default module file so we can show
-                    # which one is default
-                    defaultmod = self.findDefault(root)
-
-                # go thru all the module files in the dir
-                for filename in files:
-                    # ignore the version.py file
-                    if filename != envmasterconf.VERSIONFILE:
-                        fullpath = os.path.join(root,filename)
-                        # is it a EnvMasterFile?
-                        if self.isEnvMasterFile(fullpath):
-                            modname = filename
-                            if root != path:
-                                # in a subdir
-                                # create the module name from the dir name
-                                modname = root.split(os.sep)[-1] + os.sep + filename
-                                if defaultmod == modname:
-                                    # is the default - add a note
-                                    modname += '(default)'
-                            availmodules.append(modname)
-              
-            # show the modules in sorted alphabetical order
-            availmodules.sort()
-            # show them
-            format.listAsColumns(availmodules)
+        for path,availmodules in self.iterAvailModules():
+            if shell is not None:
+                for modname,modpath in availmodules:
+                    isdefault = modname.endswith('(default)')
+                    if isdefault:
+                        modname = modname[:-len('(default)')]
+                    info = {'name' : modname,'path' : modpath,'root' : path,
+                                'default' : isdefault}
+                    if catalog is not None:
+                        info['whatis'] = catalog.getInfo(modpath).getWhatIs()
+                    shell.writeModule(info)
+
+            elif longlist:
+                format.displayTitle(path)
+                table = []
+                for modname,modpath in availmodules:
+                    whatis = None
+                    if catalog is not None:
+                        whatis = catalog.getInfo(modpath).getWhatIs()
+                    if whatis is None:
+                        whatis = ''
+                    table.extend([modname,whatis])
+                if len(table) > 0:
+                    format.displayTable(table,2)
+            else:
+                format.displayTitle(path)
+                format.listAsColumns([modname for modname,modpath in availmodules])
             
             totalmodules += len(availmodules)
-            
+
         if totalmodules == 0:
             msg = "No module files found"
             raise envmasterexceptions.EnvMasterNoModules(msg)
             
-    def listModules(self):
+    def searchModules(self,query):
+        """
+        Displays the modules whose name, version, description
+        or the variables and paths they set match the words
+        in query, best match first (see envmastersearch)
+        """
+        index = envmastersearch.getSearchIndex()
+        index.update(self)
+        results = index.search(query,self.modpaths)
+        if len(results) == 0:
+            msg = "No modules match '%s'" % query
+            raise envmasterexceptions.EnvMasterNoModules(msg)
+
+        envmasterformat = importFormat()
+        format = envmasterformat.EnvMasterFormat()
+        table = []
+        for score,modname,root,whatis in results:
+            name,version = envmasterloaded.splitModName(modname)
+            if (version is not None and
+                    self.findDefault(os.path.join(root,name)) == modname):
+                modname += '(default)'
+            if whatis is None:
+                whatis = ''
+            table.extend([modname,whatis,root])
+        format.displayTitle("Modules matching '%s'" % query)
+        format.displayTable(table,3)
+
+    def listModules(self,shell=None):
         """
         List the currently loaded modules to the screen.
-        Uses envmasterformat to format it as it a multi column list
+        Uses envmasterformat to format it as it a multi column list.
+        If shell is the name of one of the shells whose output
+        is read by other programs (see envmastershells.RecordShell)
+        a record is written for each module instead, first
+        loaded first.
         """
-        
+        loaded = envmasterloaded.getLoadedModules(self.environ).getFullNames()
+        if shell is not None:
+            shell = self.createShell(shell,True)
+            if isinstance(shell,RecordShell):
+                loaded.reverse()
+                for mod in loaded:
+                    shell.writeModule({'name' : mod})
+                return
+
+        envmasterformat = importFormat()
         format = envmasterformat.EnvMasterFormat()
         format.displayTitle("Currently Loaded EnvMaster files")
-        loaded = os.getenv(envmasterconf.LOADEDMODULESENV)
-        if loaded is not None and loaded != '':
-            loaded = loaded.split(os.pathsep)
+        if len(loaded) > 0:
             numbered = []
             count = 1
             # go thru each one and add a 
@@ -327,48 +917,347 @@ class EnvMasterFile(object):
             msg = 'No EnvMasters currently loaded'
             format.listAsColumns([msg])
 
-    def reloadAllModules(self, shell):
+    def reloadAllModules(self, shell, force=False):
         """
-        Reload all the modules starting at the first one loaded
+        Reload all the modules starting at the first one loaded.
+        Unless force is True only the modules whose files have
+        changed or whose default version is now different (and
+        the modules that load them) are reloaded and the names
+        of the others are written to STDERR.
         """
-        loaded = os.getenv(envmasterconf.LOADEDMODULESENV)
-        if loaded is not None and loaded != '':
-            loaded = loaded.split(os.pathsep)
+        loaded = envmasterloaded.getLoadedModules(self.environ).getFullNames()
+        if len(loaded) > 0:
 
             # start from earliest
             loaded.reverse()
+            if not force and envmasterconf.RELOAD_CHANGED_ONLY:
+                changed = self.findChangedModules(loaded)
+            else:
+                changed = set(loaded)
+            operations = []
+            skipped = []
             for loadedname in loaded:
-                if loadedname.find(os.sep) != -1:
-                    testname, testversion = loadedname.split(os.sep)
-                else:
-                    testname = loadedname
-                    testversion = ""
+                if loadedname not in changed:
+                    skipped.append(loadedname)
+                    continue
+                testname,testversion = envmasterloaded.splitModName(loadedname)
+                operations.append((testname, False))
+                operations.append((testname, True))
+            if len(operations) > 0:
+                self.runBatch(shell, operations)
+            if len(skipped) > 0:
+                msg = 'Not reloaded (unchanged): %s\n' % ' '.join(skipped)
+                envmasterconf.STDERR.write(msg)
 
-                self.runModule(shell, [testname], False)
-                self.runModule(shell, [testname], True)
+    def findChangedModules(self, loaded):
+        """
+        Returns the set of the full names in loaded that
+        'allreload' needs to reload. These are the modules whose
+        module file or version file has changed since they were
+        loaded (see envmasterloaded.moduleFingerprint()), where
+        reloading would give a different version, and the
+        modules that load or need (module.prereq()) any of these.
+        """
+        fingerprints = envmasterloaded.ModuleFingerprints(
+                        self.environ.get(envmasterconf.FINGERPRINTSENV))
+        changed = set()
+        # full name -> names of the modules it loads and needs
+        dependencies = {}
+        for loadedname in loaded:
+            name,version = envmasterloaded.splitModName(loadedname)
+            fullmod,path = self.getModule(name)
+            if (fullmod != loadedname or fingerprints.get(loadedname) !=
+                        envmasterloaded.moduleFingerprint(loadedname, path)):
+                changed.add(loadedname)
+            else:
+                loads,prereqs = envmasterplan.getDependencies(path)
+                names = set()
+                for modname in loads:
+                    names.add(envmasterloaded.splitModName(modname)[0])
+                for prereq in prereqs:
+                    for modname in prereq:
+                        names.add(envmasterloaded.splitModName(modname)[0])
+                dependencies[loadedname] = names
+
+        # until nothing else needs reloading
+        while True:
+            changednames = set([envmasterloaded.splitModName(loadedname)[0]
+                                for loadedname in changed])
+            dependents = [loadedname for loadedname,names in dependencies.items()
+                            if loadedname not in changed and len(names & changednames) > 0]
+            if len(dependents) == 0:
+                break
+            changed.update(dependents)
+        return changed
     
     def unloadAllModules(self, shell):
         """
         Unload all the modules starting at the first one loaded
         """
-        loaded = os.getenv(envmasterconf.LOADEDMODULESENV)
-        if loaded is not None and loaded != '':
-            loaded = loaded.split(os.pathsep)
+        loaded = envmasterloaded.getLoadedModules(self.environ).getFullNames()
+        if len(loaded) > 0:
 
+            operations = []
             for loadedname in loaded:
-                if loadedname.find(os.sep) != -1:
-                    testname, testversion = loadedname.split(os.sep)
+                testname,testversion = envmasterloaded.splitModName(loadedname)
+                operations.append((testname, False))
+            self.runBatch(shell, operations)
+
+    def execCommand(self, modlist, cmdargs=None):
+        """
+        Load the modules in modlist into a copy of self.environ
+        and replace the current process with the command in
+        cmdargs (found using the new PATH) run in the resulting
+        environment. Runs the user's shell if cmdargs is None.
+        Nothing is written out for the shell to evaluate.
+        """
+        environ = envmasterenviron.DictEnviron(self.environ.getValues())
+        EnvMasterFile(environ).resolveModules(modlist)
+        values = environ.getValues()
+        if cmdargs is None:
+            # EnvMaster's own records are left in as
+            # envmaster can be used in the shell
+            cmdargs = [getUserShell(values)]
+        else:
+            for var in envmasterconf.RECORDVARS:
+                values.pop(var,None)
+
+        # the process is replaced so the exit
+        # handlers won't get to do this
+        cache = envmastercache.getResolveCache()
+        if cache is not None:
+            cache.save()
+        codecache = envmastercache.getCodeCache()
+        if codecache is not None:
+            codecache.finish()
+        tracer = envmastertrace.getTracer()
+        if tracer is not None:
+            tracer.summary()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        try:
+            os.execvpe(cmdargs[0], cmdargs, values)
+        except OSError:
+            msg = "Unable to run '%s': %s" % (cmdargs[0], sys.exc_info()[1].strerror)
+            raise envmasterexceptions.EnvMasterExecError(msg)
+
+    def purgeModules(self, shell):
+        """
+        Put back all the variables EnvMaster has changed
+        to the values they had before it first changed them. 
+        Unlike unloadAllModules() the module files aren't run.
+        """
+        shell = self.createShell(shell, False)
+        baseline = shell.getBaseline()
+        for var,value in list(baseline.values.items()):
+            shell.restoreVar(value, var)
+        shell.flush()
+
+    def saveSnapshot(self, name):
+        """
+        Save the current values of all the variables EnvMaster
+        has changed as the named snapshot
+        """
+        shell = self.createShell('pythonsilent', True)
+        values = {}
+        for var in shell.getBaseline().values:
+            values[var] = self.environ.get(var)
+        envmastersnapshot.saveSnapshot(name, values)
+
+    def restoreSnapshot(self, shell, name):
+        """
+        Put the variables back to how they were when the
+        named snapshot was saved. Variables EnvMaster has changed
+        since are put back to their baseline values.
+        """
+        values = envmastersnapshot.loadSnapshot(name)
+        shell = self.createShell(shell, False)
+        baseline = shell.getBaseline()
+        # so we can purge afterwards
+        for var in values:
+            baseline.note(var, shell.environ)
+        for var,basevalue in list(baseline.values.items()):
+            shell.restoreVar(values.get(var, basevalue), var)
+        shell.flush()
+
+    def resolveModules(self, modlist):
+        """
+        Load the modules in modlist into self.environ without
+        writing anything out. Returns (resolved,shell) where
+        resolved is a list of (modname,fullmodname,path) for
+        each of modlist and shell is the BaseShell used. Its
+        depends attribute has the paths of the files and
+        directories the result depends on.
+        """
+        resolved = []
+        for modname in modlist:
+            fullmod,path = self.getModule(modname)
+            if fullmod is None:
+                msg = "Can't find Module '%s'" % modname
+                raise envmasterexceptions.EnvMasterNoModule(msg)
+            resolved.append((modname, fullmod, path))
+
+        # doesn't write anything out - just changes self.environ
+        shell = BaseShell(True)
+        shell.environ = self.environ
+        shell.depends = set()
+        self.runModule(shell, modlist, True)
+        shell.flush()
+        return resolved, shell
+
+    def saveCollection(self, name, modlist, base=None):
+        """
+        Load the modules in modlist (without changing the
+        environment of the shell) and save the result as the
+        named collection (see envmastercollection). If base is
+        given (a dictionary of variable name -> value, or None
+        if not set) these values are used in place of the current
+        ones. Returns the Collection.
+        """
+        start = self.environ.getValues()
+        if base is not None:
+            for var,value in base.items():
+                if value is None:
+                    start.pop(var, None)
                 else:
-                    testname = loadedname
-                    testversion = ""
+                    start[var] = value
+        environ = envmasterenviron.DictEnviron(start)
+        resolved, shell = EnvMasterFile(environ).resolveModules(modlist)
+
+        # what has changed
+        base = {}
+        final = {}
+        for var in set(start.keys()) | set(environ.values.keys()):
+            value = environ.get(var)
+            if start.get(var) != value:
+                base[var] = start.get(var)
+                final[var] = value
+
+        validators = []
+        for path in sorted(shell.depends):
+            validators.append((path, envmastercache.fingerprint(path)))
+
+        collection = envmastercollection.Collection(name, modlist, resolved,
+                        validators, base, final, list(shell.pathlists.keys()))
+        collection.save()
+        return collection
+
+    def restoreCollection(self, shell, name):
+        """
+        Load the named collection. If nothing it depends on
+        has changed the saved commands are written out without
+        running any module files. If module files etc have changed
+        it is saved again first. If the environment isn't the same
+        as when it was saved the modules are just loaded.
+        """
+        collection = envmastercollection.loadCollection(name)
+        if not collection.isUpToDate(self):
+            collection = self.saveCollection(name, collection.modlist, 
+                                collection.base)
+
+        key = envmastercollection.getShellKey(shell)
+        if key is not None and collection.matchesEnviron(self.environ):
+            envmasterconf.STDOUT.write(collection.texts[key])
+        else:
+            # we don't keep commands for this shell or they
+            # won't give the right result
+            self.runModule(shell, collection.modlist, True)
 
-                self.runModule(shell, [testname], False)
+    def buildIndex(self, root):
+        """
+        Write the index for the directory root (one of the
+        directories in ENVMASTERPATH) that is used by later
+        commands in place of looking at the module files (see
+        envmasterindex). Returns the path of the index file.
+        """
+        # look at the files, not an existing index
+        live = EnvMasterFile(self.environ)
+        live.useindex = False
+        live.modpaths = [root]
+        # so we don't need to read unchanged files again
+        oldindex = envmasterindex.openRootIndex(root, True)
+
+        def isValid(name, version, fullpath, fp):
+            valid = None
+            if oldindex is not None:
+                valid = oldindex.isValid(name, version, fp)
+            if valid is None:
+                valid = live.isEnvMasterFile(fullpath)
+            return valid
+
+        entries = {}
+        files,dirs = listDir(root)
+        for filename in files:
+            if filename.startswith('.') or filename == envmasterconf.VERSIONFILE:
+                continue
+            fullpath = os.path.join(root, filename)
+            envmasterindex.checkName(filename, fullpath)
+            fp = envmastercache.fingerprint(fullpath)
+            entries[filename] = {'kind' : envmasterindex.FILEENTRY,
+                    'valid' : isValid(filename, None, fullpath, fp),
+                    'fingerprint' : fp}
+
+        for dirname,islink in dirs:
+            if dirname.startswith('.'):
+                continue
+            dirpath = os.path.join(root, dirname)
+            envmasterindex.checkName(dirname, dirpath)
+            subdirs = listDir(dirpath)[1]
+            versions = []
+            for key,version in live.getVersionIndex(dirpath).getEntries():
+                fullpath = os.path.join(dirpath, version)
+                envmasterindex.checkName(version, fullpath)
+                fp = envmastercache.fingerprint(fullpath)
+                versions.append((version, isValid(dirname, version, fullpath, fp), fp))
+
+            # only record a default that findModule() can use directly
+            # and that is the same whichever host reads the index
+            default = None
+            try:
+                defaultmodname = live.findDefault(dirpath)
+                name,version = envmasterloaded.splitModName(defaultmodname)
+                if (dirpath not in live.dynamicdefaults and
+                        version in [entry[0] for entry in versions]):
+                    default = version
+            except envmasterexceptions.EnvMasterException:
+                pass
+
+            entries[dirname] = {'kind' : envmasterindex.DIRENTRY,
+                    'default' : default, 'versions' : versions,
+                    'subdirs' : sorted([subdir for subdir,islink in subdirs])}
+
+        availmodules = live.findAvailModules(root)
+        return envmasterindex.writeRootIndex(root, entries, availmodules)
+
+    def buildIndexes(self, roots=None):
+        """
+        Write the index for each of roots (all the directories
+        in ENVMASTERPATH if None) and say where they went
+        """
+        if roots is None:
+            # ENVMASTERPATH often has directories that
+            # don't exist on every machine
+            roots = [root for root in self.modpaths if os.path.isdir(root)]
+        for root in roots:
+            if not os.path.isdir(root):
+                msg = "Unable to index '%s': not a directory" % root
+                raise envmasterexceptions.EnvMasterIndexError(msg)
+            path = self.buildIndex(root)
+            envmasterconf.STDERR.write('Wrote %s\n' % path)
 
 # hack to avoid circular import problem                               
 if sys.version_info[0] < 3:
     from envmasterenv import EnvMasterEnv
+    import envmasterplan
+    import envmastercollection
+    import envmastercatalog
+    import envmastersearch
 else:
     from envmaster.envmasterenv import EnvMasterEnv
+    from envmaster import envmasterplan
+    from envmaster import envmastercollection
+    from envmaster import envmastercatalog
+    from envmaster import envmastersearch
 
 if __name__ == '__main__':
     
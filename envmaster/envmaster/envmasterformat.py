@@ -20,14 +20,15 @@ and fills it up with text turned into columns or tables.
 # You should have received a copy of the GNU General Public License
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+import os
 import math
 import struct
 import sys
 if sys.version_info[0] < 3:
     # keep compatibility with Python2.4
-    from envmasterconf import STDERR
+    import envmasterconf
 else:
-    from envmaster.envmasterconf import STDERR
+    from envmaster import envmasterconf
 
 class EnvMasterFormat(object):
     """
@@ -58,12 +59,17 @@ class EnvMasterFormat(object):
             import fcntl
             import termios
             try:
-                data = fcntl.ioctl(STDERR, termios.TIOCGWINSZ,'1234')
+                data = fcntl.ioctl(envmasterconf.STDERR, termios.TIOCGWINSZ,'1234')
                 (self.textrows,self.textcols) = struct.unpack('hh', data)
             except OSError:
-                # not a tty
+                # not a tty. The daemon client passes the
+                # size of its terminal in $COLUMNS
                 self.textrows = 24
                 self.textcols = 80
+                try:
+                    self.textcols = int(os.getenv('COLUMNS','80'))
+                except ValueError:
+                    pass
         
     def displayTitle(self,title):
         """
@@ -78,7 +84,7 @@ class EnvMasterFormat(object):
         paddedtitle = '=' * int(nequals / 2) + paddedtitle
         paddedtitle += '=' * (self.textcols - len(paddedtitle))
         # write it out
-        STDERR.write(paddedtitle + '\n\n')
+        envmasterconf.STDERR.write(paddedtitle + '\n\n')
         
         
     def listAsColumns(self,listdata):
@@ -114,8 +120,8 @@ class EnvMasterFormat(object):
                     bufferstr += name
                     # buffer it out to maxlength
                     bufferstr += ' ' * (maxlength - len(name))
-            STDERR.write(bufferstr + '\n')
-        STDERR.write('\n')
+            envmasterconf.STDERR.write(bufferstr + '\n')
+        envmasterconf.STDERR.write('\n')
             
     @staticmethod
     def trimString(string, amounttotrim):
@@ -192,5 +198,5 @@ class EnvMasterFormat(object):
                 bufferstr += ' ' * (colsizes[col] - len(data))
                     
                 index += 1
-            STDERR.write(bufferstr + '\n')
-        STDERR.write('\n')
+            envmasterconf.STDERR.write(bufferstr + '\n')
+        envmasterconf.STDERR.write('\n')
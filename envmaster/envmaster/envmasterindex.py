@@ -0,0 +1,382 @@
+"""
+Module that reads and writes the index file kept at the top
+of each directory in ENVMASTERPATH (see 'envmaster index build').
+This records the module names, the versions of each, the default
+version, whether each module file has the EnvMaster sentinel and
+their fingerprints, so a client only needs to open and mmap one
+file per directory rather than looking at the module files. When
+a lot of jobs start at once on a cluster this saves the file
+server being asked the same questions over and over.
+
+An index is only used while it is at least as new as the
+directory it is in, ie it is ignored as soon as anything is
+added to or removed from the top of the directory. Changes further
+down (ie a new version of a module) aren't noticed until the
+index is built again.
+
+The file is a header, then a table of (name offset, name length,
+data offset, data length) for each entry sorted by name so it can
+be binary searched in place, then the names and the data of each
+entry. The data is tab separated text, one line per item.
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+import struct
+if sys.version_info[0] < 3:
+    # keep compatibility with Python2.4
+    import envmasterconf
+    import envmasterexceptions
+    import envmasterloaded
+    import envmasterversion
+else:
+    from envmaster import envmasterconf
+    from envmaster import envmasterexceptions
+    from envmaster import envmasterloaded
+    from envmaster import envmasterversion
+
+# bump this if the layout changes
+MAGIC = b'EMINDEX1'
+# magic, number of entries, offset of the table,
+# offset and length of the avail list
+HEADER = struct.Struct('<8sIIII')
+# name offset, name length, data offset, data length
+RECORD = struct.Struct('<IIII')
+
+# kinds of entry
+FILEENTRY = 'f'
+DIRENTRY = 'd'
+
+class IndexEntry(object):
+    """
+    What the index knows about one name at
+    the top of the directory
+    """
+    def __init__(self,data):
+        # FILEENTRY or DIRENTRY
+        self.kind = None
+        # for a file, whether it has the sentinel
+        self.valid = False
+        # for a directory, the default version (None if
+        # it couldn't be worked out), version -> whether
+        # it has the sentinel, the versions lowest to highest
+        # and the names of subdirectories
+        self.default = None
+        self.versions = {}
+        self.versionlist = []
+        self.subdirs = set()
+        # version (None for a file) -> fingerprint
+        # (see envmastercache.fingerprint())
+        self.fingerprints = {}
+        for line in data.split('\n'):
+            fields = line.split('\t')
+            if fields[0] == FILEENTRY:
+                self.kind = FILEENTRY
+                self.valid = fields[1] == '1'
+                self.fingerprints[None] = (float(fields[2]),int(fields[3]))
+            elif fields[0] == DIRENTRY:
+                self.kind = DIRENTRY
+                if fields[1] != '':
+                    self.default = fields[1]
+            elif fields[0] == 'v':
+                self.versions[fields[1]] = fields[2] == '1'
+                self.versionlist.append(fields[1])
+                self.fingerprints[fields[1]] = (float(fields[3]),int(fields[4]))
+            elif fields[0] == 's':
+                self.subdirs.add(fields[1])
+
+class RootIndex(object):
+    """
+    The index of one directory in ENVMASTERPATH. Use
+    getRootIndex() rather than creating one of these.
+    The find methods return None for the things the index
+    can't answer - the caller should look at the files.
+    """
+    def __init__(self,root,data):
+        self.root = root
+        self.data = data
+        magic,self.count,self.tableoffset,self.availoffset,self.availlength = (
+                    HEADER.unpack_from(data,0))
+        if magic != MAGIC:
+            raise ValueError('not an index file')
+        # name -> IndexEntry (or None) already looked up
+        self.entries = {}
+
+    def getText(self,offset,length):
+        """
+        Returns the text at offset in the file
+        """
+        text = self.data[offset:offset+length]
+        if sys.version_info[0] >= 3:
+            text = text.decode('utf-8')
+        return text
+
+    def getEntry(self,name):
+        """
+        Returns the IndexEntry for name or None if
+        there is nothing called name in the directory
+        """
+        if name in self.entries:
+            return self.entries[name]
+        key = name.encode('utf-8') if sys.version_info[0] >= 3 else name
+        entry = None
+        # binary search of the table
+        low = 0
+        high = self.count
+        while low < high:
+            middle = (low + high) // 2
+            nameoffset,namelength,dataoffset,datalength = RECORD.unpack_from(
+                    self.data,self.tableoffset + middle * RECORD.size)
+            middlename = self.data[nameoffset:nameoffset+namelength]
+            if middlename < key:
+                low = middle + 1
+            elif middlename > key:
+                high = middle
+            else:
+                entry = IndexEntry(self.getText(dataoffset,datalength))
+                break
+        self.entries[name] = entry
+        return entry
+
+    def findModule(self,modname):
+        """
+        Returns (fullmodname,fullpath) for modname as
+        EnvMasterFile.findModule() would for this directory
+        alone ((None,None) if it isn't here)
+        """
+        name,version = envmasterloaded.splitModName(modname)
+        entry = self.getEntry(name)
+        if entry is None:
+            return (None,None)
+        if entry.kind == FILEENTRY:
+            if version is not None:
+                # can't be in a file
+                return (None,None)
+            if not entry.valid:
+                return None
+            return (name,os.path.join(self.root,name))
+
+        if version is None:
+            version = entry.default
+            if version is None:
+                return None
+        elif version not in entry.versions:
+            if version in entry.subdirs or version.find(os.sep) != -1:
+                # deeper than we go
+                return None
+            return (None,None)
+        if not entry.versions.get(version):
+            # not found or not an EnvMaster file
+            return None
+        fullmodname = name + os.sep + version
+        return (fullmodname,os.path.join(self.root,fullmodname))
+
+    def findModuleSpec(self,name,spec):
+        """
+        Returns (fullmodname,fullpath) for the highest version
+        of name that satisfies spec as EnvMasterFile.findModuleSpec()
+        would for this directory alone
+        """
+        entry = self.getEntry(name)
+        if entry is None or entry.kind != DIRENTRY:
+            return (None,None)
+        version = self.getVersionIndex(name).findBest(spec)
+        if version is None:
+            return (None,None)
+        if not entry.versions[version]:
+            return None
+        fullmodname = name + os.sep + version
+        return (fullmodname,os.path.join(self.root,fullmodname))
+
+    def getVersionIndex(self,name):
+        """
+        Returns the envmasterversion.VersionIndex for the
+        module directory name or None if there isn't one
+        """
+        entry = self.getEntry(name)
+        if entry is None or entry.kind != DIRENTRY:
+            return None
+        # already sorted
+        entries = [(envmasterversion.versionKey(version),version)
+                        for version in entry.versionlist]
+        return envmasterversion.VersionIndex(entries=entries)
+
+    def getDefault(self,name):
+        """
+        Returns the default module name for the
+        module directory name
+        """
+        entry = self.getEntry(name)
+        if entry is None or entry.kind != DIRENTRY or entry.default is None:
+            return None
+        return name + os.sep + entry.default
+
+    def isValid(self,name,version,fp):
+        """
+        Returns True or False for whether the module file
+        name/version (or just name if version is None) has
+        the EnvMaster sentinel, or None if not known or
+        its fingerprint isn't fp
+        """
+        entry = self.getEntry(name)
+        if entry is None or entry.fingerprints.get(version) != fp:
+            return None
+        if version is None:
+            return entry.valid
+        return entry.versions[version]
+
+    def getAvailModules(self):
+        """
+        Returns the list of (name,path) as
+        EnvMasterFile.findAvailModules() would
+        """
+        availmodules = []
+        text = self.getText(self.availoffset,self.availlength)
+        for line in text.split('\n'):
+            if line != '':
+                modname,relpath = line.split('\t')
+                availmodules.append((modname,os.path.join(self.root,relpath)))
+        return availmodules
+
+def getIndexPath(root):
+    """
+    Returns the path of the index file for root
+    """
+    return os.path.join(root,envmasterconf.INDEXFILE)
+
+def openRootIndex(root,anyage=False):
+    """
+    Returns the RootIndex for root or None if there isn't
+    one or it is older than the directory (unless anyage
+    is True)
+    """
+    try:
+        rootmtime = os.stat(root).st_mtime
+        fd = os.open(getIndexPath(root),os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        if not anyage and os.fstat(fd).st_mtime < rootmtime:
+            # something has been added or removed
+            return None
+        import mmap
+        try:
+            data = mmap.mmap(fd,0,access=mmap.ACCESS_READ)
+            return RootIndex(root,data)
+        except (EnvironmentError,ValueError,struct.error):
+            return None
+    finally:
+        os.close(fd)
+
+_rootindexes = {}
+
+def getRootIndex(root):
+    """
+    Returns the RootIndex for root (opened the first time
+    it is asked for) or None if it doesn't have one we can use
+    """
+    if root in _rootindexes:
+        return _rootindexes[root]
+    index = openRootIndex(root)
+    _rootindexes[root] = index
+    return index
+
+def clearRootIndexes():
+    """
+    Forget the indexes that have been opened. The daemon
+    does this before each command so new indexes are seen.
+    """
+    _rootindexes.clear()
+
+def checkName(name,path):
+    """
+    Raises an error if name can't be stored in the index
+    """
+    if name.find('\t') != -1 or name.find('\n') != -1:
+        msg = "Unable to index '%s': names can't contain tabs or new lines" % path
+        raise envmasterexceptions.EnvMasterIndexError(msg)
+
+def formatEntry(entry):
+    """
+    Returns the data for an entry (a dictionary as
+    built by EnvMasterFile.buildIndex())
+    """
+    if entry['kind'] == FILEENTRY:
+        mtime,size = entry['fingerprint']
+        lines = ['%s\t%d\t%r\t%d' % (FILEENTRY,entry['valid'],mtime,size)]
+    else:
+        default = entry['default']
+        if default is None:
+            default = ''
+        lines = ['%s\t%s' % (DIRENTRY,default)]
+        for version,valid,(mtime,size) in entry['versions']:
+            lines.append('v\t%s\t%d\t%r\t%d' % (version,valid,mtime,size))
+        for subdir in entry['subdirs']:
+            lines.append('s\t%s' % subdir)
+    return '\n'.join(lines)
+
+def writeRootIndex(root,entries,availmodules):
+    """
+    Writes the index for root. entries is a dictionary of name
+    -> entry (see formatEntry()) and availmodules the result
+    of EnvMasterFile.findAvailModules() for root.
+    """
+    def encode(text):
+        if sys.version_info[0] >= 3:
+            return text.encode('utf-8')
+        return text
+
+    names = sorted([(encode(name),name) for name in entries])
+    tableoffset = HEADER.size
+    offset = tableoffset + RECORD.size * len(names)
+    table = []
+    blobs = []
+    for key,name in names:
+        data = encode(formatEntry(entries[name]))
+        table.append(RECORD.pack(offset,len(key),offset + len(key),len(data)))
+        blobs.append(key)
+        blobs.append(data)
+        offset += len(key) + len(data)
+
+    lines = []
+    for modname,path in availmodules:
+        relpath = path[len(root):].lstrip(os.sep)
+        lines.append('%s\t%s\n' % (modname,relpath))
+    avail = encode(''.join(lines))
+    header = HEADER.pack(MAGIC,len(names),tableoffset,offset,len(avail))
+
+    path = getIndexPath(root)
+    tmppath = '%s.%d.tmp' % (path,os.getpid())
+    try:
+        fileobj = open(tmppath,'wb')
+        try:
+            fileobj.write(header + b''.join(table) + b''.join(blobs) + avail)
+        finally:
+            fileobj.close()
+        os.rename(tmppath,path)
+        # creating the file changed the directory so make the index
+        # the same age - it is then used until the directory changes
+        rootstat = os.stat(root)
+        os.utime(path,(rootstat.st_atime,rootstat.st_mtime))
+    except (IOError,OSError):
+        if os.path.exists(tmppath):
+            os.remove(tmppath)
+        msg = "Unable to write index for '%s': %s" % (root,sys.exc_info()[1])
+        raise envmasterexceptions.EnvMasterIndexError(msg)
+    return path
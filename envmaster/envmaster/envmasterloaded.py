@@ -0,0 +1,251 @@
+"""
+Module that keeps track of which modules are currently
+loaded. This is held in the environment variable named in
+envmasterconf.LOADEDMODULESENV as a list of full module
+names (most recently loaded first). Rather than splitting
+and searching this each time it is needed, it is parsed
+once into a LoadedModules instance which is kept up to
+date by the shells as modules are loaded and unloaded.
+
+Use the getLoadedModules() function to get the instance.
+
+The fingerprints of the module files that were loaded are
+kept in envmasterconf.FINGERPRINTSENV (see ModuleFingerprints).
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+import zlib
+if sys.version_info[0] < 3:
+    # keep compatibility with Python2.4
+    import envmasterconf
+    import envmastercache
+    import envmasterenviron
+    import envmasterversion
+else:
+    from envmaster import envmasterconf
+    from envmaster import envmastercache
+    from envmaster import envmasterenviron
+    from envmaster import envmasterversion
+
+def splitModName(modname):
+    """
+    Splits a module name into a tuple of (name,version).
+    version is None if the module name doesn't have one.
+    """
+    if modname.find(os.sep) != -1:
+        name,version = modname.split(os.sep,1)
+    else:
+        name = modname
+        version = None
+    return name,version
+
+class LoadedModules(object):
+    """
+    The parsed list of currently loaded modules. Lookups
+    by full name or by module name (without version) don't
+    need to search the whole list.
+    """
+    def __init__(self,value):
+        self.setValue(value)
+
+    def setValue(self,value):
+        """
+        (Re)build everything from the value of the
+        environment variable (which may be None)
+        """
+        self.value = value
+        # full names, most recently loaded first
+        self.fullnames = []
+        # for quick 'is it loaded' checks
+        self.fullnameset = set()
+        # name -> list of versions loaded (most recent first)
+        # version is None for unversioned modules
+        self.versions = {}
+        if value is not None and value != '':
+            for fullname in value.split(os.pathsep):
+                self.fullnames.append(fullname)
+                self.fullnameset.add(fullname)
+                name,version = splitModName(fullname)
+                self.versions.setdefault(name,[]).append(version)
+
+    def sync(self,value):
+        """
+        Make sure we match the current value of the
+        environment variable - only reparses if someone
+        else has changed it.
+        """
+        if value != self.value:
+            self.setValue(value)
+
+    def added(self,fullname,value):
+        """
+        Called by the shell when a module is prepended to
+        the list. value is the new value of the variable.
+        """
+        self.fullnames.insert(0,fullname)
+        self.fullnameset.add(fullname)
+        name,version = splitModName(fullname)
+        self.versions.setdefault(name,[]).insert(0,version)
+        self.value = value
+
+    def removed(self,fullname,value):
+        """
+        Called by the shell when a module is removed from
+        the list. value is the new value of the variable.
+        """
+        if fullname in self.fullnameset:
+            self.fullnames.remove(fullname)
+            if fullname not in self.fullnames:
+                self.fullnameset.discard(fullname)
+            name,version = splitModName(fullname)
+            versions = self.versions[name]
+            versions.remove(version)
+            if len(versions) == 0:
+                del self.versions[name]
+        self.value = value
+
+    def isLoaded(self,fullname):
+        """
+        Is the module with the given full name (ie with
+        version) loaded?
+        """
+        return fullname in self.fullnameset
+
+    def getVersions(self,name):
+        """
+        Returns a list of the versions of the named module
+        that are loaded (most recent first). Unversioned modules
+        show up as None. Empty list if not loaded.
+        """
+        return self.versions.get(name,[])
+
+    def findLoaded(self,modname):
+        """
+        Returns the full name of the loaded module that matches
+        modname (which may or may not have a version) or None
+        if there isn't one.
+        """
+        name,version = splitModName(modname)
+        versions = self.versions.get(name)
+        if versions is None:
+            return None
+        if version is None:
+            # most recent
+            version = versions[0]
+        elif envmasterversion.isSpec(version):
+            # most recent that matches
+            for loadedver in versions:
+                if envmasterversion.matchVersion(version,loadedver):
+                    break
+            else:
+                return None
+            version = loadedver
+        elif version not in versions:
+            return None
+        if version is None:
+            return name
+        return name + os.sep + version
+
+    def getFullNames(self):
+        """
+        Returns a copy of the list of full names
+        (most recently loaded first)
+        """
+        return list(self.fullnames)
+
+    def __len__(self):
+        return len(self.fullnames)
+
+def moduleFingerprint(fullname,path):
+    """
+    Returns a short string that changes when the module file
+    in path (for the module with the given full name) or the
+    version file of its directory change
+    """
+    fingerprints = [envmastercache.fingerprint(path)]
+    if splitModName(fullname)[1] is not None:
+        versionpath = os.path.join(os.path.dirname(path),envmasterconf.VERSIONFILE)
+        fingerprints.append(envmastercache.fingerprint(versionpath))
+    text = repr(fingerprints).encode('utf-8')
+    return '%08x' % (zlib.crc32(text) & 0xffffffff)
+
+class ModuleFingerprints(object):
+    """
+    The fingerprint (see moduleFingerprint()) of the module
+    file of each loaded module as it was when it was loaded.
+    Stored as 'fullname=fingerprint' records separated by
+    os.pathsep.
+    """
+    def __init__(self,value):
+        # full name -> fingerprint
+        self.fingerprints = {}
+        self.changed = False
+        if value is not None and value != '':
+            for record in value.split(os.pathsep):
+                try:
+                    fullname,fingerprint = record.rsplit('=',1)
+                except ValueError:
+                    # not one of ours
+                    continue
+                self.fingerprints[fullname] = fingerprint
+
+    def get(self,fullname):
+        """
+        Returns the fingerprint recorded for the
+        module or None if there isn't one
+        """
+        return self.fingerprints.get(fullname)
+
+    def set(self,fullname,fingerprint):
+        """
+        Record the fingerprint of the module. None
+        forgets it (ie when it is unloaded).
+        """
+        if fingerprint is None:
+            if fullname in self.fingerprints:
+                del self.fingerprints[fullname]
+                self.changed = True
+        elif self.fingerprints.get(fullname) != fingerprint:
+            self.fingerprints[fullname] = fingerprint
+            self.changed = True
+
+    def getValue(self):
+        """
+        Returns the value for the environment variable
+        """
+        records = ['%s=%s' % item for item in self.fingerprints.items()]
+        records.sort()
+        return os.pathsep.join(records)
+
+def getLoadedModules(environ=None):
+    """
+    Returns the shared LoadedModules instance for environ
+    (an envmasterenviron environment, the environment of
+    the current process if None).
+    """
+    if environ is None:
+        environ = envmasterenviron.PROCESSENVIRON
+    value = environ.get(envmasterconf.LOADEDMODULESENV)
+    loadedmodules = environ.loadedmodules
+    if loadedmodules is None:
+        loadedmodules = environ.loadedmodules = LoadedModules(value)
+    else:
+        loadedmodules.sync(value)
+    return loadedmodules
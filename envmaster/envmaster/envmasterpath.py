@@ -0,0 +1,165 @@
+"""
+Module that contains the classes the shells use to
+keep track of path variables (PATH, LD_LIBRARY_PATH etc).
+
+A PathList holds the entries of one variable for the
+whole of an EnvMaster command so the value doesn't need
+to be split and joined each time a module changes it.
+
+PathRefs records which loaded modules added each entry
+so that unloading a module doesn't remove an entry another
+loaded module still needs. This is kept between commands in
+the environment variable named in envmasterconf.PATHREFSENV.
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+
+# separates the owners of an entry in PathRefs
+OWNERSEP = ','
+# owner recorded for an entry that was already in the
+# variable before a module added it
+EXTERNALOWNER = ''
+
+class PathList(object):
+    """
+    The entries of a path variable. Keeps a count of
+    each entry so membership tests don't need to search
+    the list.
+    """
+    def __init__(self,value):
+        self.entries = []
+        # entry -> number of times it is in self.entries
+        self.counts = {}
+        if value is not None and value != '':
+            for entry in value.split(os.pathsep):
+                self.entries.append(entry)
+                self.counts[entry] = self.counts.get(entry,0) + 1
+        # joined value, None when it needs updating
+        self.value = value
+
+    def __contains__(self,entry):
+        return entry in self.counts
+
+    def __len__(self):
+        return len(self.entries)
+
+    def prepend(self,entry):
+        """
+        Put entry at the front. If it is already in the
+        list it is moved rather than added again.
+        """
+        if entry in self.counts:
+            if self.entries[0] == entry:
+                return
+            self.entries.remove(entry)
+        else:
+            self.counts[entry] = 1
+        self.entries.insert(0,entry)
+        self.value = None
+
+    def remove(self,entry):
+        """
+        Remove (the first occurrence of) entry. Does
+        nothing if it isn't there.
+        """
+        if entry not in self.counts:
+            return
+        self.entries.remove(entry)
+        if self.counts[entry] == 1:
+            del self.counts[entry]
+        else:
+            self.counts[entry] -= 1
+        self.value = None
+
+    def getValue(self):
+        """
+        Returns the value for the environment variable
+        """
+        if self.value is None:
+            self.value = os.pathsep.join(self.entries)
+        return self.value
+
+class PathRefs(object):
+    """
+    Which modules own each entry in each path variable.
+    Only entries added by modules are recorded.
+    Stored as 'VAR=entry=owner,owner' records separated
+    by os.pathsep (which entries can't contain).
+    """
+    def __init__(self,value):
+        # (var,entry) -> list of owners
+        self.owners = {}
+        self.changed = False
+        if value is not None and value != '':
+            for record in value.split(os.pathsep):
+                try:
+                    var,rest = record.split('=',1)
+                    entry,owners = rest.rsplit('=',1)
+                except ValueError:
+                    # not one of ours
+                    continue
+                self.owners[(var,entry)] = owners.split(OWNERSEP)
+
+    def addOwner(self,var,entry,owner,present):
+        """
+        Record that owner (the full module name) has added
+        entry to var. present says whether it was already there.
+        """
+        key = (var,entry)
+        owners = self.owners.get(key)
+        if owners is None:
+            owners = []
+            if present:
+                # someone else put it there. Make sure
+                # we leave it when the module is unloaded
+                owners.append(EXTERNALOWNER)
+            self.owners[key] = owners
+        if owner not in owners:
+            owners.append(owner)
+            self.changed = True
+
+    def removeOwner(self,var,entry,owner):
+        """
+        Record that owner no longer needs entry in var.
+        Returns True if something else still needs it.
+        Entries we have no record of aren't needed.
+        """
+        key = (var,entry)
+        owners = self.owners.get(key)
+        if owners is None:
+            return False
+        if owner in owners:
+            owners.remove(owner)
+            self.changed = True
+        if len(owners) == 0 or owners == [EXTERNALOWNER]:
+            # no loaded modules need it now
+            del self.owners[key]
+            self.changed = True
+            return len(owners) != 0
+        return True
+
+    def getValue(self):
+        """
+        Returns the value for the environment variable
+        """
+        records = []
+        for (var,entry),owners in self.owners.items():
+            records.append('%s=%s=%s' % (var,entry,OWNERSEP.join(owners)))
+        records.sort()
+        return os.pathsep.join(records)
@@ -0,0 +1,354 @@
+"""
+Module that works out everything that needs to happen
+when modules are loaded before any of them are run.
+
+Module files that call module.load() with literal module
+names at the top level (ie not inside an 'if' etc) are
+scanned (without running them) so the whole set of modules
+that will be loaded is known up front. Each module is only
+found once however many modules load it (and the work can
+be done ahead, see envmasterprefetch) and modules that load
+each other are reported as an error before anything is run.
+The modules loaded by module.load() are still run when the
+module file gets to the call so they see whatever it has done
+before it (eg changing ENVMASTERPATH or setting variables) and
+are loaded in the order the file is written.
+
+module.load() calls that can't be worked out this way are
+still run as normal when the module file is executed.
+
+Use the LoadPlanner class.
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import sys
+if sys.version_info[0] < 3:
+    # keep compatibility with Python2.4
+    import envmasterconf
+    import envmastercatalog
+    import envmasterexceptions
+    import envmasterloaded
+    import envmasterprefetch
+    import envmastertrace
+    import envmasterversion
+else:
+    from envmaster import envmasterconf
+    from envmaster import envmastercatalog
+    from envmaster import envmasterexceptions
+    from envmaster import envmasterloaded
+    from envmaster import envmasterprefetch
+    from envmaster import envmastertrace
+    from envmaster import envmasterversion
+
+def getDependencies(path):
+    """
+    Returns a tuple of (loads,prereqs) for the module file in
+    path where loads is a list of the module names passed to top
+    level module.load() calls with literal arguments and prereqs
+    is a tuple of module names for each module.prereq() call.
+    Taken from the catalog (see envmastercatalog).
+    """
+    info = envmastercatalog.getModuleInfo(path)
+    return info.getLoads(),info.getPrereqs()
+
+def findKey(modfile,modname):
+    """
+    Returns the key of the Prefetcher job that finds modname
+    using modfile (an EnvMasterFile). Includes the directories
+    searched so a module file that changes ENVMASTERPATH before
+    loading another doesn't get what was found before.
+    """
+    return ('find',tuple(modfile.modpaths),modname)
+
+class LoadPlanner(object):
+    """
+    Works out the order to load modules in. One is used for
+    the whole of a load (see EnvMasterFile.runModule()) including
+    the module.load() calls in the module files, so each module
+    file is only found and scanned once. If an
+    envmasterprefetch.Prefetcher is passed the modules are found,
+    scanned and compiled in its threads ahead of when they
+    are needed.
+    """
+    def __init__(self,prefetcher=None):
+        # the EnvMasterFile instance used to find the
+        # modules. Set by plan()
+        self.modfile = None
+        self.prefetcher = prefetcher
+        # findKey() -> (fullmodname,path)
+        self.found = {}
+        # fullmodname -> path of module file
+        self.paths = {}
+        # fullmodname -> list of fullmodnames it loads
+        self.loads = {}
+        # fullmodname -> list of tuples of module names
+        # passed to module.prereq()
+        self.prereqs = {}
+
+    def findModule(self,modname,parent=None,required=True):
+        """
+        Finds modname and returns its full module name. Returns
+        None if it is already loaded (and so won't be run). parent
+        is the full module name of the module that loads it
+        (if any) and is used for the error message if it
+        can't be found. If required is False None is returned
+        rather than raising an error.
+        """
+        key = findKey(self.modfile,modname)
+        if key in self.found:
+            fullmod,path = self.found[key]
+        elif self.prefetcher is not None:
+            fullmod,path = self.prefetcher.get(key,self.modfile.getModule,modname)
+        else:
+            fullmod,path = self.modfile.getModule(modname)
+        self.found[key] = (fullmod,path)
+        if fullmod is None:
+            if not required:
+                return None
+            msg = "Can't find Module '%s'" % modname
+            if parent is not None:
+                msg += ' (loaded by %s)' % parent
+            raise envmasterexceptions.EnvMasterNoModule(msg)
+        if self.modfile.isLoaded(fullmod):
+            return None
+        if self.paths.get(fullmod) != path:
+            # not seen before, or now found somewhere else
+            # as ENVMASTERPATH has changed so scan it again
+            self.paths[fullmod] = path
+            self.loads[fullmod] = None
+        return fullmod
+
+    def prefetch(self,modnames):
+        """
+        Start finding the modules in modnames in
+        the background (if we have a Prefetcher)
+        """
+        if self.prefetcher is not None:
+            for modname in modnames:
+                self.prefetcher.submit(findKey(self.modfile,modname),
+                                self.fetchModule,self.modfile,modname)
+
+    def fetchModule(self,modfile,modname):
+        """
+        Run by the Prefetcher. Finds modname using modfile
+        then starts scanning and compiling the module file.
+        """
+        fullmod,path = modfile.getModule(modname)
+        if path is not None:
+            self.prefetcher.submit(('scan',path),self.fetchDependencies,modfile,path)
+            self.prefetcher.submit(('compile',path),envmasterprefetch.compileAhead,path)
+        return fullmod,path
+
+    def fetchDependencies(self,modfile,path):
+        """
+        Run by the Prefetcher. Scans path and starts
+        finding the modules it loads using modfile.
+        """
+        loads,prereqs = getDependencies(path)
+        for modname in loads:
+            self.prefetcher.submit(findKey(modfile,modname),
+                                self.fetchModule,modfile,modname)
+        return loads,prereqs
+
+    def getDependencies(self,path):
+        """
+        Returns getDependencies() for path, from
+        the Prefetcher if we have one
+        """
+        if self.prefetcher is not None:
+            return self.prefetcher.get(('scan',path),self.fetchDependencies,
+                                self.modfile,path)
+        return getDependencies(path)
+
+    def discover(self):
+        """
+        Scans each module found (but not yet scanned) for
+        the modules it loads and finds them too. Carries
+        on until there are no new ones. Modules that can't
+        be found are left for the module.load() call to
+        find when it is run as it may be able to then (eg the
+        module file adds to ENVMASTERPATH before the call).
+        """
+        todo = [fullmod for fullmod in self.paths if self.loads[fullmod] is None]
+        queued = set(todo)
+        while len(todo) > 0:
+            fullmod = todo.pop()
+            loadnames,prereqs = self.getDependencies(self.paths[fullmod])
+            loads = []
+            for loadname in loadnames:
+                depmod = self.findModule(loadname,fullmod,False)
+                if depmod is not None and depmod not in loads:
+                    loads.append(depmod)
+                    if self.loads[depmod] is None and depmod not in queued:
+                        todo.append(depmod)
+                        queued.add(depmod)
+            self.loads[fullmod] = loads
+            self.prereqs[fullmod] = prereqs
+
+    def findPlanned(self,modname):
+        """
+        Returns a list of the full names of the planned
+        modules that match modname (which may or may not
+        include a version)
+        """
+        name,version = envmasterloaded.splitModName(modname)
+        matches = []
+        for fullmod in self.paths:
+            plannedname,plannedversion = envmasterloaded.splitModName(fullmod)
+            if plannedname == name and (version is None or
+                        envmasterversion.matchVersion(version,plannedversion)):
+                matches.append(fullmod)
+        return matches
+
+    def autoloadPrereqs(self):
+        """
+        Adds the first module listed in each module.prereq()
+        call to the plan where none of them are loaded or
+        already planned. Returns a list of the full names
+        of the modules added.
+        """
+        loadedmodules = envmasterloaded.getLoadedModules(self.modfile.environ)
+        added = []
+        for fullmod in list(self.paths.keys()):
+            for prereq in self.prereqs[fullmod]:
+                satisfied = False
+                for modname in prereq:
+                    if (loadedmodules.findLoaded(modname) is not None or
+                            len(self.findPlanned(modname)) > 0):
+                        satisfied = True
+                        break
+                if not satisfied:
+                    prereqmod = self.findModule(prereq[0],fullmod)
+                    if prereqmod is not None and prereqmod not in added:
+                        added.append(prereqmod)
+        return added
+
+    def dependsOn(self,fullmod):
+        """
+        Returns the planned modules that must be run
+        before fullmod. This is the modules it loads plus any
+        planned modules named in its module.prereq() calls.
+        """
+        dependencies = []
+        for prereq in self.prereqs[fullmod]:
+            for modname in prereq:
+                for depmod in self.findPlanned(modname):
+                    if depmod != fullmod and depmod not in dependencies:
+                        dependencies.append(depmod)
+        for depmod in self.loads[fullmod]:
+            if depmod not in dependencies:
+                dependencies.append(depmod)
+        return dependencies
+
+    def runFirst(self,fullmod):
+        """
+        Returns the planned modules named in the module.prereq()
+        calls of fullmod and the modules it loads (and the modules
+        they load etc), leaving out those loaded this way. These
+        have to be run before fullmod as the modules it loads are
+        run part way through it.
+        """
+        loaded = [fullmod]
+        for loadmod in loaded:
+            for depmod in self.loads[loadmod]:
+                if depmod not in loaded:
+                    loaded.append(depmod)
+        first = []
+        for loadmod in loaded:
+            for prereq in self.prereqs[loadmod]:
+                for modname in prereq:
+                    for depmod in self.findPlanned(modname):
+                        if depmod not in loaded and depmod not in first:
+                            first.append(depmod)
+        return first
+
+    def sort(self,roots):
+        """
+        Returns all the planned modules reachable from roots
+        with each one after its dependencies, otherwise in the
+        order they were asked for. Raises EnvMasterCycleError if
+        this isn't possible.
+        """
+        order = []
+        done = set()
+        # modules we are part way through, in order
+        stack = []
+
+        def visit(fullmod):
+            if fullmod in done:
+                return
+            if fullmod in stack:
+                cycle = stack[stack.index(fullmod):] + [fullmod]
+                msg = 'Modules load each other: %s' % ' -> '.join(cycle)
+                raise envmasterexceptions.EnvMasterCycleError(msg)
+            stack.append(fullmod)
+            for depmod in self.dependsOn(fullmod):
+                visit(depmod)
+            stack.pop()
+            done.add(fullmod)
+            order.append(fullmod)
+
+        for fullmod in roots:
+            visit(fullmod)
+        return order
+
+    @envmastertrace.traced('plan',lambda self,modfile,modlist: ' '.join(modlist))
+    def plan(self,modfile,modlist):
+        """
+        Returns a list of (fullmodname,path) tuples of the
+        modules to run (in order) to load the modules in modlist,
+        found using modfile (an EnvMasterFile). Modules found and
+        scanned by earlier calls aren't looked at again.
+        This is the modules in modlist in the order given, except
+        that modules named in a module.prereq() call are run before
+        the module that needs them. Modules that are already
+        loaded are left out, as are the ones loaded by module.load()
+        calls (they are run by the module file that loads them).
+        """
+        self.modfile = modfile
+        self.prefetch(modlist)
+        roots = []
+        for modname in modlist:
+            fullmod = self.findModule(modname)
+            if fullmod is not None and fullmod not in roots:
+                roots.append(fullmod)
+
+        self.discover()
+        runnable = list(roots)
+        if envmasterconf.PLAN_AUTOLOAD_PREREQS:
+            added = self.autoloadPrereqs()
+            while len(added) > 0:
+                runnable.extend(added)
+                self.discover()
+                added = self.autoloadPrereqs()
+
+        # raises an error if they load each other
+        self.sort(runnable)
+
+        order = []
+        def visit(fullmod):
+            if fullmod in order:
+                return
+            for depmod in self.runFirst(fullmod):
+                if depmod in runnable:
+                    visit(depmod)
+            order.append(fullmod)
+
+        for fullmod in roots:
+            visit(fullmod)
+        return [(fullmod,self.paths[fullmod]) for fullmod in order]
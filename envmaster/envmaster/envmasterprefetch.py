@@ -0,0 +1,194 @@
+"""
+Module that does the slow parts of loading modules (finding
+the module files, scanning them for the modules they load and
+compiling them) in a pool of threads ahead of when they are
+needed. On a network file system most of the time goes in
+waiting for the file server so this lets the waits for later
+modules overlap with running the earlier ones.
+
+The modules are still run one at a time in the same order as
+before - only the results of the lookups come from the threads.
+See LoadPlanner and EnvMasterFile.runModule().
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import sys
+import threading
+if sys.version_info[0] < 3:
+    # keep compatibility with Python2.4
+    import envmasterconf
+    import envmastercache
+else:
+    from envmaster import envmasterconf
+    from envmaster import envmastercache
+
+def compileAhead(path):
+    """
+    Compiles the module file in path into the code
+    cache so it is ready when it is run. Errors are
+    left for when it is actually run to report.
+    """
+    codecache = envmastercache.getCodeCache()
+    if codecache is None:
+        # nowhere to keep it
+        return
+    try:
+        codecache.compileFile(path)
+    except Exception:
+        pass
+
+def notifyAll(cond):
+    """
+    Wakes all the threads waiting on the threading.Condition
+    cond. notifyAll() is deprecated in Python 3 but
+    notify_all() isn't in Python < 2.6.
+    """
+    if hasattr(cond,'notify_all'):
+        cond.notify_all()
+    else:
+        cond.notifyAll()
+
+class Prefetcher(object):
+    """
+    A pool of up to nthreads threads that run jobs
+    submitted with submit(). Each job has a key and the
+    result is collected with get(), which waits for the job
+    if it is running or runs it there and then if it hasn't
+    started. Exceptions raised by a job are raised again by
+    get() so they come out in the same place as before.
+    Call close() when done.
+    """
+    def __init__(self,nthreads=None):
+        if nthreads is None:
+            nthreads = envmasterconf.PREFETCH_THREADS
+        self.nthreads = nthreads
+        self.cond = threading.Condition()
+        # (key,func,args) not yet started, in order
+        self.queue = []
+        # keys of all the jobs submitted
+        self.submitted = set()
+        # key -> (result,exception) of finished jobs
+        self.results = {}
+        self.threads = []
+        self.closed = False
+
+    def submit(self,key,func,*args):
+        """
+        Run func(*args) in the background unless
+        there is already a job for key
+        """
+        self.cond.acquire()
+        try:
+            if self.closed or key in self.submitted:
+                return
+            self.submitted.add(key)
+            self.queue.append((key,func,args))
+            if len(self.threads) < self.nthreads:
+                thread = threading.Thread(target=self.worker)
+                # don't hang around if we have an error
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+            self.cond.notify()
+        finally:
+            self.cond.release()
+
+    def runJob(self,key,func,args):
+        """
+        Run a job and store the result
+        """
+        try:
+            result = func(*args)
+            error = None
+        except BaseException:
+            result = None
+            error = sys.exc_info()[1]
+        self.cond.acquire()
+        try:
+            self.results[key] = (result,error)
+            notifyAll(self.cond)
+        finally:
+            self.cond.release()
+
+    def worker(self):
+        """
+        Runs the queued jobs until close() is called
+        """
+        while True:
+            self.cond.acquire()
+            try:
+                while len(self.queue) == 0 and not self.closed:
+                    self.cond.wait()
+                if self.closed:
+                    return
+                key,func,args = self.queue.pop(0)
+            finally:
+                self.cond.release()
+            self.runJob(key,func,args)
+
+    def get(self,key,func,*args):
+        """
+        Returns the result of the job for key. If it
+        was never submitted func(*args) is called.
+        """
+        self.cond.acquire()
+        try:
+            if key not in self.submitted:
+                job = None
+            else:
+                # if no thread has got to it yet it is
+                # quicker to do it than wait
+                job = None
+                for queued in self.queue:
+                    if queued[0] == key:
+                        job = queued
+                        self.queue.remove(queued)
+                        break
+                while job is None and key not in self.results:
+                    if self.closed:
+                        # dropped by close()
+                        job = (key,func,args)
+                    else:
+                        self.cond.wait()
+        finally:
+            self.cond.release()
+
+        if key not in self.submitted:
+            return func(*args)
+        if job is not None:
+            self.runJob(*job)
+        result,error = self.results[key]
+        if error is not None:
+            raise error
+        return result
+
+    def close(self):
+        """
+        Drop the jobs not yet started and wait for the
+        running ones to finish (so they aren't still changing
+        the caches when they are saved at exit)
+        """
+        self.cond.acquire()
+        try:
+            self.closed = True
+            self.queue = []
+            notifyAll(self.cond)
+        finally:
+            self.cond.release()
+        for thread in self.threads:
+            thread.join()
@@ -0,0 +1,57 @@
+"""
+Module that packs a list of records (strings) into a compact
+string that can be kept in an environment variable and unpacks
+it again. Used for the baseline (see envmastersnapshot) and the
+effects of the loaded modules (see envmastereffects).
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import sys
+import zlib
+import binascii
+
+# separates the records. Can't be in an environment variable.
+RECORDSEP = '\0'
+
+def packRecords(records):
+    """
+    Returns the records (a list of strings that don't
+    contain RECORDSEP) compressed and base64 encoded
+    """
+    data = RECORDSEP.join(records).encode('utf-8')
+    encoded = binascii.b2a_base64(zlib.compress(data,9)).strip()
+    if sys.version_info[0] >= 3:
+        encoded = encoded.decode('ascii')
+    return encoded
+
+def unpackRecords(encoded):
+    """
+    Reverses packRecords(). Returns an empty list if
+    encoded is None or can't be understood.
+    """
+    if encoded is None or encoded == '':
+        return []
+    try:
+        if sys.version_info[0] >= 3:
+            encoded = encoded.encode('ascii')
+        data = zlib.decompress(binascii.a2b_base64(encoded)).decode('utf-8')
+    except (ValueError,TypeError,binascii.Error,zlib.error):
+        return []
+    if data == '':
+        return []
+    return data.split(RECORDSEP)
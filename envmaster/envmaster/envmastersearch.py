@@ -0,0 +1,306 @@
+"""
+Module that implements 'envmaster search'. An index of the
+words in the name, version and description of each module
+and the variables and paths it sets (as found by the catalog -
+see envmastercatalog) is kept in the cache directory.
+
+Each word maps to the module files it appears in. To find
+words that contain the search term each group of 3 letters
+('trigram') maps to the words it appears in, so only words that
+have all the trigrams of the term need to be looked at.
+
+Before each search the modules in ENVMASTERPATH are found the
+same way as for 'avail' (EnvMasterFile.iterAvailModules(), which
+uses the root index if there is one) so the two agree, and only
+module files that are new or have changed are indexed again.
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import re
+import sys
+if sys.version_info[0] < 3:
+    # keep compatibility with Python2.4
+    import envmasterconf
+    import envmastercache
+    import envmastercatalog
+    import envmasterloaded
+else:
+    from envmaster import envmasterconf
+    from envmaster import envmastercache
+    from envmaster import envmastercatalog
+    from envmaster import envmasterloaded
+
+# how much a match in each part of the module counts for
+NAMEWEIGHT = 8
+VERSIONWEIGHT = 4
+WHATISWEIGHT = 3
+VARIABLEWEIGHT = 2
+PATHWEIGHT = 1
+
+# and how much for each type of match
+EXACTMATCH = 4
+PREFIXMATCH = 2
+SUBSTRINGMATCH = 1
+
+# the module calls whose first argument is a path
+PATHMETHODS = ('setAll','setPath','setBin','setLib','setMan','setInclude',
+        'setPython','setPkgConfig','setCMake','setVar')
+
+WORDRE = re.compile('[a-z0-9]+')
+
+def splitWords(text):
+    """
+    Returns the (lower case) words in text
+    """
+    return WORDRE.findall(str(text).lower())
+
+def getTrigrams(word):
+    """
+    Returns the groups of 3 letters in word
+    """
+    return [word[n:n+3] for n in range(len(word) - 2)]
+
+def getModuleWords(modname,info):
+    """
+    Returns a dictionary of word -> weight for the module
+    modname from its envmastercatalog.ModuleInfo
+    """
+    words = {}
+    def add(text,weight):
+        for word in splitWords(text):
+            if words.get(word,0) < weight:
+                words[word] = weight
+
+    name,version = envmasterloaded.splitModName(modname)
+    add(name,NAMEWEIGHT)
+    if version is not None:
+        add(version,VERSIONWEIGHT)
+    whatis = info.getWhatIs()
+    if whatis is not None:
+        add(whatis,WHATISWEIGHT)
+    for var in info.getVariables():
+        add(var,VARIABLEWEIGHT)
+    for callname,args,kwargs in info.calls:
+        if callname in PATHMETHODS and len(args) > 0:
+            add(args[0],PATHWEIGHT)
+    return words
+
+class SearchIndex(object):
+    """
+    The index of module files. Use getSearchIndex()
+    rather than creating one of these.
+    """
+    def __init__(self,path):
+        self.path = path
+        # module file path -> (fingerprint,modname,root,words,whatis).
+        # words is word -> weight.
+        self.docs = {}
+        # word -> {module file path : weight}
+        self.postings = {}
+        # trigram -> {word : 1}
+        self.trigrams = {}
+        self.dirty = False
+        if path is not None:
+            data = envmastercache.readCacheFile(path)
+            if data is not None:
+                try:
+                    self.docs,self.postings,self.trigrams = data
+                except (ValueError,TypeError):
+                    pass
+
+    def addDoc(self,path,fp,modname,root,words,whatis):
+        """
+        Adds a module file to the index
+        """
+        self.docs[path] = (fp,modname,root,words,whatis)
+        for word,weight in words.items():
+            postings = self.postings.get(word)
+            if postings is None:
+                postings = self.postings[word] = {}
+                for trigram in getTrigrams(word):
+                    self.trigrams.setdefault(trigram,{})[word] = 1
+            postings[path] = weight
+        self.dirty = True
+
+    def removeDoc(self,path):
+        """
+        Removes a module file from the index
+        """
+        fp,modname,root,words,whatis = self.docs.pop(path)
+        for word in words:
+            postings = self.postings.get(word)
+            if postings is None:
+                continue
+            postings.pop(path,None)
+            if len(postings) == 0:
+                del self.postings[word]
+                for trigram in getTrigrams(word):
+                    trigramwords = self.trigrams.get(trigram)
+                    if trigramwords is not None:
+                        trigramwords.pop(word,None)
+                        if len(trigramwords) == 0:
+                            del self.trigrams[trigram]
+        self.dirty = True
+
+    def indexFile(self,path,fp,modname,root):
+        """
+        (Re)indexes the module file in path which is
+        modname under root
+        """
+        if path in self.docs:
+            self.removeDoc(path)
+        info = envmastercatalog.getModuleInfo(path)
+        words = getModuleWords(modname,info)
+        self.addDoc(path,fp,modname,root,words,info.getWhatIs())
+
+    def update(self,modfile):
+        """
+        Brings the index up to date with the modules 'avail'
+        shows for modfile (an EnvMasterFile)
+        """
+        seen = set()
+        for root,availmodules in modfile.iterAvailModules():
+            for modname,path in availmodules:
+                if modname.endswith('(default)'):
+                    modname = modname[:-len('(default)')]
+                seen.add(path)
+                fp = envmastercache.fingerprint(path)
+                doc = self.docs.get(path)
+                if doc is None or doc[0] != fp or doc[1] != modname or doc[2] != root:
+                    self.indexFile(path,fp,modname,root)
+
+        # remove the ones that have gone
+        for path,doc in list(self.docs.items()):
+            if path not in seen and doc[2] in modfile.modpaths:
+                self.removeDoc(path)
+
+    def findWords(self,term,prefix):
+        """
+        Returns the words in the index that contain term
+        (or start with it if prefix is True)
+        """
+        trigrams = getTrigrams(term)
+        if len(trigrams) == 0:
+            # too short - have to look at them all
+            candidates = self.postings.keys()
+        else:
+            # the words that have all the trigrams in the term
+            candidates = None
+            for trigram in sorted(trigrams,key=lambda t:len(self.trigrams.get(t,()))):
+                trigramwords = self.trigrams.get(trigram)
+                if trigramwords is None:
+                    return []
+                if candidates is None:
+                    candidates = set(trigramwords)
+                else:
+                    candidates.intersection_update(trigramwords)
+                if len(candidates) == 0:
+                    return []
+        if prefix:
+            return [word for word in candidates if word.startswith(term)]
+        return [word for word in candidates if word.find(term) != -1]
+
+    def search(self,query,roots):
+        """
+        Returns a list of (score,modname,root,whatis) for the
+        module files under one of roots that match all the
+        words in query, best match first. Words ending with '*'
+        only match the start of words in the index, otherwise
+        they can match any part.
+        """
+        scores = None
+        for queryword in query.split():
+            prefix = queryword.endswith('*')
+            terms = splitWords(queryword)
+            if len(terms) == 0:
+                continue
+            if prefix:
+                # only the last part of 'netcdf-py*'
+                # needs to be a prefix
+                prefixterms = [terms[-1]]
+                terms = terms[:-1]
+            else:
+                prefixterms = []
+            for term,isprefix in [(t,False) for t in terms] + [(t,True) for t in prefixterms]:
+                termscores = {}
+                for word in self.findWords(term,isprefix):
+                    if word == term:
+                        match = EXACTMATCH
+                    elif word.startswith(term):
+                        match = PREFIXMATCH
+                    else:
+                        match = SUBSTRINGMATCH
+                    for path,weight in self.postings[word].items():
+                        score = weight * match
+                        if termscores.get(path,0) < score:
+                            termscores[path] = score
+                if scores is None:
+                    scores = termscores
+                else:
+                    # has to match all the terms
+                    newscores = {}
+                    for path,score in scores.items():
+                        if path in termscores:
+                            newscores[path] = score + termscores[path]
+                    scores = newscores
+
+        results = []
+        if scores is not None:
+            for path,score in scores.items():
+                fp,modname,root,words,whatis = self.docs[path]
+                if root in roots:
+                    results.append((-score,roots.index(root),modname,whatis))
+        results.sort()
+        return [(-score,modname,roots[rootindex],whatis)
+                    for score,rootindex,modname,whatis in results]
+
+    def save(self):
+        """
+        Writes the index to disk if anything has changed
+        """
+        if not self.dirty or self.path is None:
+            return
+        if len(self.docs) > envmasterconf.CATALOG_MAXENTRIES:
+            # old directories build up over
+            # time. Simplest to start again.
+            self.docs = {}
+            self.postings = {}
+            self.trigrams = {}
+        envmastercache.writeCacheFile(self.path,(self.docs,self.postings,
+                        self.trigrams))
+        self.dirty = False
+
+_searchindex = None
+
+def getSearchIndex():
+    """
+    Returns the shared SearchIndex instance. If caching is
+    turned off (see envmastercache) it isn't saved between runs.
+    """
+    global _searchindex
+    if _searchindex is None:
+        path = None
+        if not envmastercache.cachingDisabled():
+            cachedir = envmastercache.getCacheDir()
+            if cachedir is not None:
+                path = os.path.join(cachedir,envmasterconf.SEARCHINDEXFILE)
+        _searchindex = SearchIndex(path)
+        import atexit
+        atexit.register(_searchindex.save)
+    return _searchindex
@@ -27,15 +27,24 @@ directly. Use the shellFromString() method.
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
-import os
 import sys
 if sys.version_info[0] < 3:
     # keep compatibility with Python2.4
-    import envmasterformat
     import envmasterconf
+    import envmastereffects
+    import envmasterenviron
+    import envmasterloaded
+    import envmasterpath
+    import envmastersnapshot
+    import envmastertrace
 else:
-    from envmaster import envmasterformat
     from envmaster import envmasterconf
+    from envmaster import envmastereffects
+    from envmaster import envmasterenviron
+    from envmaster import envmasterloaded
+    from envmaster import envmasterpath
+    from envmaster import envmastersnapshot
+    from envmaster import envmastertrace
 
 def shellFromString(shellname,loading):
     """
@@ -62,15 +71,97 @@ def shellFromString(shellname,loading):
         shell = RShell(loading)
     elif shellname == "dos":
         shell = DOSShell(loading)
+    elif shellname == "json":
+        shell = JSONShell(loading)
+    elif shellname == "env0":
+        shell = Env0Shell(loading)
     else:
         raise ValueError("Unknown shell %s" % shellname)
 
     return shell
 
+class EnvironJournal(object):
+    """
+    Records the changes shells make to environ (see
+    envmasterenviron, the environment of the current process
+    if None) and to sys.path so they can be undone with
+    restore(). Only the variables that are changed are
+    remembered. Set as the journal attribute of the shell(s).
+    See pyutils.Transaction.
+    """
+    def __init__(self,environ=None):
+        if environ is None:
+            environ = envmasterenviron.PROCESSENVIRON
+        self.environ = environ
+        # var -> value before it was first changed (None if unset)
+        self.values = {}
+        # changes to sys.path in order. Either ('append',entry)
+        # or ('remove',index,entry)
+        self.syspath = []
+
+    def noteVar(self,var):
+        """
+        Called before var is changed
+        """
+        if var not in self.values:
+            self.values[var] = self.environ.get(var)
+
+    def appendSysPath(self,entry):
+        """
+        Appends entry to sys.path
+        """
+        sys.path.append(entry)
+        self.syspath.append(('append',entry))
+
+    def removeSysPath(self,entry):
+        """
+        Removes entry from sys.path if it is there
+        """
+        if entry in sys.path:
+            index = sys.path.index(entry)
+            del sys.path[index]
+            self.syspath.append(('remove',index,entry))
+
+    def restore(self):
+        """
+        Puts back the variables and sys.path as they were
+        and starts again
+        """
+        for var,value in self.values.items():
+            self.environ.set(var,value)
+
+        # undo the changes to sys.path last first
+        entries = set()
+        for change in reversed(self.syspath):
+            if change[0] == 'append':
+                entry = change[1]
+                if entry in sys.path:
+                    # the last one is ours
+                    index = len(sys.path) - 1 - sys.path[::-1].index(entry)
+                    del sys.path[index]
+            else:
+                index,entry = change[1:]
+                sys.path.insert(index,entry)
+            entries.add(entry)
+        if len(entries) > 0:
+            # so the import system doesn't remember
+            # what it found in them
+            for entry in entries:
+                sys.path_importer_cache.pop(entry,None)
+            if sys.version_info[0] >= 3:
+                import importlib
+                importlib.invalidate_caches()
+
+        self.values = {}
+        self.syspath = []
+
 class BaseShell(object):
     """
     The base class that all shells derive from.
     """
+    # written after each command by flush()
+    CMDTERMINATOR = '\n'
+
     def __init__(self,loading):
         """
         The constructor. Derived class should call this.
@@ -89,58 +180,180 @@ class BaseShell(object):
         # file needs it so we cache what needs
         # to be deleted and do it at flush()
         self.unset = []
+        # path variables are kept as envmasterpath.PathList
+        # objects until syncEnviron() is called 
+        self.pathlists = {}
+        # names of the path variables changed since
+        # syncEnviron() was last called
+        self.changedpaths = set()
+        # which modules added the entries in the path variables
+        # read from the environment when first needed
+        self.pathrefs = None
+        # the envmasterloaded.ModuleFingerprints and the
+        # envmastereffects.ModuleEffects of the loaded
+        # modules. Also read when first needed
+        self.fingerprints = None
+        self.effects = None
+        # full name of the module being run. Set 
+        # by EnvMasterEnv.execute()
+        self.currentmod = None
+        # values of the variables before EnvMaster
+        # first changed them. See getBaseline()
+        self.baseline = None
+        # set to a set() to collect the paths of the files and
+        # directories the commands depend on (module files etc)
+        # See envmastercollection
+        self.depends = None
+        # set to an EnvironJournal to record the changes
+        # made to the environment of the current process
+        self.journal = None
+        # the envmasterplan.LoadPlanner for the modules being
+        # loaded. Set by EnvMasterFile.runModule()
+        self.planner = None
+        # the environment the variables are read from and
+        # changed in. Set to an envmasterenviron.DictEnviron
+        # to leave the environment of the current process alone
+        self.environ = envmasterenviron.PROCESSENVIRON
         
+    def setEnviron(self,var,value):
+        """
+        Sets var in self.environ, or removes it if value is
+        None. All changes should go through here so they are
+        recorded in self.journal.
+        """
+        if self.journal is not None:
+            self.journal.noteVar(var)
+        self.environ.set(var,value)
+
     def addCmd(self,cmd,var):
         """
         Adds a command to the buffer of commands to be
-        given to the shell. Derived class should call 
-        this for each command they add.
+        given to the shell. 
         """
-        self.cmds[var] = cmd
+        if cmd is not None:
+            self.cmds[var] = cmd
+
+    def varCmd(self,value,var):
+        """
+        Returns the command that sets var to value. Derived
+        classes implement this for their shell. Returns None
+        if no command is needed.
+        """
+        return None
+
+    def unsetCmd(self,var):
+        """
+        Returns the command that unsets var. Derived
+        classes implement this for their shell. Returns None
+        if no command is needed.
+        """
+        return None
+
+    def pathCmd(self,fullpath,var):
+        """
+        Returns the command that sets the path variable
+        var to fullpath. Same as varCmd() unless reimplemented.
+        """
+        return self.varCmd(fullpath,var)
         
-    def findFullPath(self,path,var):
+    def getPathList(self,var):
+        """
+        Returns the envmasterpath.PathList for var, reading
+        it from the environment the first time.
+        """
+        pathlist = self.pathlists.get(var)
+        if pathlist is None:
+            pathlist = envmasterpath.PathList(self.environ.get(var))
+            self.pathlists[var] = pathlist
+        return pathlist
+
+    def getPathRefs(self):
         """
-        Derived classes should call this in their setPath()
-        methods. This finds what the full value of the path
-        variable should be - ie with the existing paths intact
-        and the new one added or removed.
+        Returns the envmasterpath.PathRefs recording which 
+        modules added the entries in the path variables.
         """
-        fullpath = None
+        if self.pathrefs is None:
+            value = self.environ.get(envmasterconf.PATHREFSENV)
+            self.pathrefs = envmasterpath.PathRefs(value)
+        return self.pathrefs
+
+    def getFingerprints(self):
+        """
+        Returns the envmasterloaded.ModuleFingerprints
+        of the loaded modules
+        """
+        if self.fingerprints is None:
+            value = self.environ.get(envmasterconf.FINGERPRINTSENV)
+            self.fingerprints = envmasterloaded.ModuleFingerprints(value)
+        return self.fingerprints
+
+    def getEffects(self):
+        """
+        Returns the envmastereffects.ModuleEffects
+        of the loaded modules
+        """
+        if self.effects is None:
+            value = self.environ.get(envmasterconf.EFFECTSENV)
+            self.effects = envmastereffects.ModuleEffects(value)
+        return self.effects
+
+    def getBaseline(self):
+        """
+        Returns the envmastersnapshot.Baseline with the 
+        values the variables had before EnvMaster changed them.
+        """
+        if self.baseline is None:
+            value = self.environ.get(envmasterconf.BASELINEENV)
+            self.baseline = envmastersnapshot.Baseline(value)
+        return self.baseline
+
+    def updatePath(self,path,var):
+        """
+        Adds path to (or removes it from) the path variable var
+        depending on whether we are loading. The entry is only
+        removed if no other loaded module has also added it.
+        Derived classes should call this (via the base class
+        setPath()) rather than changing the variable themselves.
+        Returns the PathList for var.
+        """
+        self.getBaseline().note(var,self.environ)
+        pathlist = self.getPathList(var)
+        # the list of loaded modules is looked after
+        # by envmasterloaded, not reference counted
+        owner = None
+        if var != envmasterconf.LOADEDMODULESENV:
+            owner = self.currentmod
 
         if self.loading:
-            oldval = os.getenv(var)
-            if oldval is None or oldval == '':
-                # first value to be added to this path var
-                fullpath = path
-            else:
-                # prepend this path to the existing.
-                arr = oldval.split(os.pathsep)
-                arr.insert(0,path)
-                fullpath = os.pathsep.join(arr)
-            
+            if owner is not None:
+                self.getPathRefs().addOwner(var,path,owner,path in pathlist)
+            pathlist.prepend(path)
         else:
-            # unloading
-            oldval = os.getenv(var)
-            if oldval is not None or oldval != '':
-                # remove this path from the path var
-                arr = oldval.split(os.pathsep)
-                try:
-                    arr.remove(path)
-                except ValueError:
-                    # shouldn't happen but if it does
-                    # just ignore
-                    pass
-                fullpath = os.pathsep.join(arr)
+            needed = False
+            if owner is not None:
+                needed = self.getPathRefs().removeOwner(var,path,owner)
+            if not needed:
+                pathlist.remove(path)
+        self.changedpaths.add(var)
+
+        if var == envmasterconf.LOADEDMODULESENV:
+            # needed straight away to see what is loaded.
+            # keep the parsed list of loaded modules up to date
+            # rather than making it parse the variable again
+            fullpath = pathlist.getValue()
+            loadedmodules = envmasterloaded.getLoadedModules(self.environ)
+            if self.loading:
+                loadedmodules.added(path,fullpath)
             else:
-                # hadn't been set. Weird?
-                fullpath = ''
-        return fullpath
+                loadedmodules.removed(path,fullpath)
+            self.setEnviron(var,fullpath)
+        return pathlist
         
     def setVar(self,value,var):
         """
-        Base class implementation. Just updates the
-        environment for the current Python process
-        ie not communicated with the shell.
+        Base class implementation. Updates self.environ
+        (normally the current Python process) and adds the command
+        returned by varCmd() or unsetCmd().
         We do this so that:
         1) os.expandvars works as expected for
             any other operations we do
@@ -148,40 +361,133 @@ class BaseShell(object):
             for this var behave as expected
         All derived implementations should call this.
         """
+        self.getBaseline().note(var,self.environ)
         if self.loading:
-            os.environ[var] = value
-        elif var in os.environ:
-            # don't delete just yet in case we need it
-            self.unset.append(var)
+            self.setEnviron(var,value)
+            if var in self.unset:
+                # unset by a module unloaded earlier in
+                # the same batch (see setLoading())
+                self.unset.remove(var)
+            self.addCmd(self.varCmd(value,var),var)
+        else:
+            self.addCmd(self.unsetCmd(var),var)
+            if self.environ.get(var) is not None:
+                # don't delete just yet in case we need it
+                self.unset.append(var)
 
-    def setPath(self,fullpath,var):
+    def setPath(self,path,var):
         """
-        Base class implementation. Just updates the
-        environment for the current Python process
-        ie not communicated with the shell.
-        We do this so that:
-        1) findFullPath() behaves properly for any
-            other modules being loaded as preserves
-            the path just added.
+        Base class implementation. Prepends path onto (or
+        removes it from) the path variable var. self.environ
+        and the command for the
+        shell are updated by syncEnviron().
         All derived implementations should call this.
         """
-        os.environ[var] = fullpath
-    
+        self.updatePath(path,var)
+
+    def syncEnviron(self):
+        """
+        Copies the values of the path variables that have been
+        changed into self.environ and adds the commands
+        for them. Called after each
+        module has been run so other modules see the changes,
+        and at flush().
+        """
+        for var in self.changedpaths:
+            fullpath = self.pathlists[var].getValue()
+            self.setEnviron(var,fullpath)
+            self.addCmd(self.pathCmd(fullpath,var),var)
+        self.changedpaths = set()
+
+        self.syncRecord(self.pathrefs,envmasterconf.PATHREFSENV)
+        self.syncRecord(self.fingerprints,envmasterconf.FINGERPRINTSENV)
+        self.syncRecord(self.effects,envmasterconf.EFFECTSENV)
+
+        baseline = self.baseline
+        if baseline is not None and baseline.changed:
+            var = envmasterconf.BASELINEENV
+            value = baseline.getValue()
+            self.setEnviron(var,value)
+            self.addCmd(self.varCmd(value,var),var)
+            baseline.changed = False
+
+    def syncRecord(self,record,var):
+        """
+        Copies one of the records EnvMaster keeps about the
+        loaded modules (ie self.pathrefs) into var if it has
+        changed. record is None if it hasn't been read.
+        """
+        if record is None or not record.changed:
+            return
+        self.getBaseline().note(var,self.environ)
+        value = record.getValue()
+        if value != '':
+            self.setEnviron(var,value)
+            self.addCmd(self.varCmd(value,var),var)
+        elif self.environ.get(var) is not None:
+            self.setEnviron(var,None)
+            self.addCmd(self.unsetCmd(var),var)
+        record.changed = False
+
+    def restoreVar(self,value,var):
+        """
+        Sets var back to value (or unsets it if value is
+        None) whether we are loading or not. Used to put back
+        the baseline or a snapshot (see envmastersnapshot).
+        """
+        self.getBaseline().note(var,self.environ)
+        # forget anything we have done to it
+        self.pathlists.pop(var,None)
+        self.changedpaths.discard(var)
+        if var in self.unset:
+            self.unset.remove(var)
+        if var == envmasterconf.PATHREFSENV:
+            self.pathrefs = None
+        elif var == envmasterconf.FINGERPRINTSENV:
+            self.fingerprints = None
+        elif var == envmasterconf.EFFECTSENV:
+            self.effects = None
+
+        self.setEnviron(var,value)
+        if value is None:
+            self.addCmd(self.unsetCmd(var),var)
+        else:
+            self.addCmd(self.varCmd(value,var),var)
+
+    def setLoading(self,loading):
+        """
+        Switch between loading and unloading modules. Used
+        when a number of operations are batched into one shell
+        (see EnvMasterFile.startBatch()). Anything unset so far is
+        removed from the environment now so modules run after
+        this behave as if the earlier ones had been flushed.
+        """
+        self.removeUnset()
+        self.loading = loading
+
+    def removeUnset(self):
+        """
+        Remove the variables that have been unset from
+        self.environ.
+        """
+        for var in self.unset:
+            self.setEnviron(var,None)
+        self.unset = []
+
+    @envmastertrace.traced('flush')
     def flush(self):
         """
         Writes the buffered commands out to the shell.
         Derived classes reimplement if they need to 
         do something different.
         """
+        self.syncEnviron()
         for var in sorted(self.cmds.keys()):
-            envmasterconf.STDOUT.write(self.cmds[var] + '\n')
+            envmasterconf.STDOUT.write(self.cmds[var] + self.CMDTERMINATOR)
         self.cmds = {}
 
         # unset any environment variables
-        for var in self.unset:
-            if var in os.environ:
-                del os.environ[var]
-        self.unset = []
+        self.removeUnset()
 
 class DisplayShell(BaseShell):
     """
@@ -222,7 +528,7 @@ class DisplayShell(BaseShell):
         self.cmdtable.append(var)
         self.cmdtable.append(value)
         # we don't call the base class as we don't
-        # call findFullPath. Not sure this is correct...
+        # change the path. Not sure this is correct...
         
     def setPrereq(self,modnames):
         """
@@ -265,12 +571,19 @@ class DisplayShell(BaseShell):
         self.cmdtable.append('swap')
         self.cmdtable.append('')
         self.cmdtable.append(mod1 + ' ' + mod2)
-        
+
+    @envmastertrace.traced('flush')
     def flush(self):
         """
         Reimplementation of base class method to
         format our table using envmasterformat.displayTable()
         """
+        # only needed for display so not imported
+        # at the top to keep start up fast
+        if sys.version_info[0] < 3:
+            import envmasterformat
+        else:
+            from envmaster import envmasterformat
         format = envmasterformat.EnvMasterFormat()
         # if we got given a modname display it
         if self.modname is not None:
@@ -286,25 +599,19 @@ class BashShell(BaseShell):
     def __init__(self,loading):
         super(BashShell,self).__init__(loading)
     
-    def setVar(self,value,var):
+    def varCmd(self,value,var):
         """
         Creates commands in bash format for 
-        setting/unsetting variables.        
+        setting variables.        
         """
-        if self.loading:
-            self.addCmd('%s="%s" ;export %s;' % (var,value,var),var)
-        else:
-            self.addCmd('unset %s; ' % (var),var)
-        super(BashShell,self).setVar(value,var)
+        return '%s="%s" ;export %s;' % (var,value,var)
 
-    def setPath(self,value,var):
+    def unsetCmd(self,var):
         """
-        Creates command in bash format for setting
-        the new path
+        Creates commands in bash format for 
+        unsetting variables.        
         """
-        fullpath = self.findFullPath(value,var)
-        self.addCmd('%s="%s" ;export %s;' % (var,fullpath,var),var)
-        super(BashShell,self).setPath(fullpath,var)
+        return 'unset %s; ' % (var)
 
 class CShell(BaseShell):
     """
@@ -313,25 +620,19 @@ class CShell(BaseShell):
     def __init__(self,loading):
         super(CShell,self).__init__(loading)
     
-    def setVar(self,value,var):
+    def varCmd(self,value,var):
         """
         Creates commands in csh format for 
-        setting/unsetting variables.        
+        setting variables.        
         """
-        if self.loading:
-            self.addCmd('setenv %s "%s"; ' % (var,value),var)
-        else:
-            self.addCmd('unsetenv %s; ' % (var),var)
-        super(CShell,self).setVar(value,var)
+        return 'setenv %s "%s"; ' % (var,value)
 
-    def setPath(self,value,var):
+    def unsetCmd(self,var):
         """
-        Creates command in csh format for setting
-        the new path
+        Creates commands in csh format for 
+        unsetting variables.        
         """
-        fullpath = self.findFullPath(value,var)
-        self.addCmd('setenv %s "%s"; ' % (var,fullpath),var)
-        super(CShell,self).setPath(fullpath,var)
+        return 'unsetenv %s; ' % (var)
 
 class DOSShell(BaseShell):
     """
@@ -340,55 +641,124 @@ class DOSShell(BaseShell):
     def __init__(self,loading):
         super(DOSShell,self).__init__(loading)
     
-    def setVar(self,value,var):
+    def varCmd(self,value,var):
         """
         Creates commands in DOS format for 
-        setting/unsetting variables.        
+        setting variables.        
         """
-        if self.loading:
-            self.addCmd('set "%s=%s"\n' % (var,value),var)
-        else:
-            self.addCmd('set %s=\n' % (var),var)
-        super(DOSShell,self).setVar(value,var)
+        return 'set "%s=%s"\n' % (var,value)
 
-    def setPath(self,value,var):
+    def unsetCmd(self,var):
         """
-        Creates command in DOS format for setting
-        the new path
+        Creates commands in DOS format for 
+        unsetting variables.        
         """
-        fullpath = self.findFullPath(value,var)
-        self.addCmd('set "%s=%s"\n' % (var,fullpath),var)
-        super(DOSShell,self).setPath(fullpath,var)
+        return 'set %s=\n' % (var)
 
 class PythonShell(BaseShell):
     """
     Derived class to support Python.
     Actually one wouldn't use this to load a module
     since it wouild be better to have the vars set in
-    the current Python process. Use BlankShell()
+    the current Python process. Use pyutils
+    (the 'pythonsilent' shell).
     """
     def __init__(self,loading):
         super(PythonShell,self).__init__(loading)
     
-    def setVar(self,value,var):
+    def varCmd(self,value,var):
         """
         Creates commands in Python format for 
-        setting/unsetting variables.        
+        setting variables.        
         """
-        if self.loading:
-            self.addCmd("os.environ['%s'] = '%s')\n" % (var,value),var)
-        else:
-            self.addCmd("os.unsetenv('%s')\n" % (var),var)
-        super(PythonShell,self).setVar(value,var)
+        return "os.environ[%r] = %r" % (var,value)
 
-    def setPath(self,value,var):
+    def unsetCmd(self,var):
+        """
+        Creates commands in Python format for 
+        unsetting variables.        
+        """
+        return "os.environ.pop(%r, None)" % (var)
+
+class RecordShell(BaseShell):
+    """
+    Base class for the shells whose output is read by
+    other programs rather than evaluated by a shell. 'list'
+    and 'avail' write a record for each module with these
+    (see EnvMasterFile.listModules()).
+    """
+    def writeModule(self,info):
+        """
+        Writes the record for a module. info is a dictionary
+        which always has 'name' (the full module name). This
+        just writes the name followed by CMDTERMINATOR. Derived
+        classes reimplement if they need the other fields.
+        """
+        envmasterconf.STDOUT.write(info['name'] + self.CMDTERMINATOR)
+
+    def addCmd(self,cmd,var):
+        """
+        Leaves out EnvMaster's own records (see
+        envmasterconf.RECORDVARS)
         """
-        Creates command in Python format for setting
-        the new path
+        if var not in envmasterconf.RECORDVARS:
+            super(RecordShell,self).addCmd(cmd,var)
+
+class JSONShell(RecordShell):
+    """
+    Writes a line of JSON for each variable with
+    its final value, ie {"op": "set", "var": "PATH",
+    "value": "..."} or {"op": "unset", "var": "X"}
+    """
+    def __init__(self,loading):
+        super(JSONShell,self).__init__(loading)
+        # only needed for this shell so not imported
+        # at the top to keep start up fast
+        import json
+        self.json = json
+
+    def varCmd(self,value,var):
+        """
+        Creates the record for setting variables
+        """
+        return self.json.dumps({'op' : 'set','var' : var,'value' : value},sort_keys=True)
+
+    def unsetCmd(self,var):
+        """
+        Creates the record for unsetting variables
+        """
+        return self.json.dumps({'op' : 'unset','var' : var},sort_keys=True)
+
+    def writeModule(self,info):
+        """
+        Writes info as a line of JSON
+        """
+        envmasterconf.STDOUT.write(self.json.dumps(info,sort_keys=True) + '\n')
+
+class Env0Shell(RecordShell):
+    """
+    Writes var=value for each variable set and just var
+    for each one unset, each followed by a NUL character
+    (like 'env -0'). As variable names can't contain '='
+    or NUL and values can't contain NUL there is
+    nothing to escape.
+    """
+    CMDTERMINATOR = '\0'
+
+    def __init__(self,loading):
+        super(Env0Shell,self).__init__(loading)
+
+    def varCmd(self,value,var):
+        """
+        Creates the record for setting variables
         """
-        fullpath = self.findFullPath(value,var)
-        self.addCmd("os.setenv('%s','%s')\n" % (var,fullpath),var)
-        super(BashShell,self).setPath(fullpath,var)
+        return '%s=%s' % (var,value)
+
+    def unsetCmd(self,var):
+        """
+        Creates the record for unsetting variables
+        """
+        return var
 
 class PythonSilentShell(BaseShell):
     """
@@ -396,37 +766,57 @@ class PythonSilentShell(BaseShell):
     current Python process. Just uses the base classes
     implementation of setVar and setPath that just 
     sets the variables into the current environment.
+    sys.path is only changed when self.environ is the
+    environment of the current process.
     """
     def __init__(self,loading):
         super(PythonSilentShell,self).__init__(loading)
         
     def setPath(self,value,var):
-        if var == envmasterconf.PYPATH:
+        pathlist = self.updatePath(value,var)
+        if (var == envmasterconf.PYPATH and
+                self.environ is envmasterenviron.PROCESSENVIRON):
             # if it is the PYTHONPATH
             # it's not going to do much good changing the 
             # environment since sys.path already populated
             # when python starts. Better to update sys.path
+            journal = self.journal
+            if journal is None:
+                # not recording
+                journal = EnvironJournal()
             if self.loading:
-                sys.path.append(value)
-            else:
-                try:
-                    sys.path.remove(value)
-                except ValueError:
-                    pass
-        fullpath = self.findFullPath(value,var)
-        super(PythonSilentShell,self).setPath(fullpath,var)
+                journal.appendSysPath(value)
+            elif value not in pathlist:
+                # no other module needs it
+                journal.removeSysPath(value)
+
+    def restoreVar(self,value,var):
+        if (var == envmasterconf.PYPATH and
+                self.environ is envmasterenviron.PROCESSENVIRON):
+            # as for setPath() remove the entries
+            # that are going from sys.path
+            oldentries = envmasterpath.PathList(self.environ.get(var))
+            newentries = envmasterpath.PathList(value)
+            journal = self.journal
+            if journal is None:
+                # not recording
+                journal = EnvironJournal()
+            for entry in oldentries.entries:
+                if entry not in newentries:
+                    journal.removeSysPath(entry)
+        super(PythonSilentShell,self).restoreVar(value,var)
     
+    @envmastertrace.traced('flush')
     def flush(self):
         """
-        Do nothing as we should have already changed the 
+        Nothing to write out as we have changed the 
         environment of the current (Python) process.
-        Just unset anything that needs to be unset
+        Just make sure it is up to date and unset anything
+        that needs to be unset
         """
-        # unset any environment variables
-        for var in self.unset:
-            if var in os.environ:
-                del os.environ[var]
-        self.unset = []
+        self.syncEnviron()
+        self.cmds = {}
+        self.removeUnset()
 
 class RShell(BaseShell):
     """
@@ -435,22 +825,16 @@ class RShell(BaseShell):
     def __init__(self,loading):
         super(RShell,self).__init__(loading)
     
-    def setVar(self,value,var):
+    def varCmd(self,value,var):
         """
         Creates commands in R format for 
-        setting/unsetting variables.        
+        setting variables.        
         """
-        if self.loading:
-            self.addCmd('Sys.setenv(%s="%s")' % (var,value),var)
-        else:
-            self.addCmd('Sys.unsetenv("%s")' % (var),var)
-        super(RShell,self).setVar(value,var)
+        return 'Sys.setenv(%s="%s")' % (var,value)
 
-    def setPath(self,value,var):
+    def unsetCmd(self,var):
         """
-        Creates command in R format for setting
-        the new path
+        Creates commands in R format for 
+        unsetting variables.        
         """
-        fullpath = self.findFullPath(value,var)
-        self.addCmd('Sys.setenv(%s="%s")' % (var,fullpath),var)
-        super(RShell,self).setPath(fullpath,var)
+        return 'Sys.unsetenv("%s")' % (var)
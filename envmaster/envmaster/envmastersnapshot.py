@@ -0,0 +1,141 @@
+"""
+Module that keeps track of the values environment variables
+had before EnvMaster changed them (the 'baseline') so they
+can all be put back at once with 'envmaster purge' without
+running any module files. Also saves and restores named
+snapshots of the variables EnvMaster has changed.
+
+The baseline is kept in the environment variable named in
+envmasterconf.BASELINEENV. A variable is added the first
+time EnvMaster changes it. Snapshots are kept in files in
+envmasterconf.SNAPSHOTDIR.
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+if sys.version_info[0] < 3:
+    # keep compatibility with Python2.4
+    import envmasterconf
+    import envmasterexceptions
+    import envmasterrecord
+else:
+    from envmaster import envmasterconf
+    from envmaster import envmasterexceptions
+    from envmaster import envmasterrecord
+
+def encodeValues(values):
+    """
+    Turns a dictionary of variable name -> value (None if
+    the variable wasn't set) into a compact string that can
+    be kept in an environment variable.
+    """
+    records = []
+    for var in sorted(values.keys()):
+        value = values[var]
+        if value is None:
+            records.append(var)
+        else:
+            records.append(var + '=' + value)
+    return envmasterrecord.packRecords(records)
+
+def decodeValues(encoded):
+    """
+    Reverses encodeValues(). Returns an empty dictionary
+    if encoded is None or can't be understood.
+    """
+    values = {}
+    for record in envmasterrecord.unpackRecords(encoded):
+        if record.find('=') != -1:
+            var,value = record.split('=',1)
+        else:
+            var = record
+            value = None
+        values[var] = value
+    return values
+
+class Baseline(object):
+    """
+    The values variables had before EnvMaster first
+    changed them.
+    """
+    def __init__(self,encoded):
+        self.values = decodeValues(encoded)
+        self.changed = False
+
+    def note(self,var,environ):
+        """
+        Called before var is changed. Remembers its current
+        value in environ (see envmasterenviron) if this is
+        the first time.
+        """
+        if var not in self.values and var != envmasterconf.BASELINEENV:
+            self.values[var] = environ.get(var)
+            self.changed = True
+
+    def getValue(self):
+        """
+        Returns the value for the environment variable
+        """
+        return encodeValues(self.values)
+
+def getSnapshotPath(name):
+    """
+    Returns the path of the file for the named snapshot
+    """
+    if name == '' or name.startswith('.') or name.find(os.sep) != -1:
+        msg = "Invalid snapshot name '%s'" % name
+        raise envmasterexceptions.EnvMasterSnapshotError(msg)
+    return os.path.join(envmasterconf.SNAPSHOTDIR,name)
+
+def saveSnapshot(name,values):
+    """
+    Saves a dictionary of variable name -> value (None
+    if not set) as the named snapshot.
+    """
+    path = getSnapshotPath(name)
+    tmppath = '%s.%d.tmp' % (path,os.getpid())
+    try:
+        if not os.path.isdir(envmasterconf.SNAPSHOTDIR):
+            os.makedirs(envmasterconf.SNAPSHOTDIR,0o700)
+        fileobj = open(tmppath,'w')
+        try:
+            fileobj.write(encodeValues(values) + '\n')
+        finally:
+            fileobj.close()
+        # so restoring at the same time never sees half of it
+        os.rename(tmppath,path)
+    except (IOError,OSError):
+        msg = "Unable to save snapshot '%s': %s" % (name,sys.exc_info()[1])
+        raise envmasterexceptions.EnvMasterSnapshotError(msg)
+
+def loadSnapshot(name):
+    """
+    Returns the dictionary saved as the named snapshot
+    """
+    path = getSnapshotPath(name)
+    try:
+        fileobj = open(path)
+        try:
+            encoded = fileobj.read().strip()
+        finally:
+            fileobj.close()
+    except (IOError,OSError):
+        msg = "Unable to read snapshot '%s'" % name
+        raise envmasterexceptions.EnvMasterSnapshotError(msg)
+    return decodeValues(encoded)
@@ -0,0 +1,239 @@
+"""
+Module that traces where the time goes in an EnvMaster command.
+Turned on by setting the environment variable named in
+envmasterconf.TRACEENV to 'stderr' (or '1') or the name of a
+file to append to.
+
+Functions to trace are marked with the traced() decorator.
+For each call a line of JSON is written with the phase, what
+it was working on (ie the module name), the wall clock time
+taken and the number of file system calls made. A summary table
+is written at exit (as a JSON line if tracing to a file).
+
+When tracing is off traced() returns the function unchanged
+so there is no cost.
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+import time
+if sys.version_info[0] < 3:
+    # keep compatibility with Python2.4
+    import envmasterconf
+else:
+    from envmaster import envmasterconf
+
+# the functions in the os module whose calls are counted
+OSFUNCTIONS = ('stat','lstat','listdir','scandir','access','open')
+
+# number of modules shown in the summary
+SUMMARY_MODULES = 10
+
+class Tracer(object):
+    """
+    Collects the trace records and writes them out.
+    dest is 'stderr' or the path of a file.
+    """
+    def __init__(self,dest):
+        import threading
+        import json
+        self.json = json
+        self.dest = dest
+        self.fileobj = None
+        if dest != 'stderr':
+            try:
+                self.fileobj = open(dest,'a')
+            except IOError:
+                # trace to stderr instead
+                self.dest = 'stderr'
+        self.lock = threading.Lock()
+        # per thread depth of nested phases
+        self.local = threading.local()
+        self.starttime = time.time()
+        # name -> number of calls
+        self.calls = {}
+        # phase -> [number,wall,file system calls]
+        self.phases = {}
+        # module name -> [wall,file system calls]
+        self.modules = {}
+        self.countCalls()
+
+    def countCalls(self):
+        """
+        Replace the file system functions in the os
+        module with ones that count the calls made
+        """
+        calls = self.calls
+        def wrap(name,func):
+            def counted(*args,**kwargs):
+                calls[name] = calls.get(name,0) + 1
+                return func(*args,**kwargs)
+            return counted
+        for name in OSFUNCTIONS:
+            func = getattr(os,name,None)
+            if func is not None:
+                calls[name] = 0
+                setattr(os,name,wrap(name,func))
+        # module files are read with the builtin open()
+        if sys.version_info[0] < 3:
+            import __builtin__ as builtins
+        else:
+            import builtins
+        calls['builtins.open'] = 0
+        builtins.open = wrap('builtins.open',builtins.open)
+
+    def write(self,record):
+        """
+        Writes a record as a line of JSON
+        """
+        line = self.json.dumps(record,sort_keys=True) + '\n'
+        if self.fileobj is not None:
+            self.fileobj.write(line)
+        else:
+            envmasterconf.STDERR.write(line)
+
+    def begin(self):
+        """
+        Called at the start of a traced function. Returns
+        what end() needs.
+        """
+        depth = getattr(self.local,'depth',0)
+        self.local.depth = depth + 1
+        return (time.time(),dict(self.calls),depth)
+
+    def end(self,phase,detail,token):
+        """
+        Called at the end of a traced function with
+        what begin() returned. The counts of file system
+        calls are for the whole process so will include calls
+        made by other threads at the same time (ie avail).
+        """
+        start,startcalls,depth = token
+        wall = time.time() - start
+        self.local.depth = depth
+        calls = {}
+        total = 0
+        for name,count in self.calls.items():
+            count -= startcalls.get(name,0)
+            if count > 0:
+                calls[name] = count
+                total += count
+
+        self.lock.acquire()
+        try:
+            self.write({'phase' : phase,'detail' : detail,'depth' : depth,
+                    'start' : start - self.starttime,'wall' : wall,
+                    'calls' : calls,'pid' : os.getpid()})
+            info = self.phases.setdefault(phase,[0,0.0,0])
+            info[0] += 1
+            # only count the outermost so time isn't
+            # counted twice for recursive phases
+            if not getattr(self.local,'inphase',{}).get(phase):
+                info[1] += wall
+                info[2] += total
+            if phase == 'execute':
+                modinfo = self.modules.setdefault(detail,[0.0,0])
+                modinfo[0] += wall
+                modinfo[1] += total
+        finally:
+            self.lock.release()
+
+    def summary(self):
+        """
+        Writes the summary at the end of the run
+        """
+        total = time.time() - self.starttime
+        if self.fileobj is not None:
+            self.write({'summary' : {'wall' : total,'calls' : self.calls,
+                        'phases' : self.phases,'modules' : self.modules}})
+            self.fileobj.close()
+            self.fileobj = None
+            return
+
+        out = envmasterconf.STDERR
+        out.write('EnvMaster trace: %.1fms total, %d file system calls\n' %
+                    (total * 1000,sum(self.calls.values())))
+        out.write('%-12s %6s %10s %8s\n' % ('phase','count','ms','calls'))
+        phases = sorted(self.phases.items(),key=lambda item:item[1][1],reverse=True)
+        for phase,(count,wall,calls) in phases:
+            out.write('%-12s %6d %10.1f %8d\n' % (phase,count,wall * 1000,calls))
+        if len(self.modules) > 0:
+            out.write('%-34s %10s %8s\n' % ('module (incl. modules it loads)','ms','calls'))
+            modules = sorted(self.modules.items(),key=lambda item:item[1][0],reverse=True)
+            for modname,(wall,calls) in modules[:SUMMARY_MODULES]:
+                out.write('%-34s %10.1f %8d\n' % (modname,wall * 1000,calls))
+
+_tracer = None
+
+def getTracer():
+    """
+    Returns the Tracer instance or None if tracing is off
+    """
+    return _tracer
+
+def traced(phase,detail=None):
+    """
+    Decorator that traces calls to a function as phase.
+    detail is either the index of the argument that says what
+    the function is working on or a function that is passed the
+    arguments and returns it.
+    """
+    def decorate(func):
+        tracer = _tracer
+        if tracer is None:
+            # tracing is off
+            return func
+        def tracedfunc(*args,**kwargs):
+            if detail is None:
+                what = None
+            elif isinstance(detail,int):
+                what = str(args[detail])
+            else:
+                what = str(detail(*args))
+            token = tracer.begin()
+            inphase = getattr(tracer.local,'inphase',None)
+            if inphase is None:
+                inphase = tracer.local.inphase = {}
+            outer = inphase.get(phase,False)
+            inphase[phase] = True
+            try:
+                return func(*args,**kwargs)
+            finally:
+                inphase[phase] = outer
+                tracer.end(phase,what,token)
+        tracedfunc.__name__ = func.__name__
+        tracedfunc.__doc__ = func.__doc__
+        return tracedfunc
+    return decorate
+
+def _setup():
+    """
+    Turn tracing on if asked to
+    """
+    global _tracer
+    dest = os.getenv(envmasterconf.TRACEENV)
+    if dest is None or dest == '' or dest == '0':
+        return
+    if dest == '1':
+        dest = 'stderr'
+    _tracer = Tracer(dest)
+    import atexit
+    atexit.register(_tracer.summary)
+
+_setup()
@@ -0,0 +1,212 @@
+"""
+Module for comparing module versions and matching them
+against version specifications.
+
+Versions are compared 'naturally': they are split into runs of
+digits (compared as numbers) and letters (compared as strings)
+with '.', '-' etc just separating them. So 9.0 < 10.1 and
+1.0rc1 < 1.0 < 1.0.1.
+
+A specification is given in place of the version in a module
+name and is one of:
+    >=9 >9 <=9 <9 ==9   compared naturally with the version
+    12.*                shell style wildcards (see fnmatch)
+Anything else is a plain version that has to match exactly.
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import re
+import bisect
+import fnmatch
+
+# comparison operators allowed at the start of a
+# specification. Longest first so '>=' isn't taken as '>'.
+OPERATORS = ('>=','<=','==','>','<')
+
+# characters that make a specification a wildcard match
+WILDCARDS = '*?['
+
+# splits a version into runs of digits and letters
+TOKENRE = re.compile(r'(\d+|[^\W\d_]+)')
+
+# token kinds. Letters sort before the end of the version
+# (so 1.0rc1 < 1.0) which sorts before more numbers (1.0 < 1.0.1)
+LETTERS = 0
+END = 1
+NUMBER = 2
+
+def versionTokens(version):
+    """
+    Returns the tokens of version (without the end marker)
+    as a list of (kind,number,string) tuples
+    """
+    tokens = []
+    for token in TOKENRE.findall(version):
+        if token.isdigit():
+            tokens.append((NUMBER,int(token),''))
+        else:
+            tokens.append((LETTERS,0,token))
+    return tokens
+
+def versionKey(version):
+    """
+    Returns the key to sort version by
+    """
+    tokens = versionTokens(version)
+    tokens.append((END,0,''))
+    return tuple(tokens)
+
+def compareVersions(version1,version2):
+    """
+    Returns -1, 0 or 1 as version1 is lower than,
+    the same as or higher than version2
+    """
+    key1 = versionKey(version1)
+    key2 = versionKey(version2)
+    return (key1 > key2) - (key1 < key2)
+
+def isSpec(version):
+    """
+    Returns True if version is a specification
+    rather than a plain version
+    """
+    if version is None:
+        return False
+    for op in OPERATORS:
+        if version.startswith(op):
+            return True
+    for char in WILDCARDS:
+        if char in version:
+            return True
+    return False
+
+def splitSpec(spec):
+    """
+    Returns (operator,version) for a specification. The
+    operator is one of OPERATORS, '' for a plain version
+    or None for a wildcard match.
+    """
+    for op in OPERATORS:
+        if spec.startswith(op):
+            return op,spec[len(op):].strip()
+    for char in WILDCARDS:
+        if char in spec:
+            return None,spec
+    return '',spec
+
+def matchVersion(spec,version):
+    """
+    Returns True if version satisfies spec
+    """
+    if version is None:
+        return False
+    op,specver = splitSpec(spec)
+    if op == '':
+        return version == specver
+    if op is None:
+        return fnmatch.fnmatchcase(version,specver)
+    result = compareVersions(version,specver)
+    if op == '>=':
+        return result >= 0
+    elif op == '<=':
+        return result <= 0
+    elif op == '>':
+        return result > 0
+    elif op == '<':
+        return result < 0
+    return result == 0
+
+class VersionIndex(object):
+    """
+    The versions of a module (ie the files in its directory)
+    sorted lowest to highest so specifications can be matched
+    with a binary search. Create with a list of versions, or
+    a list of (key,version) tuples as returned by getEntries()
+    if they are already sorted.
+    """
+    def __init__(self,versions=None,entries=None):
+        if entries is None:
+            entries = sorted([(versionKey(version),version) for version in versions])
+        self.keys = [entry[0] for entry in entries]
+        self.versions = [entry[1] for entry in entries]
+
+    def getEntries(self):
+        """
+        Returns the sorted list of (key,version) tuples
+        """
+        return list(zip(self.keys,self.versions))
+
+    def highest(self):
+        """
+        Returns the highest version or None if there aren't any
+        """
+        if len(self.versions) == 0:
+            return None
+        return self.versions[-1]
+
+    def findMatches(self,spec):
+        """
+        Returns the versions that satisfy spec, lowest first
+        """
+        op,specver = splitSpec(spec)
+        if op is None:
+            # wildcard. Only need to look at the versions that
+            # start with the same tokens as the part before the
+            # first wildcard, as long as that ends on a separator
+            # (ie '12.*' but not '1*' which matches 10 as well)
+            prefix = specver
+            for char in WILDCARDS:
+                prefix = prefix.split(char,1)[0]
+            if prefix == '' or TOKENRE.match(prefix[-1]) is not None:
+                start = 0
+                end = len(self.versions)
+            else:
+                tokens = tuple(versionTokens(prefix))
+                start = bisect.bisect_left(self.keys,tokens)
+                end = start
+                while end < len(self.keys) and self.keys[end][:len(tokens)] == tokens:
+                    end += 1
+            return [version for version in self.versions[start:end]
+                        if fnmatch.fnmatchcase(version,specver)]
+
+        if op == '':
+            # plain version
+            if specver in self.versions:
+                return [specver]
+            return []
+
+        key = versionKey(specver)
+        if op == '>=':
+            return self.versions[bisect.bisect_left(self.keys,key):]
+        elif op == '>':
+            return self.versions[bisect.bisect_right(self.keys,key):]
+        elif op == '<=':
+            return self.versions[:bisect.bisect_right(self.keys,key)]
+        elif op == '<':
+            return self.versions[:bisect.bisect_left(self.keys,key)]
+        return self.versions[bisect.bisect_left(self.keys,key):bisect.bisect_right(self.keys,key)]
+
+    def findBest(self,spec):
+        """
+        Returns the highest version that satisfies spec
+        or None if none do
+        """
+        matches = self.findMatches(spec)
+        if len(matches) == 0:
+            return None
+        return matches[-1]
@@ -5,6 +5,25 @@ directly from Python. This method uses the
 written to stdout, but the environment is
 updated anyway due to the way EnvMaster updates
 the environment of the current process.
+
+The changes can be undone without unloading the modules
+again by using a Transaction:
+
+    transaction = pyutils.Transaction()
+    transaction.load('gcc','netcdf')
+    ...
+    transaction.rollback()
+
+or for the duration of a with statement:
+
+    with pyutils.loaded('gcc','netcdf'):
+        ...
+
+resolve() works out the environment that loading modules would
+give without changing the environment of the current process:
+
+    environ = pyutils.resolve(['gcc','netcdf'])
+    subprocess.call(['make'],env=environ)
 """
 # This file is part of EnvMaster
 # Copyright (C) 2012  Sam Gillingham
@@ -23,24 +42,182 @@ the environment of the current process.
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
+import os
 import sys
 if sys.version_info[0] < 3:
     # keep compatibility with Python2.4
+    from thread import allocate_lock
+    import envmasterconf
+    import envmastercache
+    from envmasterenviron import DictEnviron
     from envmasterfile import EnvMasterFile
+    from envmastershells import EnvironJournal
 else:
+    from _thread import allocate_lock
+    from . import envmasterconf
+    from . import envmastercache
+    from .envmasterenviron import DictEnviron
     from .envmasterfile import EnvMasterFile
+    from .envmastershells import EnvironJournal
+
+class Transaction(object):
+    """
+    Loads and unloads modules recording just the variables
+    (and sys.path entries) that are changed so they can be put
+    back with rollback(). If any of the loads or unloads fail
+    everything done so far is rolled back.
+    Can be used in a with statement, in which case it is
+    rolled back if an exception is raised and committed
+    otherwise.
+    environ is the environment to load the modules into (see
+    envmasterenviron, ie a DictEnviron). If None it is the
+    environment of the current process, and sys.path is
+    also updated.
+    """
+    def __init__(self,environ=None):
+        self.environ = environ
+        self.journal = EnvironJournal(environ)
+
+    def run(self,modnames,loading):
+        """
+        Load (or unload) the modules in modnames
+        """
+        modfile = EnvMasterFile(self.environ)
+        shell = modfile.createShell('pythonsilent',loading)
+        shell.journal = self.journal
+        try:
+            modfile.runModule(shell,modnames,loading)
+            shell.flush()
+        except:
+            self.rollback()
+            raise
+
+    def load(self,*modnames):
+        """
+        Load the specified module names
+        """
+        self.run(modnames,True)
+
+    def unload(self,*modnames):
+        """
+        Unload the specified module names
+        """
+        self.run(modnames,False)
+
+    def commit(self):
+        """
+        Keep the changes made so far. A rollback() after
+        this only undoes changes made after the commit.
+        """
+        self.journal = EnvironJournal(self.environ)
+
+    def rollback(self):
+        """
+        Put back the environment and sys.path as they were
+        when the transaction was created (or last committed)
+        """
+        self.journal.restore()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exctype,excvalue,traceback):
+        if exctype is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+class LoadedContext(Transaction):
+    """
+    Returned by loaded(). Loads the modules when the
+    with statement starts and always rolls back at the end.
+    """
+    def __init__(self,modnames):
+        Transaction.__init__(self)
+        self.modnames = modnames
+
+    def __enter__(self):
+        self.load(*self.modnames)
+        return self
+
+    def __exit__(self,exctype,excvalue,traceback):
+        self.rollback()
+        return False
+
+def loaded(*modnames):
+    """
+    For use in a with statement. The modules are
+    loaded for the duration of the statement and the
+    environment is put back afterwards.
+    """
+    return LoadedContext(modnames)
 
 def load(*modnames):
     """
-    Load the specified module names
+    Load the specified module names. If one
+    of them fails none of them are loaded.
     """
-    modfile = EnvMasterFile()
-    modfile.runModule('pythonsilent',modnames,True)
+    Transaction().load(*modnames)
 
 
 def unload(*modnames):
     """
-    Unload the specified module names
+    Unload the specified module names. If one
+    of them fails none of them are unloaded.
     """
-    modfile = EnvMasterFile()
-    modfile.runModule('pythonsilent',modnames,False)
+    Transaction().unload(*modnames)
+
+# (tuple of module names,sorted tuple of base variables) ->
+# (values,resolved,validators) for each call to resolve()
+_resolved = {}
+_resolvedlock = allocate_lock()
+
+def resolve(modlist,base=None):
+    """
+    Returns a dictionary of the environment variables that
+    loading the modules in modlist into base (a dictionary of
+    variable name -> value, os.environ if None) would give.
+    Neither base nor the environment of the current process
+    is changed, so this can be called from more than one thread
+    at once. Module files that read os.environ directly see the
+    current process rather than base - use module.getEnv().
+    Results are remembered and reused until the module files
+    and install directories they depend on change. EnvMaster's
+    own records (see envmasterconf.RECORDVARS) are left out.
+    """
+    if base is None:
+        base = os.environ
+    values = dict(base)
+    key = (tuple(modlist),tuple(sorted(values.items())))
+
+    entry = _resolved.get(key)
+    if entry is not None:
+        result,resolved,validators = entry
+        modfile = EnvMasterFile(DictEnviron(values))
+        uptodate = envmastercache.validatorsOk(validators)
+        for modname,fullmod,path in resolved:
+            if not uptodate or modfile.getModule(modname) != (fullmod,path):
+                uptodate = False
+                break
+        if uptodate:
+            return dict(result)
+
+    environ = DictEnviron(values)
+    resolved,shell = EnvMasterFile(environ).resolveModules(modlist)
+    validators = []
+    for path in sorted(shell.depends):
+        validators.append((path,envmastercache.fingerprint(path)))
+    result = environ.getValues()
+    for var in envmasterconf.RECORDVARS:
+        result.pop(var,None)
+
+    _resolvedlock.acquire()
+    try:
+        if len(_resolved) >= envmasterconf.RESOLVE_MAXENTRIES:
+            # simplest to start again
+            _resolved.clear()
+        _resolved[key] = (result,resolved,validators)
+    finally:
+        _resolvedlock.release()
+    return dict(result)
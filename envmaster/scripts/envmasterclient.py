@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+Thin client for the EnvMaster daemon. Takes the same
+arguments as envmastercmd.py but sends them (along with
+the environment) to the daemon rather than importing
+EnvMaster itself. If the daemon isn't running, runs
+envmastercmd.py instead.
+
+Deliberately doesn't import anything from EnvMaster (or
+much else) so it starts as quickly as possible.
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+import os
+import sys
+import socket
+import marshal
+
+# must match envmasterdaemon.py
+PROTOCOL = 1
+
+# seconds to wait for the daemon before running the
+# command ourselves. Allows for the daemon waiting for
+# another client (envmasterconf.DAEMON_CONNTIMEOUT) as
+# well as running the command.
+TIMEOUT = 60
+
+def getSocketPath():
+    """
+    Returns the path of the socket the daemon listens on.
+    Copy of envmasterdaemon.getSocketPath() - keep them the same.
+    """
+    sockpath = os.getenv('ENVMASTER_SOCKET')
+    if sockpath is not None:
+        return sockpath
+    rundir = os.getenv('XDG_RUNTIME_DIR')
+    if rundir is None or not os.path.isdir(rundir):
+        rundir = '/tmp/envmaster-%d' % os.getuid()
+    return os.path.join(rundir,'envmaster.sock')
+
+def runLocally():
+    """
+    Daemon not available - replace ourselves with
+    envmastercmd.py which lives in the same directory.
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)),'envmastercmd.py')
+    os.execv(sys.executable,[sys.executable,script] + sys.argv[1:])
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] in ('exec','shell'):
+        # these replace the process with the command
+        # so can't be done by the daemon
+        runLocally()
+
+    environ = dict(os.environ)
+    if 'COLUMNS' not in environ:
+        # the daemon has no terminal to find the size of
+        try:
+            environ['COLUMNS'] = str(os.get_terminal_size(2).columns)
+        except (AttributeError,OSError,ValueError):
+            pass
+
+    request = marshal.dumps((PROTOCOL,'run',sys.argv[1:],environ,os.getcwd()))
+    sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+    sock.settimeout(TIMEOUT)
+    try:
+        sock.connect(getSocketPath())
+        sock.sendall(request)
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            chunks.append(data)
+        sock.close()
+        reply = marshal.loads(b''.join(chunks))
+    except (socket.error,EOFError,ValueError,TypeError):
+        reply = None
+
+    if reply is None or reply[0] != 'ok':
+        runLocally()
+
+    status,stdout,stderr = reply[1:]
+    sys.stdout.write(stdout)
+    sys.stderr.write(stderr)
+    sys.exit(status)
+
+main()
@@ -21,12 +21,22 @@ with Python.
 # You should have received a copy of the GNU General Public License
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
-from distutils.core import setup
 import sys
 import glob
 import envmaster
 
-scriptList = ['scripts/envmastercmd.py','scripts/mod2envmaster.py']
+# use setuptools if we have it so we can install
+# the command line as a console script
+try:
+    from setuptools import setup
+    extraArgs = {'entry_points' : {'console_scripts' : 
+                    ['envmastercmd = envmaster.envmastercmdline:main']}}
+except ImportError:
+    from distutils.core import setup
+    extraArgs = {}
+
+scriptList = ['scripts/envmastercmd.py','scripts/mod2envmaster.py',
+                'scripts/envmasterd.py','scripts/envmasterclient.py']
 if sys.platform == 'win32':
     scriptList.append('scripts/envmaster.bat')
 
@@ -39,4 +49,5 @@ setup(name='EnvMaster',
       package_dir={'envmaster' : 'envmaster'},
       scripts=scriptList,
       data_files=[('init',glob.glob('init/*'))],
+      **extraArgs
      )
@@ -0,0 +1,177 @@
+"""
+Things shared by the tests. ModuleTreeTest is the base
+class for tests that write module files into a temporary
+directory and load them.
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# so the tests run against this tree rather than an installed copy
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from envmaster import envmasterconf
+from envmaster import envmastercache
+from envmaster import envmastercatalog
+from envmaster import envmastercmdline
+from envmaster import envmasterenv
+from envmaster import envmasterindex
+from envmaster import envmastersearch
+from envmaster import pyutils
+
+if sys.version_info[0] < 3:
+    from StringIO import StringIO
+else:
+    from io import StringIO
+
+def resetCaches():
+    """
+    Forget the caches kept for the rest of the run so
+    the next test starts again with its own cache directory
+    """
+    envmastercache._resolvecache = None
+    envmastercache._codecache = None
+    envmastercatalog._catalog = None
+    envmastersearch._searchindex = None
+    envmasterenv.clearPrefixCache()
+    envmasterindex.clearRootIndexes()
+    pyutils._resolved.clear()
+
+def parseEnv0(output):
+    """
+    Returns a dictionary of variable -> value (None if
+    unset) from the output of the env0 shell
+    """
+    values = {}
+    for record in output.split('\0'):
+        if record == '':
+            continue
+        if record.find('=') != -1:
+            var,value = record.split('=',1)
+        else:
+            var = record
+            value = None
+        values[var] = value
+    return values
+
+class ModuleTreeTest(unittest.TestCase):
+    """
+    Base class for tests that write module files into a
+    temporary directory. The environment of the process
+    (and sys.path) are put back after each test. Snapshots
+    and collections are saved in the temporary directory.
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.oldenviron = dict(os.environ)
+        self.oldsyspath = sys.path[:]
+        self.oldstreams = (envmasterconf.STDOUT,envmasterconf.STDERR)
+        self.olduserdirs = (envmasterconf.SNAPSHOTDIR,envmasterconf.COLLECTIONDIR)
+        envmasterconf.SNAPSHOTDIR = os.path.join(self.tmpdir,'snapshots')
+        envmasterconf.COLLECTIONDIR = os.path.join(self.tmpdir,'collections')
+        for var in (envmasterconf.LOADEDMODULESENV,envmasterconf.ENVMASTERPATH,
+                    envmasterconf.TRACEENV,envmasterconf.NOCACHEENV) + envmasterconf.RECORDVARS:
+            if var in os.environ:
+                del os.environ[var]
+        # don't read or write the user's caches
+        os.environ[envmasterconf.CACHEDIRENV] = os.path.join(self.tmpdir,'cache')
+        resetCaches()
+
+    def tearDown(self):
+        envmasterconf.STDOUT,envmasterconf.STDERR = self.oldstreams
+        envmasterconf.SNAPSHOTDIR,envmasterconf.COLLECTIONDIR = self.olduserdirs
+        os.environ.clear()
+        os.environ.update(self.oldenviron)
+        sys.path[:] = self.oldsyspath
+        resetCaches()
+        shutil.rmtree(self.tmpdir)
+
+    def writeModule(self,root,name,lines):
+        """
+        Writes a module file called name (which may be
+        'name/version') in the directory root (under
+        self.tmpdir) with lines as the body. Returns root
+        as a full path.
+        """
+        dirpath = os.path.join(self.tmpdir,root)
+        self.writeFile(os.path.join(root,name),
+                [envmasterconf.ENVMASTERSENTINEL] + list(lines))
+        return dirpath
+
+    def writeFile(self,relpath,lines):
+        """
+        Writes lines to the file relpath under
+        self.tmpdir. Returns the full path.
+        """
+        path = os.path.join(self.tmpdir,relpath)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        fileobj = open(path,'w')
+        for line in lines:
+            fileobj.write(line + '\n')
+        fileobj.close()
+        return path
+
+    def makePrefix(self,relpath,subdirs):
+        """
+        Creates an install directory relpath under self.tmpdir
+        with a file in each of subdirs. Returns the full path.
+        """
+        prefix = os.path.join(self.tmpdir,relpath)
+        for subdir in subdirs:
+            self.writeFile(os.path.join(relpath,subdir,'file'),[])
+        if not os.path.isdir(prefix):
+            os.makedirs(prefix)
+        return prefix
+
+    def setPath(self,*roots):
+        """
+        Sets ENVMASTERPATH to the directories roots
+        (under self.tmpdir)
+        """
+        os.environ[envmasterconf.ENVMASTERPATH] = os.pathsep.join(
+                [os.path.join(self.tmpdir,root) for root in roots])
+
+    def runCommand(self,*argv):
+        """
+        Runs an envmastercmd.py command line in this process.
+        Returns a tuple of what was written to stdout and stderr.
+        Module files are loaded into (and unloaded from) the
+        environment of this process.
+        """
+        stdout = StringIO()
+        stderr = StringIO()
+        envmasterconf.STDOUT = stdout
+        envmasterconf.STDERR = stderr
+        try:
+            envmastercmdline.runCommand(list(argv))
+        finally:
+            envmasterconf.STDOUT,envmasterconf.STDERR = self.oldstreams
+        return stdout.getvalue(),stderr.getvalue()
+
+    def runEnv0(self,*argv):
+        """
+        Runs the command for the env0 shell and returns the
+        variables it sets as a dictionary (see parseEnv0())
+        """
+        stdout,stderr = self.runCommand('env0',*argv)
+        return parseEnv0(stdout)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+Tests for listing the available modules.
+
+    python tests/test_avail.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import unittest
+
+from envmastertest import ModuleTreeTest
+from envmaster import envmasterconf
+from envmaster import envmasterfile
+from envmaster import envmasterexceptions
+
+class TestIterAvail(ModuleTreeTest):
+    """
+    Scanning the search directories at the same time
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        self.oldthreads = envmasterconf.AVAIL_THREADS
+        self.writeModule('root1','tool/1.0',[])
+        self.writeModule('root1','tool/2.0',[])
+        self.writeModule('root1','plain',[])
+        self.writeModule('root2','other/3.0',[])
+        self.writeModule('root2','other/version.py',['version = "3.0"'])
+        # not a module file
+        self.writeFile(os.path.join('root2','README'),['not a module'])
+        self.setPath('root1','missing','root2')
+
+    def tearDown(self):
+        envmasterconf.AVAIL_THREADS = self.oldthreads
+        ModuleTreeTest.tearDown(self)
+
+    def getAvail(self):
+        """
+        Returns [(root,[modname,...]),...] from iterAvailModules()
+        """
+        modfile = envmasterfile.EnvMasterFile()
+        return [(os.path.basename(path),[modname for modname,modpath in availmodules])
+                    for path,availmodules in modfile.iterAvailModules()]
+
+    def testOrder(self):
+        """
+        The search directories come back in ENVMASTERPATH
+        order whatever order they are scanned in
+        """
+        expected = [('root1',['plain','tool/1.0','tool/2.0(default)']),
+                    ('missing',[]),
+                    ('root2',['other/3.0(default)'])]
+        for nthreads in (1,3):
+            envmasterconf.AVAIL_THREADS = nthreads
+            self.assertEqual(self.getAvail(),expected)
+
+    def testError(self):
+        """
+        An error scanning a search directory is raised
+        by the generator
+        """
+        envmasterconf.AVAIL_THREADS = 3
+        modfile = envmasterfile.EnvMasterFile()
+        findAvailModules = modfile.findAvailModules
+        def failingFindAvail(path):
+            if path.endswith('root2'):
+                raise envmasterexceptions.EnvMasterPathException('cannot read')
+            return findAvailModules(path)
+        modfile.findAvailModules = failingFindAvail
+
+        results = modfile.iterAvailModules()
+        self.assertEqual(os.path.basename(next(results)[0]),'root1')
+        self.assertEqual(os.path.basename(next(results)[0]),'missing')
+        self.assertRaises(envmasterexceptions.EnvMasterPathException,next,results)
+
+    def testNoModules(self):
+        """
+        An error if there are no module files at all
+        """
+        self.setPath('missing')
+        self.assertRaises(envmasterexceptions.EnvMasterNoModules,
+                    self.runCommand,'bash','avail')
+
+if __name__ == '__main__':
+    unittest.main()
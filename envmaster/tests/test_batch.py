@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+Tests for commands that unload and load a number of
+modules as one batch (swap, reload, allreload, allunload).
+
+    python tests/test_batch.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+import unittest
+
+from envmastertest import ModuleTreeTest
+from envmaster import envmasterconf
+from envmaster import envmastercmdline
+from envmaster import envmasterexceptions
+
+if sys.version_info[0] < 3:
+    from StringIO import StringIO
+else:
+    from io import StringIO
+
+class TestBatch(ModuleTreeTest):
+    """
+    Only the final value of each variable is written
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        for version in ('9.1','12.2'):
+            self.writeModule('root','gcc/%s' % version,
+                        ['module.setVar("%s","GCC_VER")' % version,
+                        'module.setPath("/opt/gcc%s/bin","PATH")' % version])
+        self.writeModule('root','plain',['module.setVar("yes","PLAIN")'])
+        self.setPath('root')
+        os.environ['PATH'] = '/usr/bin'
+
+    def countSets(self,stdout,var):
+        """
+        Returns the number of times the bash commands
+        in stdout set and unset var
+        """
+        sets = 0
+        unsets = 0
+        for line in stdout.splitlines():
+            if line.startswith('%s=' % var):
+                sets += 1
+            elif line.startswith('unset %s' % var):
+                unsets += 1
+        return sets,unsets
+
+    def testSwap(self):
+        """
+        A variable set by both modules is written once
+        and not unset
+        """
+        self.runCommand('bash','load','gcc/9.1')
+        stdout,stderr = self.runCommand('bash','swap','gcc/9.1','gcc/12.2')
+        self.assertEqual(self.countSets(stdout,'GCC_VER'),(1,0))
+        self.assertEqual(self.countSets(stdout,'PATH'),(1,0))
+        self.assertEqual(os.environ['GCC_VER'],'12.2')
+        self.assertEqual(os.environ['PATH'],os.pathsep.join(['/opt/gcc12.2/bin','/usr/bin']))
+        self.assertEqual(os.environ[envmasterconf.LOADEDMODULESENV],
+                        os.path.join('gcc','12.2'))
+
+    def testReload(self):
+        """
+        Reloading a module leaves it as it was
+        """
+        self.runCommand('bash','load','gcc','plain')
+        before = dict(os.environ)
+        stdout,stderr = self.runCommand('bash','reload','gcc','plain')
+        self.assertEqual(self.countSets(stdout,'PLAIN'),(1,0))
+        self.assertEqual(os.environ['GCC_VER'],before['GCC_VER'])
+        self.assertEqual(os.environ['PATH'],before['PATH'])
+
+    def testAllUnload(self):
+        """
+        Everything is unloaded
+        """
+        self.runCommand('bash','load','gcc','plain')
+        stdout,stderr = self.runCommand('bash','allunload')
+        self.assertEqual(self.countSets(stdout,'GCC_VER'),(0,1))
+        self.assertFalse('GCC_VER' in os.environ)
+        self.assertFalse('PLAIN' in os.environ)
+        self.assertEqual(os.environ['PATH'],'/usr/bin')
+
+    def testError(self):
+        """
+        Nothing is written if part of the batch fails
+        """
+        self.runCommand('bash','load','gcc/9.1')
+        stdout = StringIO()
+        envmasterconf.STDOUT = stdout
+        self.assertRaises(envmasterexceptions.EnvMasterException,
+                    envmastercmdline.runCommand,['bash','swap','gcc/9.1','nosuchmodule'])
+        self.assertEqual(stdout.getvalue(),'')
+
+if __name__ == '__main__':
+    unittest.main()
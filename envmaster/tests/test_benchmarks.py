@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Tests for the tools the benchmarks use to generate
+module trees and mimic slow file systems.
+
+    python tests/test_benchmarks.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+import unittest
+import subprocess
+
+from envmastertest import ModuleTreeTest
+from envmaster import envmasterconf
+from envmaster import envmasterfile
+from envmaster import pyutils
+
+BENCHMARKDIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    'benchmarks')
+sys.path.insert(0,BENCHMARKDIR)
+import treegen
+
+class TestTreeGen(ModuleTreeTest):
+    """
+    Generated module trees
+    """
+    def testTree(self):
+        """
+        Every module is there and can be loaded
+        """
+        tree = treegen.makeTree(os.path.join(self.tmpdir,'tree'),20,nroots=3,deprate=0.5)
+        self.assertEqual(len(tree.roots),3)
+        self.assertEqual(len(tree.modnames),20)
+        os.environ[envmasterconf.ENVMASTERPATH] = tree.modpath
+
+        modfile = envmasterfile.EnvMasterFile()
+        for modname,fullname in zip(tree.modnames,tree.fullnames):
+            self.assertEqual(modfile.getModule(modname)[0],fullname)
+
+        result = pyutils.resolve(tree.modnames)
+        for modname in tree.modnames:
+            self.assertEqual(result['HAVE_%s' % modname.upper()],'1')
+            self.assertTrue(('%s_ROOT' % modname.upper()) in result)
+
+    def testSeed(self):
+        """
+        The same seed gives the same tree
+        """
+        tree1 = treegen.makeTree(os.path.join(self.tmpdir,'tree1'),20,seed=1)
+        tree2 = treegen.makeTree(os.path.join(self.tmpdir,'tree2'),20,seed=1)
+        self.assertEqual(tree1.fullnames,tree2.fullnames)
+
+class TestLatency(unittest.TestCase):
+    """
+    Running code with file system calls delayed
+    """
+    def testCount(self):
+        """
+        The delayed calls are counted
+        """
+        code = 'import os\nfor n in range(3): os.stat(".")'
+        proc = subprocess.Popen([sys.executable,os.path.join(BENCHMARKDIR,'latency.py'),
+                    '--delay','0','--count','-c',code],
+                    stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True)
+        stdout,stderr = proc.communicate()
+        self.assertEqual(proc.returncode,0,stderr)
+        self.assertTrue(stderr.startswith('delayed calls: 3 '),stderr)
+        self.assertTrue(stderr.find('stat=3') != -1,stderr)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+"""
+Tests for the caches kept between runs. See envmastercache.
+
+    python tests/test_cache.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import unittest
+
+from envmastertest import ModuleTreeTest, resetCaches
+from envmaster import envmasterconf
+from envmaster import envmastercache
+from envmaster import envmasterenviron
+from envmaster import envmasterfile
+
+def bumpMtime(path):
+    """
+    Moves the modification time of path forward so the
+    change is seen even if the filesystem's times are coarse
+    """
+    mtime = os.stat(path).st_mtime + 10
+    os.utime(path,(mtime,mtime))
+
+class TestResolutionCache(ModuleTreeTest):
+    """
+    Module searches remembered in the ResolutionCache
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        self.rootdir = self.writeModule('root','tool/1.0',[])
+        self.writeModule('root','tool/2.0',[])
+
+    def getModule(self,modname):
+        """
+        Searches for modname with a new EnvMasterFile
+        so nothing is remembered from the last search
+        """
+        environ = envmasterenviron.DictEnviron(
+                {envmasterconf.ENVMASTERPATH : self.rootdir})
+        return envmasterfile.EnvMasterFile(environ).getModule(modname)
+
+    def testStoredAndReused(self):
+        """
+        A search is saved and read back by the next process
+        """
+        result = self.getModule('tool')
+        self.assertEqual(result,('tool/2.0',os.path.join(self.rootdir,'tool','2.0')))
+
+        envmastercache.getResolveCache().save()
+        resetCaches()
+        cache = envmastercache.getResolveCache()
+        modpaths = envmasterconf.DEFAULTENVMASTERPATHS + [self.rootdir]
+        self.assertEqual(cache.lookupModule(modpaths,'tool'),result)
+        self.assertEqual(cache.lookupDefault(os.path.join(self.rootdir,'tool')),'tool/2.0')
+
+    def testNewVersion(self):
+        """
+        The default changes when a higher version is added
+        """
+        self.assertEqual(self.getModule('tool')[0],'tool/2.0')
+        self.writeModule('root','tool/3.0',[])
+        bumpMtime(os.path.join(self.rootdir,'tool'))
+        self.assertEqual(self.getModule('tool')[0],'tool/3.0')
+
+    def testVersionFileChanged(self):
+        """
+        The default changes when the version file does
+        """
+        self.writeModule('root','tool/version.py',['version = "1.0"'])
+        self.assertEqual(self.getModule('tool')[0],'tool/1.0')
+        self.writeModule('root','tool/version.py',['version = "2.0"'])
+        bumpMtime(os.path.join(self.rootdir,'tool','version.py'))
+        self.assertEqual(self.getModule('tool')[0],'tool/2.0')
+
+    def testNotFound(self):
+        """
+        Modules that don't exist are remembered
+        until they are created
+        """
+        self.assertEqual(self.getModule('other'),(None,None))
+        modpaths = envmasterconf.DEFAULTENVMASTERPATHS + [self.rootdir]
+        cache = envmastercache.getResolveCache()
+        self.assertEqual(cache.lookupModule(modpaths,'other'),(None,None))
+
+        self.writeModule('root','other',[])
+        bumpMtime(self.rootdir)
+        self.assertEqual(self.getModule('other')[0],'other')
+
+    def testDynamicDefault(self):
+        """
+        A version file that has to be run isn't cached
+        since it may give a different answer next time
+        """
+        self.writeModule('root','tool/version.py',
+                ['import os','version = os.getenv("TOOL_VERSION","1.0")'])
+        self.assertEqual(self.getModule('tool')[0],'tool/1.0')
+        os.environ['TOOL_VERSION'] = '2.0'
+        self.assertEqual(self.getModule('tool')[0],'tool/2.0')
+
+        cache = envmastercache.getResolveCache()
+        self.assertEqual(cache.lookupDefault(os.path.join(self.rootdir,'tool')),None)
+        modpaths = envmasterconf.DEFAULTENVMASTERPATHS + [self.rootdir]
+        self.assertEqual(cache.lookupModule(modpaths,'tool'),None)
+
+    def testDisabled(self):
+        """
+        Nothing is cached when the user turns caching off
+        """
+        os.environ[envmasterconf.NOCACHEENV] = '1'
+        self.assertEqual(envmastercache.getResolveCache(),None)
+        self.assertEqual(self.getModule('tool')[0],'tool/2.0')
+
+class TestCodeCache(ModuleTreeTest):
+    """
+    Compiled module files kept by the CodeCache
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        self.cachedir = os.path.join(self.tmpdir,'code')
+        os.mkdir(self.cachedir)
+        self.oldsettings = (envmasterconf.CODECACHE_MAXSIZE,
+                            envmasterconf.CODECACHE_EVICTWRITES)
+
+    def tearDown(self):
+        (envmasterconf.CODECACHE_MAXSIZE,
+            envmasterconf.CODECACHE_EVICTWRITES) = self.oldsettings
+        ModuleTreeTest.tearDown(self)
+
+    def writeSource(self,name,value):
+        """
+        Writes a Python file that sets VALUE
+        """
+        return self.writeFile(os.path.join('src',name),['VALUE = %r' % value])
+
+    def runCode(self,code):
+        """
+        Runs code and returns what it set VALUE to
+        """
+        localdict = {}
+        exec(code,localdict,localdict)
+        return localdict['VALUE']
+
+    def testWrittenAndReused(self):
+        """
+        The compiled file is written to the cache directory
+        and used by the next process without compiling again
+        """
+        path = self.writeSource('mod','first')
+        cache = envmastercache.CodeCache(self.cachedir)
+        self.assertEqual(self.runCode(cache.compileFile(path)),'first')
+        self.assertTrue(os.path.exists(cache.getCachePath(path)))
+
+        def failCompile(*args):
+            raise AssertionError('compiled again')
+        envmastercache.compile = failCompile
+        try:
+            cache = envmastercache.CodeCache(self.cachedir)
+            self.assertEqual(self.runCode(cache.compileFile(path)),'first')
+        finally:
+            del envmastercache.compile
+
+    def testRecompiled(self):
+        """
+        A file that has changed is compiled again
+        """
+        path = self.writeSource('mod','first')
+        cache = envmastercache.CodeCache(self.cachedir)
+        self.assertEqual(self.runCode(cache.compileFile(path)),'first')
+
+        self.writeSource('mod','second')
+        bumpMtime(path)
+        self.assertEqual(self.runCode(cache.compileFile(path)),'second')
+        cache = envmastercache.CodeCache(self.cachedir)
+        self.assertEqual(self.runCode(cache.compileFile(path)),'second')
+
+    def testEvictBatched(self):
+        """
+        The cache directory is only looked at every
+        CODECACHE_EVICTWRITES files written and at exit
+        """
+        envmasterconf.CODECACHE_EVICTWRITES = 3
+        cache = envmastercache.CodeCache(self.cachedir)
+        evicted = []
+        cache.evict = lambda: evicted.append(cache.written)
+
+        for n in range(2):
+            cache.compileFile(self.writeSource('mod%d' % n,n))
+        self.assertEqual(evicted,[])
+        cache.compileFile(self.writeSource('mod2',2))
+        self.assertEqual(evicted,[3])
+
+        # a hit writes nothing
+        evicted = []
+        cache.written = 0
+        cache.compileFile(os.path.join(self.tmpdir,'src','mod0'))
+        cache.finish()
+        self.assertEqual(evicted,[])
+
+        cache.compileFile(self.writeSource('mod3',3))
+        cache.finish()
+        self.assertEqual(evicted,[1])
+
+    def testEvictOldest(self):
+        """
+        The least recently used files are removed when
+        the directory is over CODECACHE_MAXSIZE
+        """
+        cache = envmastercache.CodeCache(self.cachedir)
+        paths = []
+        for n in range(4):
+            path = self.writeSource('mod%d' % n,n)
+            cache.compileFile(path)
+            cachepath = cache.getCachePath(path)
+            # oldest first
+            mtime = os.stat(cachepath).st_mtime - 100 + n
+            os.utime(cachepath,(mtime,mtime))
+            paths.append(cachepath)
+
+        size = os.stat(paths[0]).st_size
+        envmasterconf.CODECACHE_MAXSIZE = size * 4
+        cache.evict()
+        self.assertEqual([os.path.exists(path) for path in paths],[True] * 4)
+
+        envmasterconf.CODECACHE_MAXSIZE = size * 3
+        cache.evict()
+        self.assertEqual([os.path.exists(path) for path in paths],
+                    [False,False,True,True])
+
+if __name__ == '__main__':
+    unittest.main()
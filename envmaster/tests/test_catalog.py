@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+"""
+Tests for the catalog of what module files do without
+running them. See envmastercatalog.
+
+    python tests/test_catalog.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import unittest
+
+from envmastertest import ModuleTreeTest, resetCaches
+from envmaster import envmasterconf
+from envmaster import envmastercatalog
+from envmaster import envmasterenv
+
+class TestScan(ModuleTreeTest):
+    """
+    Working out what a module file does from its source
+    """
+    def scan(self,lines):
+        """
+        Writes a module file and returns the ModuleInfo for it
+        """
+        self.writeModule('root','mod',lines)
+        path = os.path.join(self.tmpdir,'root','mod')
+        static,calls,reason = envmastercatalog.scanModuleFile(path)
+        return envmastercatalog.ModuleInfo(path,static,calls,reason)
+
+    def testStatic(self):
+        """
+        Only module calls with literal arguments
+        """
+        info = self.scan(['"""doc string"""',
+                    'module.whatis("A tool")',
+                    'module.prereq("gcc","clang")',
+                    'module.conflict("other")',
+                    'module.load("lib1","lib2")',
+                    'module.setVar("1","TOOL_VAR")',
+                    'module.setVar("2","SUFFIX",True)',
+                    'module.setPath("/opt/x",var="XPATH")',
+                    'module.setBin("/opt/tool/bin")',
+                    'module.setAll("/opt/tool")',
+                    'pass'])
+        self.assertTrue(info.static,info.reason)
+        self.assertEqual(info.reason,None)
+        self.assertEqual(info.getWhatIs(),'A tool')
+        self.assertEqual(info.getPrereqs(),[('gcc','clang')])
+        self.assertEqual(info.getConflicts(),[('other',)])
+        self.assertEqual(info.getLoads(),['lib1','lib2'])
+        self.assertEqual(info.getVariables(),['TOOL_VAR','XPATH',envmasterconf.PATH])
+
+    def testDynamic(self):
+        """
+        Anything else has to be run
+        """
+        info = self.scan(['module.whatis("A tool")',
+                    'import os',
+                    'module.load("lib1")'])
+        self.assertFalse(info.static)
+        self.assertEqual(info.reason,'line 3 is not a module call with literal arguments')
+        # what was found is still known
+        self.assertEqual(info.getWhatIs(),'A tool')
+        self.assertEqual(info.getLoads(),['lib1'])
+
+        info = self.scan(['module.setVar(os.getenv("HOME"),"TOOL_HOME")'])
+        self.assertFalse(info.static)
+        info = self.scan(['module.execute("/opt/other")'])
+        self.assertEqual(info.reason,'line 2 calls module.execute()')
+        info = self.scan(['module.setVar(('])
+        self.assertTrue(info.reason.startswith('unable to parse'))
+
+    def testNotNames(self):
+        """
+        Calls that aren't just module names aren't
+        used as loads or prereqs
+        """
+        info = self.scan(['module.load(1)','module.prereq("gcc",other=1)'])
+        self.assertEqual(info.getLoads(),[])
+        self.assertEqual(info.getPrereqs(),[])
+
+class TestCatalog(ModuleTreeTest):
+    """
+    Scanned files kept between runs
+    """
+    def testRescanned(self):
+        """
+        Files are scanned again when they change
+        """
+        self.writeModule('root','mod',['module.whatis("First")'])
+        path = os.path.join(self.tmpdir,'root','mod')
+        catalog = envmastercatalog.getCatalog()
+        self.assertEqual(catalog.getInfo(path).getWhatIs(),'First')
+
+        self.writeModule('root','mod',['module.whatis("Second one")'])
+        self.assertEqual(catalog.getInfo(path).getWhatIs(),'Second one')
+
+    def testSaved(self):
+        """
+        The catalog is read back by the next process
+        """
+        self.writeModule('root','mod',['module.whatis("First")'])
+        path = os.path.join(self.tmpdir,'root','mod')
+        envmastercatalog.getModuleInfo(path)
+        envmastercatalog.getCatalog().save()
+        resetCaches()
+
+        catalog = envmastercatalog.getCatalog()
+        self.assertTrue(path in catalog.entries)
+        self.assertFalse(catalog.dirty)
+        self.assertEqual(catalog.getInfo(path).getWhatIs(),'First')
+        self.assertFalse(catalog.dirty)
+
+class TestDisp(ModuleTreeTest):
+    """
+    disp replays the calls the catalog found
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        prefix = self.makePrefix('prefix',['bin','lib','include'])
+        self.writeModule('root','tool',['module.whatis("A tool")',
+                    'module.setAll(%r)' % prefix,
+                    'module.setVar("1","TOOL_VAR")'])
+        self.setPath('root')
+        self.oldexecute = envmasterenv.EnvMasterEnv.execute
+
+    def tearDown(self):
+        envmasterenv.EnvMasterEnv.execute = self.oldexecute
+        ModuleTreeTest.tearDown(self)
+
+    def testSame(self):
+        """
+        The same output as running the file, without running it
+        """
+        # the display goes to stderr
+        stdout,executed = self.runCommand('bash','disp','--exec','tool')
+        def failExecute(*args):
+            raise AssertionError('module file run')
+        envmasterenv.EnvMasterEnv.execute = failExecute
+        stdout,replayed = self.runCommand('bash','disp','tool')
+        self.assertEqual(replayed,executed)
+        self.assertTrue(replayed.find('TOOL_BIN_PATH') != -1)
+
+if __name__ == '__main__':
+    unittest.main()
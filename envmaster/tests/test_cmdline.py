@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Tests for the command line. See envmastercmdline.
+
+    python tests/test_cmdline.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+import unittest
+import subprocess
+
+from envmastertest import ModuleTreeTest
+from envmaster import envmasterconf
+
+# the top of the source tree
+SRCDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# runs a command and lists the modules it imported on stderr
+LISTIMPORTS = """
+import sys
+from envmaster import envmastercmdline
+envmastercmdline.runCommand(sys.argv[1:])
+sys.stderr.write(' '.join(sys.modules.keys()))
+"""
+
+class TestStartup(ModuleTreeTest):
+    """
+    Commands run in a new interpreter only import
+    what they need
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        self.rootdir = self.writeModule('root','tool',
+                        ['module.setVar("yes","TOOL_LOADED")'])
+
+    def runPython(self,args):
+        """
+        Runs python with args and returns (stdout,stderr)
+        """
+        env = dict(os.environ)
+        env[envmasterconf.ENVMASTERPATH] = self.rootdir
+        env['PYTHONPATH'] = SRCDIR
+        proc = subprocess.Popen([sys.executable] + args,env=env,
+                    stdout=subprocess.PIPE,stderr=subprocess.PIPE,
+                    universal_newlines=True)
+        stdout,stderr = proc.communicate()
+        self.assertEqual(proc.returncode,0,stderr)
+        return stdout,stderr
+
+    def getImports(self,argv):
+        """
+        Returns the set of modules imported when
+        running the command line argv
+        """
+        stdout,stderr = self.runPython(['-c',LISTIMPORTS] + argv)
+        return set(stderr.split())
+
+    def testLoadImports(self):
+        """
+        Loading a module doesn't need the terminal formatting
+        """
+        imports = self.getImports(['bash','load','tool'])
+        self.assertTrue('envmaster.envmasterfile' in imports)
+        for modname in ('envmaster.envmasterformat','termios','fcntl','importlib.util'):
+            self.assertFalse(modname in imports,modname)
+
+    def testAvailImports(self):
+        """
+        Listing the available modules does
+        """
+        imports = self.getImports(['bash','avail'])
+        self.assertTrue('envmaster.envmasterformat' in imports)
+
+    def testRunModule(self):
+        """
+        The package can be run with 'python -m envmaster'
+        """
+        stdout,stderr = self.runPython(['-m','envmaster','bash','load','tool'])
+        self.assertTrue(stdout.find('TOOL_LOADED') != -1)
+
+if __name__ == '__main__':
+    unittest.main()
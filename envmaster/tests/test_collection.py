@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""
+Tests for saving and restoring named collections
+of modules. See envmastercollection.
+
+    python tests/test_collection.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import unittest
+
+from envmastertest import ModuleTreeTest
+from envmaster import envmastercollection
+from envmaster import envmasterexceptions
+from envmaster import envmasterfile
+
+class TestCollection(ModuleTreeTest):
+    """
+    Commands saved for a list of modules
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        self.writeGcc('9.1')
+        self.writeModule('root','plain',['module.setVar("yes","PLAIN")'])
+        self.setPath('root')
+        os.environ['PATH'] = '/usr/bin'
+        self.oldrunmodule = envmasterfile.EnvMasterFile.runModule
+
+    def tearDown(self):
+        envmasterfile.EnvMasterFile.runModule = self.oldrunmodule
+        ModuleTreeTest.tearDown(self)
+
+    def writeGcc(self,value):
+        """
+        (Re)writes the gcc module file to set GCC_VER to value
+        """
+        self.writeModule('root','gcc/9.1',['module.setVar("%s","GCC_VER")' % value,
+                    'module.setPath("/opt/gcc/bin","PATH")'])
+
+    def disableRunModule(self):
+        """
+        Make it an error to run a module file
+        """
+        def failRunModule(*args):
+            raise AssertionError('module files run')
+        envmasterfile.EnvMasterFile.runModule = failRunModule
+
+    def testSave(self):
+        """
+        The collection and the plain scripts are written
+        without changing the environment
+        """
+        self.runCommand('bash','save','dev','gcc','plain')
+        self.assertFalse('GCC_VER' in os.environ)
+        for ext in ['emcoll'] + list(envmastercollection.COLLECTIONSHELLS.values()):
+            self.assertTrue(os.path.exists(envmastercollection.getCollectionPath('dev',ext)),ext)
+
+        collection = envmastercollection.loadCollection('dev')
+        self.assertEqual(collection.modlist,['gcc','plain'])
+        self.assertEqual(collection.final['GCC_VER'],'9.1')
+        self.assertEqual(collection.base['PATH'],'/usr/bin')
+        self.assertEqual(collection.final['PATH'],os.pathsep.join(['/opt/gcc/bin','/usr/bin']))
+
+        script = open(envmastercollection.getCollectionPath('dev','sh')).read()
+        self.assertEqual(script,collection.texts['bash'])
+        self.assertTrue(script.find('GCC_VER="9.1"') != -1)
+
+    def testRestore(self):
+        """
+        The saved commands are written without running
+        the module files
+        """
+        self.runCommand('bash','save','dev','gcc','plain')
+        collection = envmastercollection.loadCollection('dev')
+        self.disableRunModule()
+        stdout,stderr = self.runCommand('bash','restore','dev')
+        self.assertEqual(stdout,collection.texts['bash'])
+        stdout,stderr = self.runCommand('csh','restore','dev')
+        self.assertEqual(stdout,collection.texts['csh'])
+
+    def testChangedModule(self):
+        """
+        The collection is saved again if a module file
+        has changed
+        """
+        self.runCommand('bash','save','dev','gcc','plain')
+        path = os.path.join(self.tmpdir,'root','gcc','9.1')
+        self.writeGcc('9.1.1')
+        mtime = os.stat(path).st_mtime + 10
+        os.utime(path,(mtime,mtime))
+
+        stdout,stderr = self.runCommand('bash','restore','dev')
+        self.assertTrue(stdout.find('GCC_VER="9.1.1"') != -1)
+        collection = envmastercollection.loadCollection('dev')
+        self.assertEqual(collection.final['GCC_VER'],'9.1.1')
+
+    def testChangedEnviron(self):
+        """
+        The modules are loaded as usual if the variables
+        they change aren't as they were when it was saved
+        """
+        self.runCommand('bash','save','dev','gcc','plain')
+        os.environ['PATH'] = '/bin'
+        self.runCommand('bash','restore','dev')
+        self.assertEqual(os.environ['PATH'],os.pathsep.join(['/opt/gcc/bin','/bin']))
+        self.assertEqual(os.environ['GCC_VER'],'9.1')
+
+    def testOtherShell(self):
+        """
+        Shells we don't save commands for load the modules
+        """
+        self.runCommand('bash','save','dev','gcc')
+        self.runCommand('python','restore','dev')
+        self.assertEqual(os.environ['GCC_VER'],'9.1')
+
+    def testErrors(self):
+        """
+        Bad names and collections that don't exist
+        """
+        self.assertRaises(envmasterexceptions.EnvMasterCollectionError,
+                    self.runCommand,'bash','save','.hidden','gcc')
+        self.assertRaises(envmasterexceptions.EnvMasterCollectionError,
+                    self.runCommand,'bash','restore','missing')
+
+if __name__ == '__main__':
+    unittest.main()
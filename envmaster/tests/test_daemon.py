@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+"""
+Tests for the daemon that runs commands for envmasterclient.py.
+See envmasterdaemon.
+
+    python tests/test_daemon.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import socket
+import marshal
+import unittest
+import threading
+
+from envmastertest import ModuleTreeTest
+from envmaster import envmasterconf
+from envmaster import envmasterdaemon
+
+class TestDaemon(ModuleTreeTest):
+    """
+    A daemon serving requests from a thread
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        self.oldtimeout = envmasterconf.DAEMON_CONNTIMEOUT
+        self.rootdir = self.writeModule('root','tool',
+                        ['module.setVar("yes","TOOL_LOADED")'])
+        self.sockpath = os.path.join(self.tmpdir,'sock','envmaster.sock')
+        self.daemon = envmasterdaemon.EnvMasterDaemon(self.sockpath)
+        self.daemon.listen()
+        self.thread = threading.Thread(target=self.daemon.serve)
+        self.thread.start()
+
+    def tearDown(self):
+        if self.thread.is_alive():
+            envmasterdaemon.sendRequest(('stop',),self.sockpath)
+            self.thread.join()
+        envmasterconf.DAEMON_CONNTIMEOUT = self.oldtimeout
+        ModuleTreeTest.tearDown(self)
+
+    def sendRaw(self,request):
+        """
+        Sends request (without the protocol number being
+        added) and returns the reply
+        """
+        sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+        sock.settimeout(30)
+        try:
+            sock.connect(self.sockpath)
+            sock.sendall(marshal.dumps(request))
+            sock.shutdown(socket.SHUT_WR)
+            reply = envmasterdaemon.readAll(sock)
+        finally:
+            sock.close()
+        return marshal.loads(reply)
+
+    def runRequest(self,argv):
+        """
+        Has the daemon run the command line argv in an
+        environment that can find the test modules
+        """
+        environ = dict(os.environ)
+        environ[envmasterconf.ENVMASTERPATH] = self.rootdir
+        return envmasterdaemon.sendRequest(('run',argv,environ,self.tmpdir),
+                        self.sockpath)
+
+    def testPing(self):
+        """
+        The daemon answers with its pid
+        """
+        reply = envmasterdaemon.sendRequest(('ping',),self.sockpath)
+        self.assertEqual(reply,('ok',os.getpid()))
+
+    def testStop(self):
+        """
+        The daemon exits and removes its socket
+        """
+        envmasterdaemon.sendRequest(('stop',),self.sockpath)
+        self.thread.join()
+        self.assertFalse(os.path.exists(self.sockpath))
+
+    def testRun(self):
+        """
+        A command is run with the environment it is sent
+        and what it writes is sent back
+        """
+        status,stdout,stderr = self.runRequest(['bash','load','tool'])[1:]
+        self.assertEqual(status,0)
+        self.assertTrue(stdout.find('TOOL_LOADED') != -1)
+        # the environment of the daemon is left alone
+        self.assertFalse('TOOL_LOADED' in os.environ)
+        self.assertFalse(envmasterconf.ENVMASTERPATH in os.environ)
+
+    def testError(self):
+        """
+        The exit status and message of a command that
+        fails are sent back
+        """
+        status,stdout,stderr = self.runRequest(['bash','load','nosuchmodule'])[1:]
+        self.assertEqual(status,1)
+        self.assertTrue(stderr.find('nosuchmodule') != -1)
+
+    def testExecRefused(self):
+        """
+        Commands that would replace the daemon aren't run
+        """
+        status,stdout,stderr = self.runRequest(['exec','tool','--','true'])[1:]
+        self.assertEqual(status,1)
+        self.assertTrue(stderr.find("can't be run by the daemon") != -1)
+
+    def testBadProtocol(self):
+        """
+        A client from a different version is told so
+        """
+        reply = self.sendRaw((envmasterdaemon.PROTOCOL + 1,'ping'))
+        self.assertEqual(reply,('badprotocol',envmasterdaemon.PROTOCOL))
+        reply = self.sendRaw((envmasterdaemon.PROTOCOL,'nosuchrequest'))
+        self.assertEqual(reply,('badrequest',))
+
+    def testStuckClient(self):
+        """
+        A client that never sends its request is dropped
+        after DAEMON_CONNTIMEOUT and the next one is served
+        """
+        envmasterconf.DAEMON_CONNTIMEOUT = 0.5
+        stuck = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+        stuck.settimeout(30)
+        try:
+            stuck.connect(self.sockpath)
+            reply = self.sendRaw((envmasterdaemon.PROTOCOL,'ping'))
+            self.assertEqual(reply,('ok',os.getpid()))
+            # closed without a reply
+            self.assertEqual(stuck.recv(1024),b'')
+        finally:
+            stuck.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+"""
+Tests for unloading modules by undoing what they did
+when they were loaded. See envmastereffects.
+
+    python tests/test_effects.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import unittest
+
+from envmastertest import ModuleTreeTest
+from envmaster import envmasterconf
+from envmaster import envmastereffects
+from envmaster import envmasterexceptions
+from envmaster import envmasterrecord
+
+class TestModuleEffects(unittest.TestCase):
+    """
+    The record kept in envmasterconf.EFFECTSENV
+    """
+    def testRoundTrip(self):
+        """
+        The same effects are read back, including
+        for modules that did nothing
+        """
+        effects = envmastereffects.ModuleEffects(None)
+        effects.set('tool',[(envmastereffects.VAREFFECT,'TOOL_VAR','a=b c'),
+                        (envmastereffects.PATHEFFECT,'PATH','/opt/tool/bin')])
+        effects.set('empty',[])
+        self.assertTrue(effects.changed)
+        readback = envmastereffects.ModuleEffects(effects.getValue())
+        self.assertEqual(readback.effects,effects.effects)
+        self.assertFalse(readback.changed)
+
+        readback.set('tool',None)
+        readback.set('empty',None)
+        self.assertEqual(readback.getValue(),'')
+        self.assertEqual(readback.get('tool'),None)
+
+    def testBadValue(self):
+        """
+        A value that can't be understood is no record
+        """
+        for value in ('',"rubbish!","cnViYmlzaA=="):
+            self.assertEqual(envmasterrecord.unpackRecords(value),[])
+            self.assertEqual(envmastereffects.ModuleEffects(value).effects,{})
+
+class TestEffectsUnload(ModuleTreeTest):
+    """
+    Unloading without running the module file
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        self.olduseeffects = envmasterconf.UNLOAD_FROM_EFFECTS
+        self.rootdir = self.writeModule('root','tool',
+                    ['module.setVar("/opt/app","APPHOME")',
+                    'module.setPath("$APPHOME/bin","TOOL_PATH")',
+                    'module.setVar("yes","TOOL_LOADED")'])
+        self.writeModule('root','checks',
+                    ['if module.isLoading():',
+                    '    module.setVar("yes","CHECKS_LOADED")'])
+        self.setPath('root')
+        os.environ['TOOL_PATH'] = '/usr/bin'
+
+    def tearDown(self):
+        envmasterconf.UNLOAD_FROM_EFFECTS = self.olduseeffects
+        ModuleTreeTest.tearDown(self)
+
+    def testRecorded(self):
+        """
+        What was set, with the variables expanded
+        """
+        self.runCommand('bash','load','tool')
+        effects = envmastereffects.ModuleEffects(os.environ[envmasterconf.EFFECTSENV])
+        self.assertEqual(effects.get('tool'),
+                    [(envmastereffects.VAREFFECT,'APPHOME','/opt/app'),
+                    (envmastereffects.PATHEFFECT,'TOOL_PATH','/opt/app/bin'),
+                    (envmastereffects.VAREFFECT,'TOOL_LOADED','yes')])
+
+        self.runCommand('bash','unload','tool')
+        effects = envmastereffects.ModuleEffects(os.environ.get(envmasterconf.EFFECTSENV))
+        self.assertEqual(effects.get('tool'),None)
+
+    def testDeleted(self):
+        """
+        A module can be unloaded after its file
+        is removed or changed
+        """
+        before = dict(os.environ)
+        self.runCommand('bash','load','tool')
+        self.assertEqual(os.environ['TOOL_PATH'],os.pathsep.join(['/opt/app/bin','/usr/bin']))
+        self.writeModule('root','tool',['module.setVar("yes","SOMETHING_ELSE")'])
+        self.runCommand('bash','unload','tool')
+        for var in ('APPHOME','TOOL_LOADED','SOMETHING_ELSE'):
+            self.assertFalse(var in os.environ,var)
+        self.assertEqual(os.environ['TOOL_PATH'],'/usr/bin')
+
+        self.runCommand('bash','load','tool')
+        os.remove(os.path.join(self.rootdir,'tool'))
+        self.runCommand('bash','unload','tool')
+        self.assertEqual(os.environ.get(envmasterconf.LOADEDMODULESENV,''),'')
+        self.assertFalse('TOOL_LOADED' in os.environ)
+        self.assertEqual(os.environ['TOOL_PATH'],before['TOOL_PATH'])
+
+    def testRun(self):
+        """
+        Module files that check whether they are loading
+        and ones loaded with recording turned off are run
+        """
+        self.runCommand('bash','load','checks')
+        effects = envmastereffects.ModuleEffects(os.environ.get(envmasterconf.EFFECTSENV))
+        self.assertEqual(effects.get('checks'),None)
+        os.remove(os.path.join(self.rootdir,'checks'))
+        self.assertRaises(envmasterexceptions.EnvMasterNoModule,
+                    self.runCommand,'bash','unload','checks')
+
+        envmasterconf.UNLOAD_FROM_EFFECTS = False
+        self.runCommand('bash','load','tool')
+        os.remove(os.path.join(self.rootdir,'tool'))
+        self.assertRaises(envmasterexceptions.EnvMasterNoModule,
+                    self.runCommand,'bash','unload','tool')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""
+Tests for what module files can do. See envmasterenv.
+
+    python tests/test_env.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+import unittest
+
+from envmastertest import ModuleTreeTest
+from envmaster import envmasterconf
+from envmaster import envmasterenv
+from envmaster import envmasterexceptions
+from envmaster import pyutils
+
+# where 'setup.py install --prefix' puts Python modules
+SITEPACKAGES = os.path.join('lib','python%d.%d' % sys.version_info[:2],'site-packages')
+
+class TestSetAll(ModuleTreeTest):
+    """
+    Working out the variables for an install
+    directory with setAll()
+    """
+    def setAll(self,prefix):
+        """
+        Returns the environment from loading a
+        module that calls setAll() on prefix
+        """
+        rootdir = self.writeModule('root','tool',['module.setAll(%r)' % prefix])
+        return pyutils.resolve(['tool'],{envmasterconf.ENVMASTERPATH : rootdir})
+
+    def testClassify(self):
+        """
+        Which subdirectories are there and whether
+        they have files or just subdirectories
+        """
+        prefix = self.makePrefix('prefix',['bin','lib/sub','include/sub'])
+        info = envmasterenv.classifyPrefix(prefix)
+        self.assertEqual(info['bin'],(True,True))
+        self.assertEqual(info['lib'],(False,True))
+        self.assertEqual(info['include'],(False,True))
+        self.assertEqual(info['lib64'],(False,False))
+        self.assertEqual(info[os.path.join('share','man')],(False,False))
+
+    def testRemembered(self):
+        """
+        A prefix is only looked at once until the
+        cache is cleared
+        """
+        prefix = self.makePrefix('prefix',['include'])
+        info = envmasterenv.classifyPrefix(prefix)
+        self.makePrefix('prefix',['bin'])
+        self.assertTrue(envmasterenv.classifyPrefix(prefix) is info)
+        self.assertEqual(info['bin'],(False,False))
+
+        envmasterenv.clearPrefixCache()
+        self.assertEqual(envmasterenv.classifyPrefix(prefix)['bin'],(True,True))
+
+    def testLayout(self):
+        """
+        The usual directories
+        """
+        prefix = self.makePrefix('prefix',['bin','lib','include',
+                        os.path.join('share','man','man1'),SITEPACKAGES])
+        result = self.setAll(prefix)
+        self.assertEqual(result['TOOL_ROOT'],prefix)
+        self.assertEqual(result['TOOL_BIN_PATH'],os.path.join(prefix,'bin'))
+        self.assertEqual(result[envmasterconf.PATH].split(os.pathsep)[0],
+                        os.path.join(prefix,'bin'))
+        self.assertEqual(result[envmasterconf.LIBPATH].split(os.pathsep)[0],
+                        os.path.join(prefix,'lib'))
+        self.assertEqual(result['TOOL_INCLUDE_PATH'],os.path.join(prefix,'include'))
+        self.assertEqual(result['TOOL_MAN_PATH'],os.path.join(prefix,'share','man'))
+        self.assertEqual(result[envmasterconf.PYPATH].split(os.pathsep)[0],
+                        os.path.join(prefix,SITEPACKAGES))
+        self.assertFalse(envmasterconf.CMAKEPATH in result)
+
+    def testLib64(self):
+        """
+        lib64 is used if lib has no files, and bin is
+        skipped if it only has subdirectories
+        """
+        prefix = self.makePrefix('prefix',['bin/sub','lib/sub','lib64'])
+        result = self.setAll(prefix)
+        self.assertFalse('TOOL_BIN_PATH' in result)
+        self.assertEqual(result['TOOL_LIB_PATH'],os.path.join(prefix,'lib64'))
+
+    def testPkgConfigAndCMake(self):
+        """
+        All the pkg-config directories are added and
+        the prefix is added for CMake
+        """
+        prefix = self.makePrefix('prefix',['lib/pkgconfig','share/pkgconfig',
+                        'lib/cmake/tool'])
+        result = self.setAll(prefix)
+        self.assertEqual(result[envmasterconf.PKGCONFIGPATH].split(os.pathsep)[:2],
+                        [os.path.join(prefix,'share','pkgconfig'),
+                        os.path.join(prefix,'lib','pkgconfig')])
+        self.assertEqual(result[envmasterconf.CMAKEPATH].split(os.pathsep)[0],prefix)
+
+    def testMissing(self):
+        """
+        An error if the prefix doesn't exist
+        """
+        self.assertRaises(envmasterexceptions.EnvMasterPathException,
+                    self.setAll,os.path.join(self.tmpdir,'missing'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+Tests for running a command or shell with modules
+loaded. See EnvMasterFile.execCommand().
+
+    python tests/test_exec.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+import unittest
+import subprocess
+
+from envmastertest import ModuleTreeTest
+from envmaster import envmasterconf
+from envmaster import envmasterexceptions
+
+# the top of the source tree
+SRCDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# prints the variables given on the command line
+PRINTVARS = """
+import os
+import sys
+for var in sys.argv[1:]:
+    print('%s=%s' % (var,os.environ.get(var)))
+"""
+
+class TestExec(ModuleTreeTest):
+    """
+    The exec and shell actions replace envmastercmd.py
+    so these run it in a new interpreter
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        self.bindir = os.path.join(self.tmpdir,'prefix','bin')
+        script = self.writeFile(os.path.join('prefix','bin','toolcmd'),
+                    ['#!/bin/sh','echo "toolcmd $TOOL_LOADED"'])
+        os.chmod(script,0o755)
+        self.rootdir = self.writeModule('root','tool',
+                    ['module.setVar("yes","TOOL_LOADED")',
+                    'module.setPath(%r,"PATH")' % self.bindir])
+
+    def runExec(self,argv,stdin=None,extraenv=None):
+        """
+        Runs envmastercmd.py with argv. Returns stdout.
+        """
+        env = dict(os.environ)
+        env[envmasterconf.ENVMASTERPATH] = self.rootdir
+        env['PYTHONPATH'] = SRCDIR
+        if extraenv is not None:
+            env.update(extraenv)
+        proc = subprocess.Popen([sys.executable,os.path.join(SRCDIR,'scripts','envmastercmd.py')] + argv,
+                    env=env,stdin=subprocess.PIPE,stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,universal_newlines=True)
+        stdout,stderr = proc.communicate(stdin)
+        self.assertEqual(proc.returncode,0,stderr)
+        return stdout
+
+    def testExec(self):
+        """
+        The command sees the modules but not
+        EnvMaster's own records
+        """
+        printvars = ['TOOL_LOADED',envmasterconf.LOADEDMODULESENV] + list(envmasterconf.RECORDVARS)
+        stdout = self.runExec(['exec','tool','--',sys.executable,'-c',PRINTVARS] + printvars)
+        lines = stdout.splitlines()
+        self.assertEqual(lines[0],'TOOL_LOADED=yes')
+        self.assertEqual(lines[1],'%s=tool' % envmasterconf.LOADEDMODULESENV)
+        for var,line in zip(envmasterconf.RECORDVARS,lines[2:]):
+            self.assertEqual(line,'%s=None' % var)
+
+    def testPath(self):
+        """
+        The command is found using the new PATH
+        """
+        self.assertEqual(self.runExec(['exec','tool','--','toolcmd']),'toolcmd yes\n')
+
+    def testShell(self):
+        """
+        The user's shell is run with the modules loaded
+        """
+        stdout = self.runExec(['shell','tool'],'echo "$TOOL_LOADED $ENVMASTERLOADED"\n',
+                    {'SHELL' : '/bin/sh'})
+        self.assertEqual(stdout,'yes tool\n')
+
+    def testErrors(self):
+        """
+        Commands that can't be run and ones given
+        through a shell alias
+        """
+        self.setPath('root')
+        self.assertRaises(envmasterexceptions.EnvMasterExecError,self.runCommand,
+                    'exec','tool','--',os.path.join(self.tmpdir,'nothing'))
+        # no command
+        self.assertRaises(SystemExit,self.runCommand,'exec','tool','--')
+        self.assertRaises(SystemExit,self.runCommand,'exec','tool')
+        # the alias would evaluate whatever was written out
+        self.assertRaises(envmasterexceptions.EnvMasterExecError,self.runCommand,
+                    'tcsh','exec','tool','--','toolcmd')
+        self.assertRaises(envmasterexceptions.EnvMasterExecError,self.runCommand,
+                    'tcsh','shell','tool')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+"""
+Tests for the index of each directory in ENVMASTERPATH
+written by 'envmaster index build'. See envmasterindex.
+
+    python tests/test_index.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import unittest
+
+from envmastertest import ModuleTreeTest
+from envmaster import envmasterconf
+from envmaster import envmasterexceptions
+from envmaster import envmasterfile
+from envmaster import envmasterindex
+
+class TestRootIndex(ModuleTreeTest):
+    """
+    Answers from the index are the same as
+    from looking at the module files
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        # the resolution cache would answer first
+        os.environ[envmasterconf.NOCACHEENV] = '1'
+        for version in ('9.1','10.2','12.2'):
+            self.writeModule('root','gcc/%s' % version,[])
+        self.writeModule('root','netcdf/4.8',[])
+        self.writeModule('root','netcdf/4.9',[])
+        self.writeModule('root','netcdf/version.py',['version = "4.8"'])
+        self.writeModule('root','plain',[])
+        self.writeFile(os.path.join('root','notmodule'),['not a module file'])
+        self.rootdir = os.path.join(self.tmpdir,'root')
+        self.setPath('root')
+
+    def buildIndex(self):
+        """
+        Runs 'index build' and returns the index
+        """
+        stdout,stderr = self.runCommand('bash','index','build')
+        indexpath = os.path.join(self.rootdir,envmasterconf.INDEXFILE)
+        self.assertEqual(stderr,'Wrote %s\n' % indexpath)
+        envmasterindex.clearRootIndexes()
+        return envmasterindex.getRootIndex(self.rootdir)
+
+    def liveFile(self):
+        """
+        Returns an EnvMasterFile that doesn't use the index
+        """
+        modfile = envmasterfile.EnvMasterFile()
+        modfile.useindex = False
+        return modfile
+
+    def testSame(self):
+        """
+        Finding modules, versions and defaults
+        """
+        index = self.buildIndex()
+        self.assertTrue(index is not None)
+        modfile = envmasterfile.EnvMasterFile()
+        self.assertTrue(modfile.getRootIndex(self.rootdir) is index)
+        live = self.liveFile()
+        for modname in ('gcc','netcdf','plain',os.path.join('gcc','10.2'),
+                    os.path.join('gcc','<12'),os.path.join('netcdf','4.9'),
+                    os.path.join('gcc','8.0'),'missing'):
+            self.assertEqual(modfile.getModule(modname),live.getModule(modname),modname)
+        self.assertEqual(index.findModule('gcc'),
+                    (os.path.join('gcc','12.2'),os.path.join(self.rootdir,'gcc','12.2')))
+        self.assertEqual(index.findModule('missing'),(None,None))
+        self.assertEqual(index.getDefault('netcdf'),os.path.join('netcdf','4.8'))
+        self.assertEqual(index.getVersionIndex('gcc').versions,['9.1','10.2','12.2'])
+        self.assertEqual(index.getAvailModules(),live.findAvailModules(self.rootdir))
+        self.assertEqual(index.isValid('notmodule',None,None),None)
+        self.assertFalse(index.getEntry('notmodule').valid)
+
+    def testStale(self):
+        """
+        The index isn't used once something is added
+        to the directory
+        """
+        self.buildIndex()
+        self.writeModule('root','newmod',[])
+        indexpath = os.path.join(self.rootdir,envmasterconf.INDEXFILE)
+        mtime = os.stat(indexpath).st_mtime - 10
+        os.utime(indexpath,(mtime,mtime))
+        envmasterindex.clearRootIndexes()
+        self.assertEqual(envmasterindex.getRootIndex(self.rootdir),None)
+        self.assertEqual(envmasterfile.EnvMasterFile().getModule('newmod')[0],'newmod')
+        # but can still be used for the sentinel checks
+        self.assertTrue(envmasterindex.openRootIndex(self.rootdir,True) is not None)
+
+    def testDynamicDefault(self):
+        """
+        A default from a version file that has to
+        be run isn't in the index
+        """
+        self.writeModule('root','gcc/version.py',
+                    ['import os','version = os.getenv("GCC_VERSION","9.1")'])
+        index = self.buildIndex()
+        self.assertEqual(index.getDefault('gcc'),None)
+        os.environ['GCC_VERSION'] = '10.2'
+        self.assertEqual(envmasterfile.EnvMasterFile().getModule('gcc')[0],
+                    os.path.join('gcc','10.2'))
+
+    def testCorrupt(self):
+        """
+        A file that isn't an index is ignored
+        """
+        self.writeFile(os.path.join('root',envmasterconf.INDEXFILE),['rubbish'])
+        envmasterindex.clearRootIndexes()
+        self.assertEqual(envmasterindex.getRootIndex(self.rootdir),None)
+        self.assertEqual(envmasterfile.EnvMasterFile().getModule('plain')[0],'plain')
+
+    def testNotDirectory(self):
+        """
+        Only directories can be indexed
+        """
+        self.assertRaises(envmasterexceptions.EnvMasterIndexError,self.runCommand,
+                    'bash','index','build',os.path.join(self.tmpdir,'nothing'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+"""
+Tests for keeping track of the loaded modules.
+See envmasterloaded.
+
+    python tests/test_loaded.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import unittest
+
+from envmastertest import ModuleTreeTest
+from envmaster import envmasterconf
+from envmaster import envmasterenviron
+from envmaster import envmasterexceptions
+from envmaster import envmasterloaded
+
+def joinNames(*fullnames):
+    """
+    Returns the value of ENVMASTERLOADED for fullnames
+    """
+    return os.pathsep.join([fullname.replace('/',os.sep) for fullname in fullnames])
+
+class TestLoadedModules(ModuleTreeTest):
+    """
+    The parsed list of loaded modules
+    """
+    def testParse(self):
+        """
+        Lookups by full name and by name
+        """
+        loaded = envmasterloaded.LoadedModules(joinNames('gcc/12.2','plain','gcc/9.1'))
+        self.assertEqual(len(loaded),3)
+        self.assertTrue(loaded.isLoaded(joinNames('gcc/9.1')))
+        self.assertFalse(loaded.isLoaded(joinNames('gcc/10.1')))
+        self.assertEqual(loaded.getVersions('gcc'),['12.2','9.1'])
+        self.assertEqual(loaded.getVersions('plain'),[None])
+        self.assertEqual(loaded.getVersions('other'),[])
+
+    def testEmpty(self):
+        """
+        Nothing loaded
+        """
+        for value in (None,''):
+            loaded = envmasterloaded.LoadedModules(value)
+            self.assertEqual(len(loaded),0)
+            self.assertEqual(loaded.findLoaded('gcc'),None)
+
+    def testFindLoaded(self):
+        """
+        Finding the loaded module that matches a name
+        with or without a version or a version spec
+        """
+        loaded = envmasterloaded.LoadedModules(joinNames('gcc/12.2','plain','gcc/9.1'))
+        self.assertEqual(loaded.findLoaded('gcc'),joinNames('gcc/12.2'))
+        self.assertEqual(loaded.findLoaded(joinNames('gcc/9.1')),joinNames('gcc/9.1'))
+        self.assertEqual(loaded.findLoaded(joinNames('gcc/10.1')),None)
+        self.assertEqual(loaded.findLoaded(joinNames('gcc/<10')),joinNames('gcc/9.1'))
+        self.assertEqual(loaded.findLoaded(joinNames('gcc/>=13')),None)
+        self.assertEqual(loaded.findLoaded('plain'),'plain')
+        self.assertEqual(loaded.findLoaded('other'),None)
+
+    def testAddedRemoved(self):
+        """
+        Updates as modules are loaded and unloaded
+        """
+        loaded = envmasterloaded.LoadedModules(joinNames('plain'))
+        value = joinNames('gcc/9.1','plain')
+        loaded.added(joinNames('gcc/9.1'),value)
+        self.assertEqual(loaded.getFullNames(),[joinNames('gcc/9.1'),'plain'])
+        self.assertEqual(loaded.findLoaded('gcc'),joinNames('gcc/9.1'))
+
+        loaded.removed('plain',joinNames('gcc/9.1'))
+        self.assertEqual(loaded.getFullNames(),[joinNames('gcc/9.1')])
+        self.assertEqual(loaded.findLoaded('plain'),None)
+        # not loaded - ignored
+        loaded.removed('other',joinNames('gcc/9.1'))
+        self.assertEqual(len(loaded),1)
+
+    def testSync(self):
+        """
+        The shared instance is only rebuilt when the
+        variable is changed by someone else
+        """
+        environ = envmasterenviron.DictEnviron(
+                {envmasterconf.LOADEDMODULESENV : joinNames('plain')})
+        loaded = envmasterloaded.getLoadedModules(environ)
+        self.assertTrue(envmasterloaded.getLoadedModules(environ) is loaded)
+        self.assertEqual(loaded.getFullNames(),['plain'])
+
+        environ.set(envmasterconf.LOADEDMODULESENV,joinNames('gcc/9.1'))
+        loaded = envmasterloaded.getLoadedModules(environ)
+        self.assertEqual(loaded.getFullNames(),[joinNames('gcc/9.1')])
+
+    def testLoadUnload(self):
+        """
+        The registry follows modules loaded and unloaded
+        """
+        self.writeModule('root','gcc/9.1',[])
+        self.writeModule('root','gcc/12.2',[])
+        self.writeModule('root','plain',['module.conflict("gcc")'])
+        self.setPath('root')
+
+        self.runCommand('bash','load','gcc')
+        loaded = envmasterloaded.getLoadedModules()
+        self.assertEqual(loaded.getFullNames(),[joinNames('gcc/12.2')])
+        self.assertRaises(envmasterexceptions.EnvMasterConflictFailed,
+                    self.runCommand,'bash','load','plain')
+
+        self.runCommand('bash','unload','gcc')
+        self.runCommand('bash','load','plain')
+        loaded = envmasterloaded.getLoadedModules()
+        self.assertEqual(loaded.getFullNames(),['plain'])
+        self.assertEqual(os.environ[envmasterconf.LOADEDMODULESENV],'plain')
+
+if __name__ == '__main__':
+    unittest.main()
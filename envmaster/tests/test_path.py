@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""
+Tests for path variables and which modules added each
+entry. See envmasterpath.
+
+    python tests/test_path.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import unittest
+
+from envmastertest import ModuleTreeTest
+from envmaster import envmasterpath
+
+def joinPath(*entries):
+    """
+    Returns the value of a path variable with entries
+    """
+    return os.pathsep.join(entries)
+
+class TestPathList(unittest.TestCase):
+    """
+    The entries of one path variable
+    """
+    def testPrepend(self):
+        """
+        New entries go at the front and existing
+        ones are moved there
+        """
+        pathlist = envmasterpath.PathList(joinPath('/a','/b'))
+        pathlist.prepend('/c')
+        self.assertEqual(pathlist.getValue(),joinPath('/c','/a','/b'))
+        pathlist.prepend('/b')
+        self.assertEqual(pathlist.getValue(),joinPath('/b','/c','/a'))
+        self.assertEqual(len(pathlist),3)
+        self.assertTrue('/a' in pathlist)
+
+    def testRemove(self):
+        """
+        Only the first copy of an entry is removed
+        """
+        pathlist = envmasterpath.PathList(joinPath('/a','/b','/a'))
+        pathlist.remove('/a')
+        self.assertEqual(pathlist.getValue(),joinPath('/b','/a'))
+        self.assertTrue('/a' in pathlist)
+        pathlist.remove('/a')
+        self.assertFalse('/a' in pathlist)
+        pathlist.remove('/missing')
+        self.assertEqual(pathlist.getValue(),'/b')
+
+    def testEmpty(self):
+        """
+        Variables that are unset or empty
+        """
+        for value in (None,''):
+            pathlist = envmasterpath.PathList(value)
+            self.assertEqual(len(pathlist),0)
+            pathlist.prepend('/a')
+            self.assertEqual(pathlist.getValue(),'/a')
+
+class TestPathRefs(ModuleTreeTest):
+    """
+    Entries shared by more than one module
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        self.writeModule('root','one',['module.setPath("/opt/shared/bin","PATH")',
+                        'module.setPath("/opt/one/bin","PATH")'])
+        self.writeModule('root','two',['module.setPath("/opt/shared/bin","PATH")'])
+        self.writeModule('root','system',['module.setPath("/usr/bin","PATH")'])
+        self.setPath('root')
+        os.environ['PATH'] = joinPath('/usr/bin','/bin')
+
+    def testRecords(self):
+        """
+        The owners of each entry are saved and read back
+        """
+        refs = envmasterpath.PathRefs(None)
+        refs.addOwner('PATH','/opt/shared/bin','one',False)
+        refs.addOwner('PATH','/opt/shared/bin','two',True)
+        refs.addOwner('PATH','/usr/bin','one',True)
+        self.assertTrue(refs.changed)
+
+        refs = envmasterpath.PathRefs(refs.getValue())
+        self.assertTrue(refs.removeOwner('PATH','/opt/shared/bin','one'))
+        self.assertFalse(refs.removeOwner('PATH','/opt/shared/bin','two'))
+        # was there before
+        self.assertTrue(refs.removeOwner('PATH','/usr/bin','one'))
+        # not ours
+        self.assertFalse(refs.removeOwner('PATH','/opt/other','one'))
+        self.assertEqual(refs.getValue(),'')
+
+    def testShared(self):
+        """
+        An entry stays until the last module that
+        added it is unloaded
+        """
+        self.runCommand('bash','load','one','two')
+        self.assertEqual(os.environ['PATH'],
+                    joinPath('/opt/shared/bin','/opt/one/bin','/usr/bin','/bin'))
+
+        self.runCommand('bash','unload','one')
+        self.assertEqual(os.environ['PATH'],joinPath('/opt/shared/bin','/usr/bin','/bin'))
+        self.runCommand('bash','unload','two')
+        self.assertEqual(os.environ['PATH'],joinPath('/usr/bin','/bin'))
+
+    def testExternal(self):
+        """
+        An entry that was there before the module added
+        it is left when the module is unloaded
+        """
+        self.runCommand('bash','load','system')
+        self.assertEqual(os.environ['PATH'],joinPath('/usr/bin','/bin'))
+        self.runCommand('bash','unload','system')
+        self.assertEqual(os.environ['PATH'],joinPath('/usr/bin','/bin'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""
+Tests that modules loaded by module.load() calls are run
+when the module file gets to the call (not before it) so they
+see what it has done so far. See envmasterplan.
+
+    python tests/test_plan.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import unittest
+
+from envmastertest import ModuleTreeTest
+from envmaster import envmasterconf
+from envmaster import envmasterexceptions
+from envmaster import envmasterplan
+from envmaster import pyutils
+
+class TestInlineLoad(ModuleTreeTest):
+    """
+    Module files that change the environment before calling
+    module.load()
+    """
+    def testLoadAfterSetPath(self):
+        """
+        A module only found once the parent has added
+        its directory to ENVMASTERPATH
+        """
+        privdir = self.writeModule('priv','privmod',
+                        ['module.setVar("yes","PRIVMOD_LOADED")'])
+        rootdir = self.writeModule('root','parent',
+                        ['module.setPath(%r,"ENVMASTERPATH")' % privdir,
+                        'module.load("privmod")'])
+
+        result = pyutils.resolve(['parent'],{'ENVMASTERPATH' : rootdir})
+        self.assertEqual(result['PRIVMOD_LOADED'],'yes')
+        self.assertEqual(result['ENVMASTERLOADED'],'privmod:parent')
+
+    def testLoadAfterSetVar(self):
+        """
+        A module that uses a variable the parent sets
+        before loading it
+        """
+        self.writeModule('root','child',
+                        ['module.setVar("$APPHOME/child","CHILD_HOME")'])
+        rootdir = self.writeModule('root','parent',
+                        ['module.setVar("/opt/app","APPHOME")',
+                        'module.load("child")'])
+
+        result = pyutils.resolve(['parent'],{'ENVMASTERPATH' : rootdir})
+        self.assertEqual(result['CHILD_HOME'],'/opt/app/child')
+        self.assertEqual(result['ENVMASTERLOADED'],'child:parent')
+
+    def testLoadShadowed(self):
+        """
+        A module that is also in the old search path comes
+        from the directory the parent has added
+        """
+        privdir = self.writeModule('priv','shared',
+                        ['module.setVar("priv","SHARED_FROM")'])
+        self.writeModule('root','shared',['module.setVar("root","SHARED_FROM")'])
+        rootdir = self.writeModule('root','parent',
+                        ['module.setPath(%r,"ENVMASTERPATH")' % privdir,
+                        'module.load("shared")'])
+
+        result = pyutils.resolve(['parent'],{'ENVMASTERPATH' : rootdir})
+        self.assertEqual(result['SHARED_FROM'],'priv')
+
+class TestLoadPlanner(ModuleTreeTest):
+    """
+    Finding everything that will be loaded up front
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        self.oldautoload = envmasterconf.PLAN_AUTOLOAD_PREREQS
+
+    def tearDown(self):
+        envmasterconf.PLAN_AUTOLOAD_PREREQS = self.oldautoload
+        ModuleTreeTest.tearDown(self)
+
+    def testWrittenOrder(self):
+        """
+        Modules loaded by module.load() are run in the order
+        the file is written and after what comes before them
+        """
+        self.writeModule('root','first',['module.setVar("$ORDER:first","ORDER")'])
+        self.writeModule('root','second',['module.setVar("$ORDER:second","ORDER")'])
+        rootdir = self.writeModule('root','parent',
+                        ['module.setVar("parent","ORDER")',
+                        'module.load("first")',
+                        'module.load("second")'])
+
+        result = pyutils.resolve(['parent'],{'ENVMASTERPATH' : rootdir})
+        self.assertEqual(result['ORDER'],'parent:first:second')
+
+    def testPrereqRunFirst(self):
+        """
+        A module named in a module.prereq() call is
+        run first if it is in the same load
+        """
+        self.writeModule('root','compiler',['module.setVar("1","COMPILER")'])
+        rootdir = self.writeModule('root','library',
+                        ['module.prereq("compiler")',
+                        'module.setVar("1","LIBRARY")'])
+
+        result = pyutils.resolve(['library','compiler'],{'ENVMASTERPATH' : rootdir})
+        self.assertEqual(result['ENVMASTERLOADED'],'library:compiler')
+
+    def testAutoloadPrereqs(self):
+        """
+        The first module named in an unsatisfied module.prereq()
+        is loaded if PLAN_AUTOLOAD_PREREQS is set
+        """
+        self.writeModule('root','compiler',['module.setVar("1","COMPILER")'])
+        rootdir = self.writeModule('root','library',
+                        ['module.prereq("compiler","othercompiler")'])
+
+        envmasterconf.PLAN_AUTOLOAD_PREREQS = False
+        self.assertRaises(envmasterexceptions.EnvMasterPrereqFailed,
+                pyutils.resolve,['library'],{'ENVMASTERPATH' : rootdir})
+
+        envmasterconf.PLAN_AUTOLOAD_PREREQS = True
+        result = pyutils.resolve(['library'],{'ENVMASTERPATH' : rootdir})
+        self.assertEqual(result['COMPILER'],'1')
+
+    def testCycle(self):
+        """
+        Module files that load each other are an
+        error before anything is run
+        """
+        self.writeModule('root','one',['module.load("two")'])
+        rootdir = self.writeModule('root','two',['module.load("one")'])
+
+        self.assertRaises(envmasterexceptions.EnvMasterCycleError,
+                pyutils.resolve,['one'],{'ENVMASTERPATH' : rootdir})
+
+    def testScannedOnce(self):
+        """
+        Each module file is only scanned once however many
+        module.load() calls there are for it
+        """
+        self.writeModule('root','shared',['module.setVar("1","SHARED")'])
+        self.writeModule('root','left',['module.load("shared")'])
+        self.writeModule('root','right',['module.load("shared")'])
+        rootdir = self.writeModule('root','parent',
+                        ['module.load("left")','module.load("right")'])
+
+        scanned = []
+        getDependencies = envmasterplan.getDependencies
+        def countingGetDependencies(path):
+            scanned.append(os.path.basename(path))
+            return getDependencies(path)
+        envmasterplan.getDependencies = countingGetDependencies
+        try:
+            result = pyutils.resolve(['parent'],{'ENVMASTERPATH' : rootdir})
+        finally:
+            envmasterplan.getDependencies = getDependencies
+        self.assertEqual(result['SHARED'],'1')
+        self.assertEqual(sorted(scanned),['left','parent','right','shared'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+"""
+Tests for finding, scanning and compiling modules in
+the background. See envmasterprefetch.
+
+    python tests/test_prefetch.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import threading
+import unittest
+
+from envmastertest import ModuleTreeTest
+from envmaster import envmasterconf
+from envmaster import envmasterexceptions
+from envmaster import envmasterfile
+from envmaster import envmasterplan
+from envmaster import envmasterprefetch
+
+class TestPrefetcher(unittest.TestCase):
+    """
+    The pool of threads that run jobs ahead
+    """
+    def setUp(self):
+        self.calls = []
+
+    def job(self,value):
+        """
+        Records the call and returns value
+        """
+        self.calls.append((value,threading.current_thread().name))
+        return value
+
+    def testGet(self):
+        """
+        Each job is run once and get() returns its result
+        """
+        prefetcher = envmasterprefetch.Prefetcher(2)
+        try:
+            prefetcher.submit('a',self.job,1)
+            prefetcher.submit('a',self.job,2)
+            self.assertEqual(prefetcher.get('a',self.job,3),1)
+            self.assertEqual(prefetcher.get('a',self.job,3),1)
+            # never submitted so run here
+            self.assertEqual(prefetcher.get('b',self.job,4),4)
+        finally:
+            prefetcher.close()
+        self.assertEqual([value for value,name in self.calls],[1,4])
+
+    def testBackground(self):
+        """
+        Jobs run in the threads while the caller
+        does something else
+        """
+        started = threading.Event()
+        release = threading.Event()
+        def slowJob():
+            started.set()
+            release.wait(10)
+            return threading.current_thread().name
+        prefetcher = envmasterprefetch.Prefetcher(1)
+        try:
+            prefetcher.submit('slow',slowJob)
+            self.assertTrue(started.wait(10))
+            release.set()
+            self.assertNotEqual(prefetcher.get('slow',slowJob),
+                        threading.current_thread().name)
+        finally:
+            prefetcher.close()
+
+    def testNoThreads(self):
+        """
+        Without threads get() runs the job itself
+        """
+        prefetcher = envmasterprefetch.Prefetcher(0)
+        prefetcher.submit('a',self.job,1)
+        self.assertEqual(prefetcher.get('a',self.job,1),1)
+        prefetcher.close()
+        self.assertEqual(self.calls,[(1,threading.current_thread().name)])
+
+    def testError(self):
+        """
+        An exception from a job is raised by get()
+        """
+        def failJob():
+            raise envmasterexceptions.EnvMasterNoModules('no such module')
+        prefetcher = envmasterprefetch.Prefetcher(1)
+        try:
+            prefetcher.submit('fail',failJob)
+            self.assertRaises(envmasterexceptions.EnvMasterNoModules,
+                        prefetcher.get,'fail',failJob)
+        finally:
+            prefetcher.close()
+
+    def testClosed(self):
+        """
+        Jobs dropped by close() are run by get()
+        """
+        prefetcher = envmasterprefetch.Prefetcher(0)
+        prefetcher.submit('a',self.job,1)
+        prefetcher.close()
+        prefetcher.submit('b',self.job,2)
+        self.assertEqual(prefetcher.get('a',self.job,1),1)
+        self.assertEqual(prefetcher.get('b',self.job,2),2)
+        self.assertEqual([value for value,name in self.calls],[1,2])
+
+class TestPrefetchedLoad(ModuleTreeTest):
+    """
+    Loads give the same result with and without
+    the background threads
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        self.oldthreads = envmasterconf.PREFETCH_THREADS
+        self.writeModule('priv','shared',['module.setVar("priv","SHARED_FROM")'])
+        self.writeModule('root','shared',['module.setVar("root","SHARED_FROM")'])
+        for n in range(10):
+            self.writeModule('root','mod%d' % n,
+                        ['module.load("lib%d")' % (n % 3),
+                        'module.setPath("/opt/mod%d/bin","MODS_PATH")' % n])
+        for n in range(3):
+            self.writeModule('root','lib%d' % n,['module.setVar("%d","LIB%d")' % (n,n)])
+        privdir = os.path.join(self.tmpdir,'priv')
+        self.writeModule('root','parent',
+                    ['module.setPath(%r,"ENVMASTERPATH")' % privdir,
+                    'module.load("shared")'])
+        self.setPath('root')
+
+    def tearDown(self):
+        envmasterconf.PREFETCH_THREADS = self.oldthreads
+        ModuleTreeTest.tearDown(self)
+
+    def loadWith(self,nthreads,modnames):
+        """
+        Loads modnames with nthreads prefetch threads and
+        returns the env0 output. The environment is put back.
+        """
+        envmasterconf.PREFETCH_THREADS = nthreads
+        before = dict(os.environ)
+        try:
+            return self.runEnv0('load',*modnames)
+        finally:
+            os.environ.clear()
+            os.environ.update(before)
+
+    def testSame(self):
+        """
+        The modules are run in the same order
+        """
+        modnames = ['mod%d' % n for n in range(10)]
+        self.assertEqual(self.loadWith(4,modnames),self.loadWith(0,modnames))
+
+    def testSearchPath(self):
+        """
+        A module found after ENVMASTERPATH changes
+        comes from the new search path
+        """
+        values = self.loadWith(4,['shared','parent'])
+        self.assertEqual(values['SHARED_FROM'],'root')
+        values = self.loadWith(4,['parent'])
+        self.assertEqual(values['SHARED_FROM'],'priv')
+
+    def testFindKey(self):
+        """
+        Finds with different search paths are different jobs
+        """
+        modfile = envmasterfile.EnvMasterFile()
+        other = envmasterfile.EnvMasterFile()
+        other.modpaths = [os.path.join(self.tmpdir,'priv')] + other.modpaths
+        self.assertNotEqual(envmasterplan.findKey(modfile,'shared'),
+                    envmasterplan.findKey(other,'shared'))
+        self.assertEqual(envmasterplan.findKey(modfile,'shared'),
+                    envmasterplan.findKey(envmasterfile.EnvMasterFile(),'shared'))
+
+    def testError(self):
+        """
+        A missing module is reported as before
+        """
+        envmasterconf.PREFETCH_THREADS = 4
+        self.assertRaises(envmasterexceptions.EnvMasterNoModule,
+                    self.runCommand,'bash','load','mod1','missing')
+
+if __name__ == '__main__':
+    unittest.main()
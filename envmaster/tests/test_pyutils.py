@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+"""
+Tests for loading modules into a Python program.
+See pyutils.
+
+    python tests/test_pyutils.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+import unittest
+import threading
+
+from envmastertest import ModuleTreeTest
+from envmaster import envmasterconf
+from envmaster import envmasterenviron
+from envmaster import envmasterexceptions
+from envmaster import pyutils
+
+class TestTransaction(ModuleTreeTest):
+    """
+    Loads that can be rolled back
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        self.pydir = os.path.join(self.tmpdir,'pylib')
+        self.writeModule('root','tool',['module.setVar("yes","TOOL_LOADED")',
+                    'module.setPath(%r,"PYTHONPATH")' % self.pydir])
+        self.writeModule('root','other',['module.setVar("yes","OTHER_LOADED")'])
+        self.writeModule('root','broken',['module.setVar("yes","BROKEN_VAR")',
+                    'module.load("missing")'])
+        self.setPath('root')
+        os.environ['UNTOUCHED'] = 'before'
+
+    def testRollback(self):
+        """
+        Only the changed variables and sys.path are put back
+        """
+        before = dict(os.environ)
+        transaction = pyutils.Transaction()
+        transaction.load('tool')
+        self.assertEqual(os.environ['TOOL_LOADED'],'yes')
+        self.assertTrue(self.pydir in sys.path)
+        # a change made outside the transaction is kept
+        os.environ['UNTOUCHED'] = 'after'
+        transaction.rollback()
+        self.assertFalse('TOOL_LOADED' in os.environ)
+        self.assertFalse(self.pydir in sys.path)
+        self.assertEqual(os.environ['UNTOUCHED'],'after')
+        del before['UNTOUCHED']
+        del os.environ['UNTOUCHED']
+        self.assertEqual(dict(os.environ),before)
+
+    def testCommit(self):
+        """
+        A rollback after a commit only undoes what
+        came after it
+        """
+        transaction = pyutils.Transaction()
+        transaction.load('tool')
+        transaction.commit()
+        transaction.load('other')
+        transaction.rollback()
+        self.assertEqual(os.environ['TOOL_LOADED'],'yes')
+        self.assertFalse('OTHER_LOADED' in os.environ)
+
+    def testWith(self):
+        """
+        Committed at the end of the block unless
+        an exception is raised
+        """
+        with pyutils.Transaction() as transaction:
+            transaction.load('tool')
+        self.assertEqual(os.environ['TOOL_LOADED'],'yes')
+
+        try:
+            with pyutils.Transaction() as transaction:
+                transaction.load('other')
+                raise ValueError('stop')
+        except ValueError:
+            pass
+        self.assertFalse('OTHER_LOADED' in os.environ)
+        self.assertEqual(os.environ['TOOL_LOADED'],'yes')
+
+    def testFailed(self):
+        """
+        Nothing is left loaded when one module fails
+        """
+        before = dict(os.environ)
+        self.assertRaises(envmasterexceptions.EnvMasterException,
+                    pyutils.load,'tool','broken')
+        self.assertEqual(dict(os.environ),before)
+        self.assertFalse(self.pydir in sys.path)
+
+        pyutils.load('tool')
+        self.assertRaises(envmasterexceptions.EnvMasterException,
+                    pyutils.unload,'tool','other')
+        self.assertEqual(os.environ['TOOL_LOADED'],'yes')
+        self.assertTrue(self.pydir in sys.path)
+
+    def testLoaded(self):
+        """
+        Loaded only for the duration of the with statement
+        """
+        before = dict(os.environ)
+        with pyutils.loaded('tool','other'):
+            self.assertEqual(os.environ['TOOL_LOADED'],'yes')
+            self.assertEqual(os.environ['OTHER_LOADED'],'yes')
+            self.assertTrue(os.environ[envmasterconf.LOADEDMODULESENV].find('tool') != -1)
+        self.assertEqual(dict(os.environ),before)
+        self.assertFalse(self.pydir in sys.path)
+
+class TestResolve(ModuleTreeTest):
+    """
+    Working out the environment modules give without
+    changing the current process
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        self.writeModule('root','tool',['module.setVar("yes","TOOL_LOADED")',
+                    'module.setVar(module.getEnv("SITE","none"),"TOOL_SITE")'])
+        self.rootdir = self.writeModule('root','other',
+                    ['module.setVar("yes","OTHER_LOADED")'])
+        self.setPath('root')
+
+    def testIsolated(self):
+        """
+        Neither os.environ nor base are changed and the
+        module files see base rather than os.environ
+        """
+        before = dict(os.environ)
+        base = {envmasterconf.ENVMASTERPATH : self.rootdir,'SITE' : 'here'}
+        result = pyutils.resolve(['tool','other'],base)
+        self.assertEqual(result['TOOL_LOADED'],'yes')
+        self.assertEqual(result['OTHER_LOADED'],'yes')
+        self.assertEqual(result['TOOL_SITE'],'here')
+        self.assertEqual(base,{envmasterconf.ENVMASTERPATH : self.rootdir,'SITE' : 'here'})
+        self.assertEqual(dict(os.environ),before)
+
+        # os.environ is the default base
+        result = pyutils.resolve(['tool'])
+        self.assertEqual(result['TOOL_SITE'],'none')
+        self.assertEqual(dict(os.environ),before)
+
+    def testRecords(self):
+        """
+        EnvMaster's own records are left out
+        """
+        result = pyutils.resolve(['tool'])
+        self.assertTrue(result[envmasterconf.LOADEDMODULESENV].find('tool') != -1)
+        for var in envmasterconf.RECORDVARS:
+            self.assertFalse(var in result,var)
+
+    def testChanged(self):
+        """
+        A remembered result isn't used once the
+        module file changes
+        """
+        self.assertEqual(pyutils.resolve(['other'])['OTHER_LOADED'],'yes')
+        self.assertEqual(len(pyutils._resolved),1)
+        self.writeModule('root','other',['module.setVar("changed","OTHER_LOADED")'])
+        path = os.path.join(self.rootdir,'other')
+        mtime = os.stat(path).st_mtime + 10
+        os.utime(path,(mtime,mtime))
+        self.assertEqual(pyutils.resolve(['other'])['OTHER_LOADED'],'changed')
+
+    def testThreads(self):
+        """
+        Several threads resolving at once each
+        get their own answer
+        """
+        results = {}
+        def run(site):
+            base = {envmasterconf.ENVMASTERPATH : self.rootdir,'SITE' : site}
+            for n in range(5):
+                results[site] = pyutils.resolve(['tool'],base)['TOOL_SITE']
+        threads = [threading.Thread(target=run,args=('site%d' % n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results,dict([('site%d' % n,'site%d' % n) for n in range(4)]))
+
+    def testTransaction(self):
+        """
+        A Transaction on a DictEnviron
+        """
+        environ = envmasterenviron.DictEnviron({envmasterconf.ENVMASTERPATH : self.rootdir})
+        before = dict(os.environ)
+        transaction = pyutils.Transaction(environ)
+        transaction.load('other')
+        self.assertEqual(environ.get('OTHER_LOADED'),'yes')
+        transaction.rollback()
+        self.assertEqual(environ.get('OTHER_LOADED'),None)
+        self.assertEqual(dict(os.environ),before)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+Tests for reloading only the modules that have changed
+since they were loaded. See EnvMasterFile.reloadAllModules().
+
+    python tests/test_reload.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import unittest
+
+from envmastertest import ModuleTreeTest
+from envmaster import envmasterconf
+from envmaster import envmasterloaded
+
+def bumpMtime(path):
+    """
+    Moves the modification time of path forward so the
+    change is seen even if the filesystem's times are coarse
+    """
+    mtime = os.stat(path).st_mtime + 10
+    os.utime(path,(mtime,mtime))
+
+class TestAllReload(ModuleTreeTest):
+    """
+    allreload leaves alone the modules that would
+    come out the same
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        for version in ('9.1','12.2'):
+            self.writeModule('root','gcc/%s' % version,
+                        ['module.setVar("%s","GCC_VER")' % version])
+        self.writeModule('root','plain',['module.setVar("1","PLAIN")'])
+        self.writeModule('root','app',['module.load("plain")',
+                        'module.setVar("yes","APP")'])
+        self.writeModule('root','needy',['module.prereq("gcc")'])
+        self.rootdir = self.writeModule('root','other',['module.setVar("yes","OTHER")'])
+        self.setPath('root')
+
+    def changeModule(self,name,lines):
+        """
+        Rewrites the module file name with lines as its body
+        """
+        self.writeModule('root',name,lines)
+        bumpMtime(os.path.join(self.rootdir,name))
+
+    def getSkipped(self,stderr):
+        """
+        Returns the modules allreload said it left alone
+        """
+        prefix = 'Not reloaded (unchanged): '
+        if not stderr.startswith(prefix):
+            return []
+        return stderr[len(prefix):].split()
+
+    def testUnchanged(self):
+        """
+        Nothing is reloaded when nothing has changed
+        """
+        self.runCommand('bash','load','gcc','other')
+        stdout,stderr = self.runCommand('bash','allreload')
+        self.assertEqual(stdout.find('GCC_VER'),-1)
+        self.assertEqual(self.getSkipped(stderr),[os.path.join('gcc','12.2'),'other'])
+
+    def testChanged(self):
+        """
+        A module whose file has changed is reloaded
+        """
+        self.runCommand('bash','load','gcc','other')
+        self.changeModule('other',['module.setVar("changed","OTHER")'])
+        stdout,stderr = self.runCommand('bash','allreload')
+        self.assertEqual(os.environ['OTHER'],'changed')
+        self.assertEqual(self.getSkipped(stderr),[os.path.join('gcc','12.2')])
+
+    def testNewDefault(self):
+        """
+        A module that would now load a different
+        version is reloaded
+        """
+        self.runCommand('bash','load','gcc','other')
+        self.writeModule('root','gcc/13.1',['module.setVar("13.1","GCC_VER")'])
+        stdout,stderr = self.runCommand('bash','allreload')
+        self.assertEqual(os.environ['GCC_VER'],'13.1')
+        self.assertEqual(self.getSkipped(stderr),['other'])
+
+        # or when the version file changes
+        self.writeModule('root','gcc/version.py',['version = "9.1"'])
+        stdout,stderr = self.runCommand('bash','allreload')
+        self.assertEqual(os.environ['GCC_VER'],'9.1')
+
+    def testDependents(self):
+        """
+        Modules that load or need a module being
+        reloaded are reloaded too
+        """
+        self.runCommand('bash','load','gcc','needy','app','other')
+        self.changeModule('plain',['module.setVar("2","PLAIN")'])
+        self.changeModule(os.path.join('gcc','12.2'),['module.setVar("12.2.1","GCC_VER")'])
+        stdout,stderr = self.runCommand('bash','allreload')
+        self.assertEqual(os.environ['PLAIN'],'2')
+        self.assertEqual(os.environ['GCC_VER'],'12.2.1')
+        self.assertEqual(self.getSkipped(stderr),['other'])
+
+    def testAll(self):
+        """
+        --all reloads everything, as do modules
+        with no fingerprint recorded
+        """
+        self.runCommand('bash','load','gcc','other')
+        stdout,stderr = self.runCommand('bash','allreload','--all')
+        self.assertTrue(stdout.find('GCC_VER') != -1)
+        self.assertEqual(stderr,'')
+
+        fingerprints = envmasterloaded.ModuleFingerprints(
+                        os.environ[envmasterconf.FINGERPRINTSENV])
+        self.assertTrue(fingerprints.get('other') is not None)
+        del os.environ[envmasterconf.FINGERPRINTSENV]
+        stdout,stderr = self.runCommand('bash','allreload')
+        self.assertTrue(stdout.find('GCC_VER') != -1)
+        self.assertEqual(stderr,'')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""
+Tests for searching the module files. See envmastersearch.
+
+    python tests/test_search.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import shutil
+import unittest
+
+from envmastertest import ModuleTreeTest, resetCaches
+from envmaster import envmasterexceptions
+from envmaster import envmasterfile
+from envmaster import envmastersearch
+
+class TestSearch(ModuleTreeTest):
+    """
+    Finding modules by name, description and
+    what they set
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        self.writeModule('root1','netcdf/4.8',
+                    ['module.whatis("Network Common Data Form library")'])
+        self.writeModule('root1','netcdf-python/1.6',
+                    ['module.whatis("Python interface to netCDF")',
+                    'module.setVar("1","NETCDF_PY")'])
+        self.writeModule('root2','gcc/12.2',
+                    ['module.whatis("GNU compiler collection")',
+                    'module.setPath("/opt/gnu/bin","PATH")'])
+        self.writeModule('root2','ncview',['module.whatis("Viewer for netCDF files")'])
+        self.setPath('root1','root2')
+
+    def search(self,query):
+        """
+        Returns the module names that match query, best first
+        """
+        modfile = envmasterfile.EnvMasterFile()
+        index = envmastersearch.getSearchIndex()
+        index.update(modfile)
+        return [modname for score,modname,root,whatis in index.search(query,modfile.modpaths)]
+
+    def testName(self):
+        """
+        A match on the name beats one on the description
+        """
+        self.assertEqual(self.search('python'),
+                    [os.path.join('netcdf-python','1.6')])
+        results = self.search('netcdf')
+        self.assertEqual(sorted(results[:2]),
+                    sorted([os.path.join('netcdf','4.8'),os.path.join('netcdf-python','1.6')]))
+        self.assertEqual(results[2:],['ncview'])
+        self.assertEqual(self.search('compiler'),[os.path.join('gcc','12.2')])
+        # a variable and a path it sets
+        self.assertEqual(self.search('netcdf_py'),[os.path.join('netcdf-python','1.6')])
+        self.assertEqual(self.search('gnu'),[os.path.join('gcc','12.2')])
+
+    def testAllWords(self):
+        """
+        Modules have to match every word
+        """
+        self.assertEqual(self.search('netcdf interface'),
+                    [os.path.join('netcdf-python','1.6')])
+        self.assertEqual(self.search('netcdf compiler'),[])
+
+    def testPartial(self):
+        """
+        Words match any part of a word unless they end
+        with '*' when they have to match the start
+        """
+        self.assertEqual(self.search('ompil'),[os.path.join('gcc','12.2')])
+        self.assertEqual(self.search('comp*'),[os.path.join('gcc','12.2')])
+        self.assertEqual(self.search('ompil*'),[])
+
+    def testUpdated(self):
+        """
+        New, changed and deleted module files
+        """
+        self.assertEqual(self.search('fortran'),[])
+        self.writeModule('root2','gfortran',['module.whatis("Fortran compiler")'])
+        self.assertEqual(self.search('fortran'),['gfortran'])
+
+        self.writeModule('root2','gfortran',['module.whatis("Fortran 2008 compiler")'])
+        self.assertEqual(self.search('2008'),['gfortran'])
+
+        shutil.rmtree(os.path.join(self.tmpdir,'root1'))
+        self.assertEqual(self.search('netcdf'),['ncview'])
+
+    def testSaved(self):
+        """
+        The index is read back by the next process
+        """
+        self.search('netcdf')
+        envmastersearch.getSearchIndex().save()
+        resetCaches()
+        index = envmastersearch.getSearchIndex()
+        self.assertEqual(len(index.docs),4)
+        self.assertEqual(self.search('compiler'),[os.path.join('gcc','12.2')])
+        self.assertFalse(index.dirty)
+
+    def testCommand(self):
+        """
+        The results are shown with the default marked
+        """
+        stdout,stderr = self.runCommand('bash','search','compiler')
+        self.assertTrue(stderr.find(os.path.join('gcc','12.2(default)')) != -1)
+        self.assertRaises(envmasterexceptions.EnvMasterNoModules,
+                    self.runCommand,'bash','search','nothing')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+"""
+Tests for the output of the shells read by other
+programs. See envmastershells.
+
+    python tests/test_shells.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import json
+import unittest
+
+from envmastertest import ModuleTreeTest
+from envmaster import envmasterconf
+
+# a value that would need quoting in a shell
+AWKWARD = 'a \'b\' "c" $d\nnext line'
+
+class TestRecordShells(ModuleTreeTest):
+    """
+    The json and env0 shells
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        self.writeModule('root','tool/1.0',['module.whatis("A tool")',
+                    'module.setVar(%r,"TOOL_VAR")' % AWKWARD])
+        self.writeModule('root','tool/2.0',['module.setVar("2","TOOL_VAR")'])
+        self.writeModule('root','other',['module.setVar("yes","OTHER_VAR")',
+                    'module.setPath("/opt/other/bin","OTHER_PATH")'])
+        self.setPath('root')
+
+    def testJSON(self):
+        """
+        One object per variable with its final value
+        """
+        stdout,stderr = self.runCommand('json','load',os.path.join('tool','1.0'),'other')
+        records = [json.loads(line) for line in stdout.splitlines()]
+        values = dict([(record['var'],record['value']) for record in records])
+        self.assertEqual(values['TOOL_VAR'],AWKWARD)
+        self.assertEqual(values['OTHER_PATH'],'/opt/other/bin')
+        # EnvMaster's records are left out
+        for var in envmasterconf.RECORDVARS:
+            self.assertFalse(var in values,var)
+
+        stdout,stderr = self.runCommand('json','unload','other')
+        records = [json.loads(line) for line in stdout.splitlines()]
+        self.assertTrue({'op' : 'unset','var' : 'OTHER_VAR'} in records)
+
+    def testEnv0(self):
+        """
+        var=value or just var for those unset
+        """
+        values = self.runEnv0('load',os.path.join('tool','1.0'),'other')
+        self.assertEqual(values['TOOL_VAR'],AWKWARD)
+        self.assertEqual(values['OTHER_VAR'],'yes')
+        self.assertEqual(values[envmasterconf.LOADEDMODULESENV],
+                    os.pathsep.join(['other',os.path.join('tool','1.0')]))
+        for var in envmasterconf.RECORDVARS:
+            self.assertFalse(var in values,var)
+
+        values = self.runEnv0('unload','other')
+        self.assertEqual(values['OTHER_VAR'],None)
+
+    def testList(self):
+        """
+        A record for each loaded module, first loaded first
+        """
+        self.runCommand('bash','load','tool','other')
+        stdout,stderr = self.runCommand('json','list')
+        self.assertEqual([json.loads(line) for line in stdout.splitlines()],
+                    [{'name' : os.path.join('tool','2.0')},{'name' : 'other'}])
+        stdout,stderr = self.runCommand('env0','list')
+        self.assertEqual(stdout,os.path.join('tool','2.0') + '\0other\0')
+
+    def testAvail(self):
+        """
+        A record for each module file with where it is and
+        whether it is the default
+        """
+        rootdir = os.path.join(self.tmpdir,'root')
+        stdout,stderr = self.runCommand('json','avail','--long')
+        records = [json.loads(line) for line in stdout.splitlines()]
+        self.assertEqual([record['name'] for record in records],
+                    ['other',os.path.join('tool','1.0'),os.path.join('tool','2.0')])
+        self.assertEqual(records[1],{'name' : os.path.join('tool','1.0'),
+                    'path' : os.path.join(rootdir,'tool','1.0'),'root' : rootdir,
+                    'default' : False,'whatis' : 'A tool'})
+        self.assertTrue(records[2]['default'])
+
+        # no description without --long
+        stdout,stderr = self.runCommand('json','avail')
+        self.assertFalse('whatis' in json.loads(stdout.splitlines()[0]))
+        stdout,stderr = self.runCommand('env0','avail')
+        self.assertEqual(stdout.split('\0'),
+                    ['other',os.path.join('tool','1.0'),os.path.join('tool','2.0'),''])
+
+class TestPythonShell(ModuleTreeTest):
+    """
+    The python shell writes valid Python
+    """
+    def testRun(self):
+        """
+        Running the output changes the environment
+        """
+        self.writeModule('root','tool',['module.setVar(%r,"TOOL_VAR")' % AWKWARD])
+        self.setPath('root')
+        stdout,stderr = self.runCommand('python','load','tool')
+        del os.environ['TOOL_VAR']
+        exec(stdout,{'os' : os})
+        self.assertEqual(os.environ['TOOL_VAR'],AWKWARD)
+
+        stdout,stderr = self.runCommand('python','unload','tool')
+        exec(stdout,{'os' : os})
+        self.assertFalse('TOOL_VAR' in os.environ)
+
+if __name__ == '__main__':
+    unittest.main()
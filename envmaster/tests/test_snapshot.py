@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""
+Tests for purge and snapshots, which put back the values
+of variables without running module files.
+See envmastersnapshot.
+
+    python tests/test_snapshot.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import shutil
+import unittest
+
+from envmastertest import ModuleTreeTest
+from envmaster import envmasterconf
+from envmaster import envmasterexceptions
+from envmaster import envmastersnapshot
+
+class SnapshotTest(ModuleTreeTest):
+    """
+    Base class with a couple of modules to load
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        for version in ('9.1','12.2'):
+            self.writeModule('root','gcc/%s' % version,
+                        ['module.setVar("%s","GCC_VER")' % version,
+                        'module.setPath("/opt/gcc%s/bin","PATH")' % version])
+        self.writeModule('root','plain',['module.setVar("yes","PLAIN")'])
+        self.setPath('root')
+        os.environ['PATH'] = '/usr/bin'
+        os.environ['PLAIN'] = 'before'
+
+class TestBaseline(SnapshotTest):
+    """
+    Recording the values before EnvMaster changed them
+    and purge
+    """
+    def testEncode(self):
+        """
+        Values (and unset variables) survive being packed
+        into an environment variable
+        """
+        values = {'PATH' : '/usr/bin','UNSET' : None,'EQUALS' : 'a=b','EMPTY' : ''}
+        encoded = envmastersnapshot.encodeValues(values)
+        self.assertEqual(envmastersnapshot.decodeValues(encoded),values)
+        self.assertEqual(envmastersnapshot.decodeValues(None),{})
+        self.assertEqual(envmastersnapshot.decodeValues('not ours'),{})
+
+    def testFirstValue(self):
+        """
+        Only the value before the first change is kept
+        """
+        self.runCommand('bash','load','gcc/9.1')
+        self.runCommand('bash','swap','gcc/9.1','gcc/12.2')
+        baseline = envmastersnapshot.Baseline(os.environ[envmasterconf.BASELINEENV])
+        self.assertEqual(baseline.values['PATH'],'/usr/bin')
+        self.assertEqual(baseline.values['GCC_VER'],None)
+        self.assertFalse(envmasterconf.BASELINEENV in baseline.values)
+
+    def testPurge(self):
+        """
+        Everything is put back without reading the module files
+        """
+        self.runCommand('bash','load','gcc','plain')
+        self.assertEqual(os.environ['PLAIN'],'yes')
+        shutil.rmtree(os.path.join(self.tmpdir,'root'))
+
+        self.runCommand('bash','purge')
+        self.assertEqual(os.environ['PATH'],'/usr/bin')
+        self.assertEqual(os.environ['PLAIN'],'before')
+        self.assertFalse('GCC_VER' in os.environ)
+        self.assertFalse(envmasterconf.LOADEDMODULESENV in os.environ)
+
+class TestSnapshot(SnapshotTest):
+    """
+    Saving and restoring the variables EnvMaster has changed
+    """
+    def testRestore(self):
+        """
+        Variables are put back to how they were when the
+        snapshot was saved
+        """
+        self.runCommand('bash','load','gcc/9.1')
+        self.runCommand('bash','snapshot','save','first')
+        self.runCommand('bash','swap','gcc/9.1','gcc/12.2')
+        self.runCommand('bash','load','plain')
+
+        self.runCommand('bash','snapshot','restore','first')
+        self.assertEqual(os.environ['GCC_VER'],'9.1')
+        self.assertEqual(os.environ['PATH'],os.pathsep.join(['/opt/gcc9.1/bin','/usr/bin']))
+        # changed since - back to the baseline
+        self.assertEqual(os.environ['PLAIN'],'before')
+        self.assertEqual(os.environ[envmasterconf.LOADEDMODULESENV],os.path.join('gcc','9.1'))
+
+        # still knows what to purge
+        self.runCommand('bash','purge')
+        self.assertEqual(os.environ['PATH'],'/usr/bin')
+        self.assertFalse('GCC_VER' in os.environ)
+
+    def testBadName(self):
+        """
+        Names that aren't a simple file name and
+        snapshots that don't exist are errors
+        """
+        for name in ('','.hidden',os.path.join('sub','name')):
+            self.assertRaises(envmasterexceptions.EnvMasterSnapshotError,
+                    self.runCommand,'bash','snapshot','save',name)
+        self.assertRaises(envmasterexceptions.EnvMasterSnapshotError,
+                    self.runCommand,'bash','snapshot','restore','missing')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Tests for tracing where the time goes. See envmastertrace.
+
+    python tests/test_trace.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import sys
+import json
+import unittest
+import subprocess
+
+from envmastertest import ModuleTreeTest
+from envmaster import envmasterconf
+from envmaster import envmastertrace
+
+# the top of the source tree
+SRCDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class TestTrace(ModuleTreeTest):
+    """
+    Trace records written by a command. Tracing is
+    turned on at import so these run a new interpreter.
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        self.rootdir = self.writeModule('root','tool',
+                        ['module.setVar("yes","TOOL_LOADED")'])
+
+    def runTraced(self,dest,argv):
+        """
+        Runs envmastercmd.py with tracing written to dest.
+        Returns (stdout,stderr).
+        """
+        env = dict(os.environ)
+        env[envmasterconf.ENVMASTERPATH] = self.rootdir
+        env[envmasterconf.TRACEENV] = dest
+        env['PYTHONPATH'] = SRCDIR
+        proc = subprocess.Popen([sys.executable,os.path.join(SRCDIR,'scripts','envmastercmd.py')] + argv,
+                    env=env,stdout=subprocess.PIPE,stderr=subprocess.PIPE,
+                    universal_newlines=True)
+        stdout,stderr = proc.communicate()
+        self.assertEqual(proc.returncode,0,stderr)
+        return stdout,stderr
+
+    def testFile(self):
+        """
+        A JSON record for each traced call and a summary
+        """
+        tracepath = os.path.join(self.tmpdir,'trace.json')
+        stdout,stderr = self.runTraced(tracepath,['bash','load','tool'])
+        self.assertTrue(stdout.find('TOOL_LOADED') != -1)
+
+        records = [json.loads(line) for line in open(tracepath)]
+        summary = records.pop()['summary']
+        phases = set([record['phase'] for record in records])
+        self.assertTrue('resolve' in phases)
+        self.assertTrue('execute' in phases)
+        execute = [record for record in records if record['phase'] == 'execute']
+        self.assertEqual(execute[0]['detail'],'tool')
+        self.assertTrue(execute[0]['calls'].get('builtins.open',0) > 0 or
+                        execute[0]['calls'].get('stat',0) > 0)
+        self.assertEqual(summary['phases']['execute'][0],1)
+        self.assertTrue('tool' in summary['modules'])
+
+    def testStderr(self):
+        """
+        The summary table goes to stderr
+        """
+        stdout,stderr = self.runTraced('1',['bash','load','tool'])
+        self.assertTrue(stderr.find('EnvMaster trace:') != -1)
+        self.assertTrue(stderr.find('execute') != -1)
+
+    def testOff(self):
+        """
+        Functions aren't changed when tracing is off
+        """
+        if envmastertrace.getTracer() is not None:
+            self.skipTest('tracing is on for this process')
+        def func():
+            pass
+        self.assertTrue(envmastertrace.traced('phase')(func) is func)
+
+if __name__ == '__main__':
+    unittest.main()
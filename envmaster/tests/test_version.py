@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+"""
+Tests for ordering versions and matching version
+specifications. See envmasterversion.
+
+    python tests/test_version.py
+"""
+# This file is part of EnvMaster
+# Copyright (C) 2012  Sam Gillingham
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import unittest
+
+from envmastertest import ModuleTreeTest
+from envmaster import envmasterconf
+from envmaster import envmasterexceptions
+from envmaster import envmasterversion
+from envmaster import pyutils
+
+class TestVersions(unittest.TestCase):
+    """
+    Comparing versions and matching specifications
+    """
+    def testOrder(self):
+        """
+        Versions sort naturally
+        """
+        versions = ['10.1','1.0','9.0','1.0rc1','1.0.1','1.0-beta','2']
+        versions.sort(key=envmasterversion.versionKey)
+        self.assertEqual(versions,['1.0-beta','1.0rc1','1.0','1.0.1','2','9.0','10.1'])
+        self.assertEqual(envmasterversion.compareVersions('9.0','10.1'),-1)
+        self.assertEqual(envmasterversion.compareVersions('10.1','10.1'),0)
+        self.assertEqual(envmasterversion.compareVersions('10.1','10.0.9'),1)
+
+    def testIsSpec(self):
+        """
+        Specifications as opposed to plain versions
+        """
+        for spec in ('>=9','<10','==9.1','>9','<=9','12.*','1.?','[12].0'):
+            self.assertTrue(envmasterversion.isSpec(spec),spec)
+        for version in (None,'9.1','1.0-beta'):
+            self.assertFalse(envmasterversion.isSpec(version),version)
+
+    def testMatch(self):
+        """
+        Each of the operators and wildcards
+        """
+        self.assertTrue(envmasterversion.matchVersion('>=10','10.0'))
+        self.assertTrue(envmasterversion.matchVersion('>=10','12.2'))
+        self.assertFalse(envmasterversion.matchVersion('>=10','9.1'))
+        self.assertTrue(envmasterversion.matchVersion('<10','9.1'))
+        self.assertFalse(envmasterversion.matchVersion('>10','10'))
+        self.assertTrue(envmasterversion.matchVersion('==10','10'))
+        self.assertTrue(envmasterversion.matchVersion('12.*','12.2'))
+        self.assertFalse(envmasterversion.matchVersion('12.*','1.2'))
+        self.assertTrue(envmasterversion.matchVersion('9.1','9.1'))
+        self.assertFalse(envmasterversion.matchVersion('9.1','9.10'))
+        self.assertFalse(envmasterversion.matchVersion('>=1',None))
+
+class TestVersionIndex(unittest.TestCase):
+    """
+    Finding the versions in a module directory that
+    match a specification
+    """
+    def setUp(self):
+        self.index = envmasterversion.VersionIndex(
+                ['9.1','10.0','12.2','12.10','1.0','100'])
+
+    def testHighest(self):
+        """
+        The default when there is no version file
+        """
+        self.assertEqual(self.index.highest(),'100')
+        self.assertEqual(envmasterversion.VersionIndex([]).highest(),None)
+
+    def testFindMatches(self):
+        """
+        The same answers as checking each version
+        """
+        versions = self.index.versions
+        for spec in ('>=10','>10','<=10','<10','==10','==10.0','12.*','1*',
+                        '1?','*','10.0','11','>=200'):
+            expected = [version for version in versions
+                            if envmasterversion.matchVersion(spec,version)]
+            self.assertEqual(self.index.findMatches(spec),expected,spec)
+
+    def testFindBest(self):
+        """
+        The highest version that matches
+        """
+        self.assertEqual(self.index.findBest('12.*'),'12.10')
+        self.assertEqual(self.index.findBest('<12'),'10.0')
+        self.assertEqual(self.index.findBest('>=200'),None)
+
+    def testEntries(self):
+        """
+        An index made from saved entries is the same
+        """
+        index = envmasterversion.VersionIndex(entries=self.index.getEntries())
+        self.assertEqual(index.versions,self.index.versions)
+
+class TestVersionSpecs(ModuleTreeTest):
+    """
+    Loading modules with a version specification
+    """
+    def setUp(self):
+        ModuleTreeTest.setUp(self)
+        for version in ('9.1','10.2','12.2'):
+            self.writeModule('root','gcc/%s' % version,
+                        ['module.setVar("%s","GCC_VER")' % version])
+        self.rootdir = self.writeModule('root','needy',['module.prereq("gcc/>=10")'])
+        self.base = {envmasterconf.ENVMASTERPATH : self.rootdir}
+
+    def testDefault(self):
+        """
+        Without a version file the highest version
+        (not the last in the directory listing) is used
+        """
+        self.assertEqual(pyutils.resolve(['gcc'],self.base)['GCC_VER'],'12.2')
+
+    def testLoad(self):
+        """
+        The highest version that matches is loaded
+        """
+        result = pyutils.resolve([os.path.join('gcc','<12')],self.base)
+        self.assertEqual(result['GCC_VER'],'10.2')
+        result = pyutils.resolve([os.path.join('gcc','9.*')],self.base)
+        self.assertEqual(result['GCC_VER'],'9.1')
+        self.assertRaises(envmasterexceptions.EnvMasterException,pyutils.resolve,
+                    [os.path.join('gcc','>=13')],self.base)
+
+    def testPrereq(self):
+        """
+        A prerequisite satisfied by a loaded
+        version that matches
+        """
+        result = pyutils.resolve([os.path.join('gcc','10.2'),'needy'],self.base)
+        self.assertEqual(result['GCC_VER'],'10.2')
+        self.assertRaises(envmasterexceptions.EnvMasterPrereqFailed,pyutils.resolve,
+                    [os.path.join('gcc','9.1'),'needy'],self.base)
+
+if __name__ == '__main__':
+    unittest.main()